@@ -54,6 +54,12 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+# This must be enabled before anything else is imported if we want to see
+# how long each import takes.
+from neko2.shared import profiler
+
+profiler.startup.enable_from_argv()
+
 import neko2.cogs
 import neko2.engine
 import neko2.shared
@@ -69,13 +75,14 @@ __trello__ = "https://trello.com/b/gKTl1rMO"
 import subprocess
 
 try:
-    output = (
-        subprocess.check_output(
-            "git log --oneline", universal_newlines=True, shell=True
+    with profiler.startup.section("git version lookup"):
+        output = (
+            subprocess.check_output(
+                "git log --oneline", universal_newlines=True, shell=True
+            )
+            .strip()
+            .split("\n")
         )
-        .strip()
-        .split("\n")
-    )
     __version__ += f" build {len(output)}"
     del output
 except:
@@ -7,6 +7,9 @@ any error, and then starts the bot.
 If a path is provided as the first argument, we look in this path directory
 for any configuration files, otherwise, we assume ../neko2config.
 
+If ``--workers=N`` is passed, a supervisor is run instead, which runs the
+bot across N processes. See ``neko2.engine.supervisor``.
+
 ===
 
 MIT License
@@ -32,6 +35,13 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
-from neko2.engine import runner
+import sys
+
+from neko2.engine import runner, supervisor
 
-runner.NekoSquaredBotProcess().run()
+# Worker processes re-import this module, so this guard is needed.
+if __name__ == "__main__":
+    if supervisor.get_flag(sys.argv, supervisor.WORKERS_FLAG) is not None:
+        supervisor.Supervisor.from_argv(sys.argv).run()
+    else:
+        runner.NekoSquaredBotProcess().run()
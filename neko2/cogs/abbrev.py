@@ -30,11 +30,12 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from urllib import parse
 
-import bs4
 import discord
 
 from discomaton import book
-from neko2.shared import alg, commands, traits
+from neko2.shared import alg, commands, lazy, traits
+
+bs4 = lazy.lazy_import("bs4")
 
 
 def gen_url_acronymn_finder(terms):
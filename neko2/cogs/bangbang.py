@@ -35,6 +35,13 @@ class BangBangCog:
     def __init__(self):
         self.user2context = {}
 
+    def __export_state(self):
+        """Keeps the command history when this extension is reloaded."""
+        return self.user2context
+
+    def __import_state(self, state):
+        self.user2context = state
+
     async def on_command(self, ctx):
         """Cache the last-executed commands."""
         if ctx.command != self.bangbang:
@@ -74,7 +74,7 @@ import discomaton.util.pag
 from discomaton.factories import bookbinding
 import neko2  # n2 versioning
 from neko2 import modules  # Loadable modules
-from neko2.shared import commands, fuzzy, string, collections, alg, traits
+from neko2.shared import commands, fuzzy, string, collections, alg, metrics, traits
 import neko2.shared.morefunctools
 from neko2.engine import extrabits
 
@@ -105,10 +105,6 @@ def count_loc():
         return
 
 
-# Count initial LOC.
-count_loc()
-
-
 class BasicsCog(traits.CogTraits):
     def __init__(self, bot):
         """Init the cog."""
@@ -119,6 +115,11 @@ class BasicsCog(traits.CogTraits):
 
         self.bot = bot
 
+        # Count initial LOC in the background rather than at import, as this
+        # shells out and walks the entire tree.
+        if lines_of_code is None:
+            bot.loop.create_task(self.run_in_io_executor(count_loc))
+
     # Prevents webhook exploits spamming the hell out of this.
     async def __global_check(self, ctx):
         """
@@ -169,9 +170,9 @@ class BasicsCog(traits.CogTraits):
         binder = bookbinding.StringBookBinder(
             ctx, suffix="```", prefix="```", max_lines=25
         )
-        async with self.file("LICENSE") as fp:
-            for line in await fp.readlines():
-                binder.add(line)
+        text = (await self.read_asset("LICENSE")).decode()
+        for line in text.splitlines(keepends=True):
+            binder.add(line)
         binder.start()
 
     @commands.command(brief="Shows the copying policy for this bot.")
@@ -180,10 +181,10 @@ class BasicsCog(traits.CogTraits):
         binder = bookbinding.StringBookBinder(
             ctx, suffix="```", prefix="```", max_lines=25
         )
-        async with self.file("COPYING.md") as fp:
-            binder.add_line("See `n.mylicense' for the full license.\n")
-            for line in await fp.readlines():
-                binder.add(line)
+        text = (await self.read_asset("COPYING.md")).decode()
+        binder.add_line("See `n.mylicense' for the full license.\n")
+        for line in text.splitlines(keepends=True):
+            binder.add(line)
         binder.start()
 
     @commands.command(
@@ -380,6 +381,13 @@ class BasicsCog(traits.CogTraits):
                 ),
             )
 
+        cost = getattr(command, "cost", 1)
+        if cost != 1:
+            pages[-1].add_field(
+                name="Rate limiting",
+                value=f"Counts as {cost} commands towards your rate limit.",
+            )
+
         # pages[-1].set_thumbnail(url=ctx.bot.user.avatar_url)
 
         if hasattr(command.callback, "_probably_broken"):
@@ -776,6 +784,37 @@ class BasicsCog(traits.CogTraits):
             self.flush_command_cache()
             return ttr
 
+    async def _reload_extension(self, namespace, recache=True) -> float:
+        """
+        Reloads a given extension from disk, handing over any state its cogs
+        export to the new versions of those cogs. Returns the execution time.
+        If the new version fails to load, the old version is kept.
+        """
+        if namespace.startswith("neko2.engine"):
+            raise PermissionError(
+                "Seems that this is an internal extension. "
+                "These cannot be dynamically reloaded in "
+                "the bot engine. Please restart instead."
+            )
+
+        elif namespace not in self.bot.extensions:
+            raise ModuleNotFoundError(
+                f"{namespace} was not loaded into this bot instance, and so "
+                "was not able to be reloaded."
+            )
+
+        else:
+            start_time = time.monotonic()
+            try:
+                self.bot.reload_extension(namespace)
+            finally:
+                self.flush_command_cache()
+            ttr = time.monotonic() - start_time
+            # Recache LOC.
+            if recache:
+                self.bot.loop.create_task(self.run_in_io_executor(count_loc))
+            return ttr
+
     @commands.is_owner()
     @commands.command(hidden=True, brief="Loads an extension into me.")
     async def load(self, ctx, *, namespace):
@@ -854,42 +893,45 @@ class BasicsCog(traits.CogTraits):
         """
         Reloads a given extension. If the extension is not specified, then all
         loaded extensions (excluding builtins) are reloaded.
+
+        Cogs keep any state they export across the reload, and if the new
+        version of an extension fails to load, the old version stays in use.
         """
         if namespace is None:
             log = []
             error_count = 0
-            unloaded_count = 0
+            reloaded_count = 0
             loaded_count = 0
 
             start_time = time.monotonic()
             with ctx.typing():
-                log.append(f"Unloading `discomaton` cached module data.")
-                log.append("\n" + "-" * 50 + "\n")
-
-                unloaded_extensions = []
                 for extension in copy.copy(ctx.bot.extensions):
                     if extension.startswith("neko2.engine"):
                         # Ignore internals
                         continue
 
                     try:
-                        secs = await self._unload_extension(extension, False)
+                        secs = await self._reload_extension(extension, False)
                     except Exception as ex:
                         log.append(
-                            f"Unloading `{extension}` failed. "
-                            f"{type(ex).__qualname__}: {ex}"
+                            f"Reloading `{extension}` failed, so kept the old "
+                            f"version. {type(ex).__qualname__}: {ex}"
                         )
                         error_count += 1
                     else:
                         log.append(
-                            f"Unloaded `{extension}` in approximately "
+                            f"Reloaded `{extension}` in approximately "
                             f"{secs*1000:,.2f}ms"
                         )
-                        unloaded_count += 1
-                        unloaded_extensions.append(extension)
+                        reloaded_count += 1
+
+                log.append("\n" + "-" * 50 + "\n")
+
+                # Load anything new.
+                for extension in sorted(modules.modules):
+                    if extension in ctx.bot.extensions:
+                        continue
 
-                # Reload.
-                for extension in frozenset((*modules.modules, *unloaded_extensions)):
                     try:
                         secs = await self._load_extension(extension, False)
                     except Exception as ex:
@@ -913,7 +955,7 @@ class BasicsCog(traits.CogTraits):
                 "Completed operation in approximately " f"**{time_taken*1000:,.2f}ms**"
             )
             book.add_line(
-                f"Unloaded **{unloaded_count}**, " f"loaded **{loaded_count}**"
+                f"Reloaded **{reloaded_count}**, " f"loaded **{loaded_count}**"
             )
             book.add_line(
                 f"Encountered **{error_count} "
@@ -932,8 +974,36 @@ class BasicsCog(traits.CogTraits):
 
             book.start()
         else:
-            await self.unload.callback(self, ctx, namespace=namespace)
-            await self.load.callback(self, ctx, namespace=namespace)
+            try:
+                secs = await self._reload_extension(namespace)
+            except ModuleNotFoundError as ex:
+                await ctx.send(
+                    embed=discord.Embed(
+                        title=type(ex).__qualname__, description=str(ex), colour=0xffff00
+                    )
+                )
+            except Exception as ex:
+                await ctx.send(
+                    embed=discord.Embed(
+                        title=type(ex).__qualname__,
+                        description=f"{ex}\n\nThe previous version is still loaded.",
+                        colour=0xff0000,
+                    )
+                )
+                tb = "".join(traceback.format_exc())
+                pag = discomaton.Paginator(prefix="```", suffix="```")
+                pag.add(tb)
+                for page in pag.pages:
+                    await ctx.send(page)
+            else:
+                await ctx.send(
+                    embed=discord.Embed(
+                        title=f"Reloaded `{namespace}`",
+                        description=f"Successfully reloaded extension `{namespace}` "
+                        f"in approximately {secs:,.2f}s.",
+                        colour=0x00ff00,
+                    )
+                )
 
     @commands.command(brief="Determines if you can run the command here.")
     async def canirun(self, ctx, command):
@@ -1191,6 +1261,28 @@ class BasicsCog(traits.CogTraits):
         booklet.add_break(to_start=True)
         summary = "\n".join(summary)
         booklet.add(summary, to_start=True)
+
+        watchdog = ctx.bot.watchdog
+        if watchdog is not None:
+            booklet.add_break(to_start=True)
+            for report in reversed(watchdog.reports):
+                booklet.add_line(
+                    f"{time.ctime(report.detected_at)}: blocked for "
+                    f"{report.duration * 1000:,.0f}ms by {report.culprit}",
+                    to_start=True,
+                )
+            booklet.add_line(
+                f"{len(watchdog.reports)} recent blocks over "
+                f"{watchdog.threshold * 1000:,.0f}ms:",
+                to_start=True,
+            )
+
+            lag = metrics.registry.histogram("loop_lag_seconds")
+            p50, p99 = (
+                "-" if p is None else f"{p * 1000:,.2f}ms" for p in lag.percentiles(50, 99)
+            )
+            booklet.add_line(f"Loop lag: p50 {p50}, p99 {p99}.", to_start=True)
+
         booklet.add_line(f"{len(all_tasks)} coroutines in the loop.", to_start=True)
         booklet.start()
 
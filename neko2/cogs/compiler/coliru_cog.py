@@ -28,24 +28,55 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import asyncio
 import io
+import time
 
 from discomaton.factories import bookbinding
 
+from neko2.shared import codeblocks
 from neko2.shared import commands
+from neko2.shared import configfiles
+from neko2.shared import sandbox
 from neko2.shared import traits
 
 from . import tools
 from .toolchains import coliru
 
+# Optional config file choosing where code is run.
+config_file = "compiler"
+
 
 class ColiruCog(traits.CogTraits):
+    def __init__(self):
+        try:
+            config = configfiles.get_config_data(config_file)
+        except FileNotFoundError:
+            config = {}
+
+        backend = coliru.RemoteBackend()
+        if config.get("backend", "coliru") == "local":
+            box = sandbox.Sandbox(**config.get("sandbox", {}))
+            try:
+                box.check_isolation()
+            except sandbox.IsolationError as ex:
+                self.logger.error(
+                    f"Refusing to run code locally, as it cannot be sandboxed "
+                    f"here, so running it on Coliru instead. {ex}"
+                )
+            else:
+                self.logger.info("Running code locally in a sandbox.")
+                workers = config.get("python_workers", 0)
+                backend = coliru.LocalBackend(box, python_workers=workers)
+        coliru.set_backend(backend)
+
     @commands.group(
         invoke_without_command=True,
         name="coliru",
         aliases=["cc"],
         brief="Attempts to execute the given code using "
         "[coliru](http://coliru.stacked-crooked.com).",
+        cost=5,
     )
     async def coliru(self, ctx, *, arguments):
         """
@@ -61,9 +92,9 @@ class ColiruCog(traits.CogTraits):
         custom build routine or flags, see `cc a`.
         """
 
-        code_block = tools.code_block_re.search(arguments)
+        code_block = codeblocks.find(arguments, ctx.message)
 
-        if not code_block or len(code_block.groups()) < 2:
+        if not code_block:
             booklet = bookbinding.StringBookBinder(ctx)
             booklet.add_line(
                 "I couldn't detect a valid language in your "
@@ -76,12 +107,14 @@ class ColiruCog(traits.CogTraits):
             return await tools.listen_to_edit(ctx, booklet)
 
         # Extract the code
-        language, source = code_block.groups()
+        language, source = code_block
         language = language.lower()
 
+        preview = tools.OutputPreview(ctx)
         try:
             with ctx.typing():
-                output = await coliru.targets[language](source)
+                target = coliru.targets[language]
+                output = await target(source, on_output=preview.update)
         except KeyError:
             booklet = bookbinding.StringBookBinder(ctx)
             booklet.add_line(
@@ -112,8 +145,12 @@ class ColiruCog(traits.CogTraits):
 
             booklet = binder.build()
             booklet.start()
+            tools.remember_responses(ctx, booklet)
+            await preview.close()
 
             await tools.listen_to_edit(ctx, booklet)
+        finally:
+            await preview.close()
 
     @coliru.command(brief="Shows help for supported languages.")
     async def help(self, ctx, *, language=None):
@@ -254,12 +291,12 @@ class ColiruCog(traits.CogTraits):
             for m in tools.file_name_and_block_re.findall(rest):
                 files.append(m)
 
-            for attachment in ctx.message.attachments:
-                with io.StringIO() as buff:
-                    attachment.save(buff)
-                    buff = buff.getvalue()
-
-                files.append((attachment.filename, buff))
+            download_time = None
+            if ctx.message.attachments:
+                start = time.perf_counter()
+                attachments = ctx.message.attachments
+                files.extend(await self._download_attachments(attachments))
+                download_time = time.perf_counter() - start
 
             if len(files) == 0:
                 raise ValueError("Expected one or more source files.")
@@ -273,7 +310,13 @@ class ColiruCog(traits.CogTraits):
             # Generate the coliru API client instance.
             c = coliru.Coliru("bash .run.sh", main, *files, verbose=True)
 
-            output = await c.execute(await self.acquire_http())
+            preview = tools.OutputPreview(ctx)
+            try:
+                output = await c.execute(
+                    await self.acquire_http(), on_output=preview.update
+                )
+            finally:
+                await preview.close()
 
             binder = bookbinding.StringBookBinder(
                 ctx, prefix="```markdown", suffix="```", max_lines=25
@@ -289,6 +332,8 @@ class ColiruCog(traits.CogTraits):
                 await ctx.send("No output...")
                 return
 
+            binder.add_line(self._timing_footer(download_time, c.timings))
+
             booklet = binder.build()
             booklet.start()
 
@@ -298,3 +343,49 @@ class ColiruCog(traits.CogTraits):
             return await ctx.send("Invalid input format.")
         except ValueError as ex:
             return await ctx.send(str(ex))
+
+    @staticmethod
+    async def _download_attachments(attachments):
+        """
+        Downloads each attachment at once, after checking they are not too
+        big, and decodes them as UTF-8.
+
+        :raises coliru.JobTooLargeError: if any attachment is too big.
+        """
+        total = 0
+        for attachment in attachments:
+            if attachment.size > coliru.MAX_FILE_SIZE:
+                raise coliru.JobTooLargeError(
+                    f"`{attachment.filename}` is too big. Files can be up to "
+                    f"{coliru.MAX_FILE_SIZE // 1024} KiB."
+                )
+            total += attachment.size
+
+        if total > coliru.MAX_TOTAL_SIZE:
+            raise coliru.JobTooLargeError(
+                f"Your attachments are too big. They can be up to "
+                f"{coliru.MAX_TOTAL_SIZE // 1024} KiB altogether."
+            )
+
+        async def download(attachment):
+            with io.BytesIO() as buff:
+                await attachment.save(buff)
+                return attachment.filename, buff.getvalue().decode("utf-8", "replace")
+
+        return await asyncio.gather(*(download(a) for a in attachments))
+
+    @staticmethod
+    def _timing_footer(download_time, timings) -> str:
+        """Describes how long each stage of the job took."""
+        stages = []
+        if download_time is not None:
+            stages.append(f"downloaded in {download_time * 1000:,.0f}ms")
+        if "share" in timings:
+            stages.append(f"shared in {timings['share'] * 1000:,.0f}ms")
+        if "run" in timings:
+            stages.append(f"ran in {timings['run'] * 1000:,.0f}ms")
+        else:
+            # Someone else ran identical code recently.
+            stages.append("output was cached")
+        footer = ", ".join(stages)
+        return f"-- {footer[0].upper()}{footer[1:]}."
@@ -37,6 +37,7 @@ class LatexCog(traits.CogTraits):
         name="tex",
         aliases=["latex", "texd", "latexd"],
         brief="Attempts to parse a given LaTeX string and display a preview.",
+        cost=5,
     )
     async def latex_cmd(self, ctx, *, content: str):
         """
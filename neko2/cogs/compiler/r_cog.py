@@ -32,7 +32,7 @@ import io
 
 import discord
 from discomaton.factories import bookbinding
-from neko2.shared import traits, commands
+from neko2.shared import codeblocks, commands, traits
 from . import tools
 from .toolchains import r
 
@@ -43,6 +43,7 @@ class RCog(traits.CogTraits):
         aliases=["cranr"],
         brief="Executes a given R-code block, showing the output"
         " and any graphs that were plotted.",
+        cost=5,
     )
     async def _r(self, ctx, *, source):
         """
@@ -59,9 +60,9 @@ class RCog(traits.CogTraits):
         ˋˋˋ
         ```
         """
-        code_block = tools.code_block_re.search(source)
+        code_block = codeblocks.find(source, ctx.message)
         if code_block:
-            source = code_block.group(2)
+            source = code_block.source
 
         with ctx.typing():
             result = await r.eval_r(await self.acquire_http(), source)
@@ -84,6 +85,7 @@ class RCog(traits.CogTraits):
         booklet = binder.build()
 
         booklet.start()
+        tools.remember_responses(ctx, booklet)
 
         additionals = []
 
@@ -91,5 +93,6 @@ class RCog(traits.CogTraits):
             with io.BytesIO(result.images[i][0]) as bio:
                 f = discord.File(bio, f"output_{i+1}.png")
                 additionals.append(await ctx.send(file=f))
+                tools.remember_responses(ctx, booklet, *additionals)
 
         await tools.listen_to_edit(ctx, booklet, *additionals)
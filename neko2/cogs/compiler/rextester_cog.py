@@ -29,7 +29,7 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from discomaton.factories import bookbinding
-from neko2.shared import traits, commands
+from neko2.shared import codeblocks, commands, traits
 
 from . import tools
 from .toolchains import rextester
@@ -43,6 +43,7 @@ class RextesterCog(traits.CogTraits):
         aliases=["rxt"],
         brief="Attempts to execute the code using "
         "[rextester.](http://rextester.com)",
+        cost=5,
     )
     async def rextester_group(self, ctx, *, source):
         """
@@ -59,9 +60,9 @@ class RextesterCog(traits.CogTraits):
         Run `rxt help` to view a list of the supported languages, or
         `rxt help <lang>` to view the help for a specific language.
         """
-        code_block = tools.code_block_re.search(source)
+        code_block = codeblocks.find(source, ctx.message)
 
-        if not code_block or len(code_block.groups()) < 2:
+        if not code_block:
             booklet = bookbinding.StringBookBinder(ctx)
             booklet.add_line(
                 "I couldn't detect a valid language in your "
@@ -74,7 +75,7 @@ class RextesterCog(traits.CogTraits):
             return await tools.listen_to_edit(ctx, booklet)
 
         # Extract the code
-        language, source = code_block.groups()
+        language, source = code_block
         language = language.lower()
 
         if language not in rextester.Language.__members__:
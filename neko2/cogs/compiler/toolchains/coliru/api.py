@@ -32,12 +32,34 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 import asyncio
+import codecs
+import hashlib
 import json
-from typing import Dict
+import os
+import sys
+import time
+from typing import Dict, Optional
 from dataclasses import dataclass
-from neko2.cogs.compiler import tools
 
-__all__ = ("HOST", "SourceFile", "Coliru")
+import aiohttp
+
+from neko2.cogs.compiler import tools
+from neko2.shared import collections, errors, metrics, sandbox
+
+__all__ = (
+    "HOST",
+    "MAX_FILES",
+    "MAX_FILE_SIZE",
+    "MAX_TOTAL_SIZE",
+    "JobTooLargeError",
+    "SourceFile",
+    "Coliru",
+    "Backend",
+    "RemoteBackend",
+    "LocalBackend",
+    "get_backend",
+    "set_backend",
+)
 
 HOST = "http://coliru.stacked-crooked.com"
 SHARE_EP = "/share"
@@ -46,6 +68,59 @@ COMPILE_EP = "/compile"
 SHARE_ARCHIVE_DIR = "/Archive2"
 INITL_FILE_NAME = "main.cpp"
 
+# The most output to read from a job. Anything after this is thrown away,
+# and we stop reading. Nobody wants to page through megabytes of output.
+MAX_OUTPUT = 64 * 1024
+
+# Limits on what we will upload for a single job. These are checked before
+# anything is sent anywhere.
+MAX_FILES = 32
+MAX_FILE_SIZE = 256 * 1024
+MAX_TOTAL_SIZE = 1024 * 1024
+
+# How many files of a single job to share at once, and how many times to try
+# sharing each file before giving up.
+MAX_CONCURRENT_SHARES = 4
+SHARE_ATTEMPTS = 3
+
+# How long to reuse the output of running identical code for. Programs that
+# print the time or random numbers will give the same output within this
+# window, which is a fair price for not running the same example from
+# `cc help` hundreds of times.
+RESULT_TTL = 5 * 60
+# Shared files are kept in the archive indefinitely, so remember where
+# they went for much longer.
+SHARE_TTL = 24 * 60 * 60
+
+# Hash of the job -> output.
+_results = collections.TtlCache(RESULT_TTL, max_size=256)
+# Hash of the job -> task running it, so identical jobs submitted at the
+# same time only run once.
+_in_flight: Dict[str, asyncio.Future] = {}
+# Hash of a file's code -> path of the file in the archive.
+_shares = collections.TtlCache(SHARE_TTL, max_size=1024)
+
+metrics.registry.describe(
+    "coliru_cache_total", "Coliru jobs and shared files, by whether they were cached."
+)
+metrics.registry.describe(
+    "coliru_share_retries_total", "Times sharing a file on Coliru was retried."
+)
+
+
+class JobTooLargeError(errors.CommandExecutionError):
+    """Raised if a job has too many files, or files that are too big."""
+
+
+def _digest(*parts: str) -> str:
+    sha = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8", "surrogatepass")
+        # Length-prefix each part so that ("ab", "c") != ("a", "bc").
+        sha.update(len(data).to_bytes(8, "little"))
+        sha.update(data)
+    return sha.hexdigest()
+
 
 @dataclass()
 class SourceFile:
@@ -78,6 +153,11 @@ class SourceFile:
 class Coliru:
     """
     Handles "running" an instance of Coliru.
+
+    :param python_mode: ``"script"`` or ``"repl"`` if the main file is plain
+        Python 3 that a backend may run in a warm interpreter instead of with
+        the shell script. ``"repl"`` echoes the value of each expression
+        statement, like the interactive interpreter does.
     """
 
     def __init__(
@@ -86,11 +166,15 @@ class Coliru:
         main_file: SourceFile,
         *other_files: SourceFile,
         verbose=False,
+        python_mode: Optional[str] = None,
     ):
         self.shell_script = shell_script
         self.main_file = main_file
         self.other_files = other_files
         self.verbose = verbose
+        self.python_mode = python_mode
+        # Seconds spent on each stage of running the job, by stage name.
+        self.timings: Dict[str, float] = {}
 
     @property
     def files(self):
@@ -98,27 +182,83 @@ class Coliru:
         yield self.main_file
         yield from self.other_files
 
+    def check_limits(self):
+        """
+        Ensures the job is small enough to run.
+
+        :raises JobTooLargeError: if it is not.
+        """
+        files = list(self.files)
+        if len(files) > MAX_FILES:
+            raise JobTooLargeError(f"You can only give up to {MAX_FILES} files.")
+
+        total = 0
+        for file in files:
+            size = len(file.code.encode("utf-8", "surrogatepass"))
+            if size > MAX_FILE_SIZE:
+                raise JobTooLargeError(
+                    f"`{file.name}` is too big. Files can be up to "
+                    f"{MAX_FILE_SIZE // 1024} KiB."
+                )
+            total += size
+
+        if total > MAX_TOTAL_SIZE:
+            raise JobTooLargeError(
+                f"Your files are too big. They can be up to "
+                f"{MAX_TOTAL_SIZE // 1024} KiB altogether."
+            )
+
+    @classmethod
+    async def _share_with_retry(
+        cls, session, file: SourceFile, semaphore: asyncio.Semaphore
+    ) -> (SourceFile, str):
+        """
+        Shares the file, trying again a few times if Coliru is having a bad
+        day. Client errors are not retried, as they will not fix themselves.
+        """
+        async with semaphore:
+            for attempt in range(1, SHARE_ATTEMPTS + 1):
+                try:
+                    return await cls._share(session, file)
+                except aiohttp.ClientResponseError as ex:
+                    if ex.status < 500 or attempt == SHARE_ATTEMPTS:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt == SHARE_ATTEMPTS:
+                        raise
+                metrics.registry.inc("coliru_share_retries_total")
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
     @staticmethod
     async def _share(session, file: SourceFile) -> (SourceFile, str):
         """
         Shares the given resource on Coliru and returns the path to the file on
-        the file system for later use.
+        the file system for later use. Files with the same code are only ever
+        shared once.
         """
+        key = _digest(file.code)
+        path = _shares.get(key)
+        if path is not None:
+            metrics.registry.inc("coliru_cache_total", kind="share", outcome="hit")
+            return file, path
+
+        metrics.registry.inc("coliru_cache_total", kind="share", outcome="miss")
         url = f"{HOST}{SHARE_EP}"
         data = json.dumps({"cmd": "", "src": file.code})
 
-        resp = await session.post(url, data=data)
-
-        # Raise if we have a screw-up.
-        resp.raise_for_status()
+        async with session.post(url, data=data) as resp:
+            # Raise if we have a screw-up.
+            resp.raise_for_status()
 
-        # for output "c97cd0bcdef4ce24", we would assume
-        # the path would be Archive2/c9/7cd0bcdef4ce24
-        identifier = (await resp.text()).strip()
+            # for output "c97cd0bcdef4ce24", we would assume
+            # the path would be Archive2/c9/7cd0bcdef4ce24
+            identifier = (await resp.text()).strip()
 
         first_two, rest = identifier[:2], identifier[2:]
 
-        return (file, f"{SHARE_ARCHIVE_DIR}/{first_two}/{rest}/{INITL_FILE_NAME}")
+        path = f"{SHARE_ARCHIVE_DIR}/{first_two}/{rest}/{INITL_FILE_NAME}"
+        _shares[key] = path
+        return file, path
 
     def _generate_script(self, files: Dict[SourceFile, str]) -> str:
         """
@@ -144,25 +284,247 @@ class Coliru:
 
         return "\n".join(script_lines)
 
-    async def execute(self, session, loop=asyncio.get_event_loop()) -> str:
+    @property
+    def digest(self) -> str:
+        """
+        A hash of everything that affects the output: the build script, and
+        the name and code of each file.
+        """
+        parts = [self.shell_script, str(self.verbose), str(self.python_mode)]
+        for file in self.files:
+            parts.extend((file.name, file.code))
+        return _digest(*parts)
+
+    async def execute(
+        self, session, loop=asyncio.get_event_loop(), *, on_output=None
+    ) -> str:
         """
         Collects the data we need and sends it to coliru for processing.
-        This will then return a string containing the full output.
+        This will then return a string containing the full output, cut short
+        after ``MAX_OUTPUT`` bytes.
+
+        If identical code was run recently, the output from then is given
+        instead. If identical code is running right now, we wait for that
+        instead of running it again.
+
+        :param on_output: an optional coroutine function that is awaited
+            with all the output so far, each time more arrives. This is only
+            called if we actually run the job.
+        :raises JobTooLargeError: if the job is too big to run.
         """
-        # Generate futures then await them together.
-        futures = []
-        for file in self.other_files:
-            futures.append(loop.create_task(self._share(session, file)))
+        self.check_limits()
+
+        # The same code can behave differently elsewhere.
+        key = f"{type(_backend).__name__}:{self.digest}"
+
+        output = _results.get(key)
+        if output is not None:
+            metrics.registry.inc("coliru_cache_total", kind="result", outcome="hit")
+            return output
+
+        future = _in_flight.get(key)
+        if future is None:
+            metrics.registry.inc("coliru_cache_total", kind="result", outcome="miss")
+            future = loop.create_task(self._execute(session, loop, on_output))
+            _in_flight[key] = future
+
+            def on_done(task):
+                _in_flight.pop(key, None)
+                if not task.cancelled() and not task.exception():
+                    _results[key] = task.result()
+
+            future.add_done_callback(on_done)
+        else:
+            metrics.registry.inc(
+                "coliru_cache_total", kind="result", outcome="in_flight"
+            )
+
+        # Don't cancel the job for anyone else waiting on it if we give up.
+        return await asyncio.shield(future)
+
+    async def _execute(self, session, loop, on_output) -> str:
+        return await _backend.run(self, session, loop, on_output)
 
-        results = await asyncio.gather(*futures, loop=loop)
+
+class Backend:
+    """Runs Coliru jobs somewhere, and gives back the output."""
+
+    async def run(self, job: Coliru, session, loop, on_output=None) -> str:
+        """
+        Runs the job.
+
+        :param job: the job to run.
+        :param session: an HTTP client session to use, if needed.
+        :param loop: the event loop.
+        :param on_output: see ``Coliru.execute``.
+        :return: everything the job printed, up to ``MAX_OUTPUT`` bytes.
+        """
+        raise NotImplementedError
+
+
+class _OutputCollector:
+    """Decodes output as it arrives, stopping once there is too much."""
+
+    def __init__(self, on_output, limit=MAX_OUTPUT):
+        self.on_output = on_output
+        self.limit = limit
+        self.size = 0
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+        self._parts = []
+
+    async def feed(self, chunk: bytes) -> bool:
+        """Adds a chunk. Returns false once we want no more."""
+        if self.size + len(chunk) > self.limit:
+            chunk = chunk[: self.limit - self.size]
+            self.truncated = True
+        self.size += len(chunk)
+        self._parts.append(self._decoder.decode(chunk))
+
+        if self.on_output is not None:
+            await self.on_output("".join(self._parts))
+        return not self.truncated
+
+    def finish(self, note=None) -> str:
+        self._parts.append(self._decoder.decode(b"", final=True))
+        if self.truncated:
+            self._parts.append(
+                note or f"\n[Output was cut short after {self.limit // 1024} KiB.]"
+            )
+        return "".join(self._parts)
+
+
+class RemoteBackend(Backend):
+    """Runs jobs on Coliru itself."""
+
+    async def run(self, job: Coliru, session, loop, on_output=None) -> str:
+        # Share a few files at a time, rather than opening a connection for
+        # every file at once.
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SHARES)
+        results = await asyncio.gather(
+            *(job._share_with_retry(session, f, semaphore) for f in job.other_files)
+        )
+        job.timings["share"] = time.perf_counter() - start
 
         files = {file: path for file, path in results}
-        files[self.main_file] = INITL_FILE_NAME
+        files[job.main_file] = INITL_FILE_NAME
+
+        script = job._generate_script(files)
+
+        payload = json.dumps({"cmd": script, "src": job.main_file.code})
+
+        start = time.perf_counter()
+        collector = _OutputCollector(on_output)
+        async with session.post(f"{HOST}{COMPILE_EP}", data=payload) as resp:
+            resp.raise_for_status()
+            # Read as it arrives, so we can show it early, and stop if the
+            # job prints far too much.
+            async for chunk in resp.content.iter_any():
+                if not await collector.feed(chunk):
+                    break
+        job.timings["run"] = time.perf_counter() - start
+        return collector.finish()
+
+
+# Runs Python snippets in warm workers. Workers cannot see our files, so this
+# is copied into each worker's directory along with what it needs.
+PYTHON_WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyworker.py")
+PYTHON_WORKER_FILES = ("pyworker.py", "replify.py")
+
+# Modules Python workers import before they are given any code, so that
+# snippets using them do not have to wait.
+PYTHON_PRELOAD = (
+    "collections",
+    "dataclasses",
+    "datetime",
+    "decimal",
+    "fractions",
+    "functools",
+    "itertools",
+    "json",
+    "math",
+    "random",
+    "re",
+    "statistics",
+    "string",
+    "typing",
+)
+
+
+class LocalBackend(Backend):
+    """
+    Runs jobs on this machine in a sandbox. This uses whatever compilers and
+    interpreters are installed here, which may not match those on Coliru.
 
-        script = self._generate_script(files)
+    Jobs with a ``python_mode`` can instead be run by the interpreter running
+    the bot, a few copies of which are kept started in the sandbox, so that
+    snippets do not have to wait for one to start. The sandbox user must be
+    able to run this interpreter. This is off by default.
 
-        payload = json.dumps({"cmd": script, "src": self.main_file.code})
+    :param box: the sandbox to use.
+    :param python_workers: how many Python interpreters to keep waiting.
+        Leave this as 0 to run Python the same way as everything else.
+    """
 
-        resp = await session.post(f"{HOST}{COMPILE_EP}", data=payload)
-        resp.raise_for_status()
-        return (await resp.read()).decode("utf-8", "ignore")
+    def __init__(self, box: sandbox.Sandbox = None, *, python_workers: int = 0):
+        self.sandbox = box or sandbox.Sandbox()
+        self.python_pool = None
+        if python_workers:
+            files = {}
+            for name in PYTHON_WORKER_FILES:
+                with open(os.path.join(os.path.dirname(PYTHON_WORKER), name)) as fp:
+                    files[name] = fp.read()
+            argv = [sys.executable, "-I", "-u", "pyworker.py", *PYTHON_PRELOAD]
+            self.python_pool = sandbox.WarmPool(
+                self.sandbox, argv, files=files, size=python_workers
+            )
+
+    async def _run_python(self, job: Coliru, on_output) -> str:
+        """Runs the main file of a Python job in a warm worker."""
+        data = f"{job.python_mode}\n{job.main_file.code}".encode()
+        collector = _OutputCollector(on_output)
+        result = await self.python_pool.run(data, on_output=collector.feed)
+        job.timings["run"] = result.duration
+        output = self._finish(collector, result)
+        if result.returncode is not None:
+            # The same as what Coliru jobs print.
+            output += f"Returned {result.returncode}\n"
+        return output
+
+    async def run(self, job: Coliru, session, loop, on_output=None) -> str:
+        if job.python_mode is not None and self.python_pool is not None:
+            return await self._run_python(job, on_output)
+
+        files = {file.name: file.code for file in job.files}
+        script = f"set -x\n{job.shell_script}" if job.verbose else job.shell_script
+
+        # The sandbox has its own output limit, but we want the same one as
+        # we use for Coliru.
+        collector = _OutputCollector(on_output)
+        result = await self.sandbox.run(script, files, on_output=collector.feed)
+        job.timings["run"] = result.duration
+        return self._finish(collector, result)
+
+    def _finish(self, collector: _OutputCollector, result: sandbox.SandboxResult):
+        stopped = "\n[Output was too long, so the job was stopped.]"
+        output = collector.finish(stopped)
+        if result.truncated and not collector.truncated:
+            output += stopped
+        if result.timed_out:
+            output += f"\n[Killed after {self.sandbox.timeout:,.0f}s.]"
+        return output
+
+
+_backend: Backend = RemoteBackend()
+
+
+def get_backend() -> Backend:
+    """Gets the backend jobs are currently run on."""
+    return _backend
+
+
+def set_backend(backend: Backend):
+    """Changes the backend to run jobs on from now on."""
+    global _backend
+    _backend = backend
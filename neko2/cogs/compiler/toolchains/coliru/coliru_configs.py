@@ -32,29 +32,117 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import asyncio
+import logging
+import os
 import textwrap
-import requests
+import typing
 
 from .api import *
-from neko2.shared import ioutil, traits
+from neko2.shared import ioutil, pragmas, traits
+from neko2.shared.pragmas import Pragma
 
-# Thank asottile for this!
+# Thank asottile for this! These backport f-strings to the Python 3.5 that
+# Coliru has. They are pinned to releases that still support 3.5, and only
+# downloaded the first time someone runs Python code. After that, they are
+# kept on disk, so they are not downloaded again, even after restarting.
 asottile_base = "https://raw.githubusercontent.com/asottile"
-ffstring_url = asottile_base + "/future-fstrings/master/future_fstrings.py"
-trt_url = asottile_base + "/tokenize-rt/master/tokenize_rt.py"
-ffstring_src = requests.get(ffstring_url).text
-trt_src = requests.get(trt_url).text
+python_helpers = {
+    # File name: (URL, version)
+    "tokenize_rt.py": (asottile_base + "/tokenize-rt/{}/tokenize_rt.py", "v2.1.0"),
+    "future_fstrings.py": (
+        asottile_base + "/future-fstrings/{}/future_fstrings.py",
+        "v0.4.4",
+    ),
+}
+helper_cache_dir = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "neko2",
+    "coliru",
+)
 
 # Thank me for this!
-with open(ioutil.in_here("replify.py")) as fp:
-    replify_src = fp.read()
-del fp, trt_url, ffstring_url, asottile_base
+replify_path = ioutil.in_here("replify.py")
+
+# The helper files to send with every Python job, and with REPL jobs. These
+# are made once, so that the code is identical each time, meaning each file
+# is only ever shared with Coliru once.
+_python_payload: typing.Optional[typing.Tuple[SourceFile, ...]] = None
+_repl_payload: typing.Optional[typing.Tuple[SourceFile, ...]] = None
+# Made on first use, as this may be imported on a thread with no event loop.
+_payload_lock: typing.Optional[asyncio.Lock] = None
+
+
+def _acquire_payload_lock() -> asyncio.Lock:
+    global _payload_lock
+    if _payload_lock is None:
+        _payload_lock = asyncio.Lock()
+    return _payload_lock
+
+
+def _cached_helper_path(file_name, version):
+    name, ext = os.path.splitext(file_name)
+    return os.path.join(helper_cache_dir, f"{name}-{version}{ext}")
+
+
+def _write_helper(path, code):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as fp:
+        fp.write(code)
+    os.replace(temp, path)
+
+
+async def _get_helper(file_name) -> SourceFile:
+    """Reads a helper from the disk cache, downloading it if it is not there."""
+    url, version = python_helpers[file_name]
+    path = _cached_helper_path(file_name, version)
+
+    try:
+        code = (await traits.CogTraits.read_asset(path)).decode()
+    except FileNotFoundError:
+        url = url.format(version)
+        logging.getLogger(__name__).info(f"Downloading {url}")
+        sesh = await traits.CogTraits.acquire_http()
+        async with sesh.get(url) as resp:
+            resp.raise_for_status()
+            code = await resp.text()
+        await traits.CogTraits.run_in_io_executor(_write_helper, [path, code])
+
+    return SourceFile(file_name, code)
+
+
+async def python_payload(repl=False) -> typing.Tuple[SourceFile, ...]:
+    """
+    Gets the helper files to send along with Python code.
+
+    :param repl: true to include the REPL wrapper as well.
+    """
+    global _python_payload, _repl_payload
+
+    if _python_payload is None or repl and _repl_payload is None:
+        async with _acquire_payload_lock():
+            if _python_payload is None:
+                _python_payload = tuple(
+                    await asyncio.gather(*map(_get_helper, python_helpers))
+                )
+            if repl and _repl_payload is None:
+                replify = await traits.CogTraits.read_asset(replify_path)
+                _repl_payload = (
+                    *_python_payload,
+                    SourceFile("replify.py", replify.decode()),
+                )
+
+    return _repl_payload if repl else _python_payload
+
 
 # Maps human readable languages to their syntax highlighting strings.
 languages = {}
 # Maps a language or syntax highlighting option to the docstring.
 docs = {}
-# Maps a language or syntax highlighting option
+# Maps a language or syntax highlighting option to a coroutine function
+# taking the source code, and optionally an ``on_output`` coroutine function
+# to pass to ``Coliru.execute``.
 targets = {}
 
 
@@ -82,8 +170,13 @@ def register(*names, language):
     return decorator
 
 
+# Pragmas each language understands.
+_c_pragmas = Pragma.M32 | Pragma.ASM | Pragma.GCC | Pragma.MATH | Pragma.PTHREAD
+_cpp_pragmas = Pragma.M32 | Pragma.ASM | Pragma.FS | Pragma.MATH | Pragma.PTHREAD
+
+
 @register(language="C")
-async def c(source):
+async def c(source, on_output=None):
     """LLVM Clang C compiler
 
     Note that this will compile with the `-Wall`, `-Wextra`, `-Wpedantic`,
@@ -111,25 +204,25 @@ async def c(source):
         "-Wall -Wextra -Wno-unknown-pragmas -pedantic -g -O0 -std=c11 -o a.out app.c "
     )
 
-    lines = source.split("\n")
+    flags, source = pragmas.parse(source, _c_pragmas)
 
-    if "#pragma neko math" in lines:
+    if flags & Pragma.MATH:
         script += "-lm "
 
-    if "#pragma neko pthread" in lines:
+    if flags & Pragma.PTHREAD:
         script += "-lpthread "
 
-    if "#pragma neko 32" in lines:
+    if flags & Pragma.M32:
         script += "-m32 "
 
-    if "#pragma neko gcc" not in lines:
+    if not flags & Pragma.GCC:
         if not source.endswith("\n"):
             source += "\n"
         compiler = "clang "
     else:
         compiler = "gcc "
 
-    if "#pragma neko asm" in lines:
+    if flags & Pragma.ASM:
         script += " -S -Wa,-ashl"
         execute = "cat -n ./a.out"
     else:
@@ -143,11 +236,11 @@ async def c(source):
     cc = Coliru("make -f Makefile", make, main)
 
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("c++", "cc", language="C++")
-async def cpp(source):
+async def cpp(source, on_output=None):
     """GNU C++ compiler
 
     Note that this will compile with the `-Wall`, `-Wextra`, `-Wpedantic`,
@@ -173,24 +266,24 @@ async def cpp(source):
     """
     script = "-Wall -Wextra -Wno-unknown-pragmas -pedantic -g -O0 -o a.out app.cpp "
 
-    lines = source.split("\n")
+    flags, source = pragmas.parse(source, _cpp_pragmas)
 
-    if "#pragma neko fs" in lines:
+    if flags & Pragma.FS:
         script += "-lstdc++fs "
 
-    if "#pragma neko math" in lines:
+    if flags & Pragma.MATH:
         script += "-lm "
 
-    if "#pragma neko pthread" in lines:
+    if flags & Pragma.PTHREAD:
         script += "-lpthread "
 
-    if "#pragma neko 32" in lines:
+    if flags & Pragma.M32:
         script += "-m32 "
 
     script += "-std=c++17 "
     compiler = "g++ "
 
-    if "#pragma neko asm" in lines:
+    if flags & Pragma.ASM:
         script += " -S -Wa,-ashl"
         execute = "cat -n ./a.out"
     else:
@@ -203,11 +296,11 @@ async def cpp(source):
 
     cc = Coliru("make -f Makefile", make, main)
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("python2.7", "py2", "py2.7", language="Python2")
-async def python2(source):
+async def python2(source, on_output=None):
     """Python2.7 Interpreter
 
     Example:
@@ -218,49 +311,56 @@ async def python2(source):
     script = 'python main.py; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.py", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("python3", "python3.5", "py", "py3", "py3.5", language="Python")
-async def python(source):
-    """Python3.5 Interpreter (complete with f-string backport support!)
+async def python(source, on_output=None):
+    """Python 3 Interpreter
 
     Example:
     ```python
     print('Hello, World')
     ```
-    
+
     Add the `# repl` comment as the first line to enable interactive
-    interpreter behaviour (I am still working on this, so 
+    interpreter behaviour, where the value of each expression is printed.
 
-    See <https://github.com/asottile/future-fstrings> and
+    On Coliru, this is Python 3.5, with f-strings backported. See
+    <https://github.com/asottile/future-fstrings> and
     <https://github.com/asottile/tokenize-rt> for more details on
-    how the f-string support is backported and implemented.
+    how the f-string support is backported and implemented. If code is
+    being run on this machine, it may be a newer Python instead.
     """
+    repl = any(
+        source.strip().startswith(x)
+        for x in ("#repl\n", "# repl\n", "#repr\n", "# repr\n")
+    )
+
     sesh = await traits.CogTraits.acquire_http()
 
-    source_files = [
-        SourceFile("main.py", source),
-        SourceFile("tokenize_rt.py", trt_src),
-        SourceFile("future_fstrings.py", ffstring_src),
-    ]
+    # Run it here in a warm interpreter if we can, as that is much quicker.
+    # This is the bot's own interpreter, so needs nothing backporting.
+    backend = get_backend()
+    if isinstance(backend, LocalBackend) and backend.python_pool is not None:
+        mode = "repl" if repl else "script"
+        cc = Coliru("python3 main.py", SourceFile("main.py", source), python_mode=mode)
+        return await cc.execute(sesh, on_output=on_output)
 
-    if any(
-        source.strip().startswith(x)
-        for x in ("#repl\n", "# repl\n", "#repr\n", "# repr\n")
-    ):
-        source_files.append(SourceFile("replify.py", replify_src))
+    source_files = [SourceFile("main.py", source), *await python_payload(repl)]
+
+    if repl:
         script = 'echo "Trying experimental REPL support!"; ' "python3.5 future_fstrings.py main.py | python3.5 replify.py; " 'echo "Returned $?"'
     else:
         script = "python3.5 future_fstrings.py main.py | python3.5; " 'echo "Returned $?"'
 
     cc = Coliru(script, *source_files)
 
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("pl", language="PERL 5")
-async def perl(source):
+async def perl(source, on_output=None):
     """PERL interpreter (PERL5)
 
     Example:
@@ -279,11 +379,11 @@ async def perl(source):
     sesh = await traits.CogTraits.acquire_http()
     script = "perl main.pl"
     cc = Coliru(script, SourceFile("main.pl", source))
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("irb", language="Ruby")
-async def ruby(source):
+async def ruby(source, on_output=None):
     """Ruby interpreter.
 
     Example
@@ -312,11 +412,11 @@ async def ruby(source):
     script = "ruby main.rb"
     cc = Coliru(script, SourceFile("main.rb", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("shell", language="Shell")
-async def sh(source):
+async def sh(source, on_output=None):
     """Shell interpreter.
 
     Example
@@ -327,11 +427,11 @@ async def sh(source):
     script = 'sh main.sh; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.sh", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register(language="Bash")
-async def bash(source):
+async def bash(source, on_output=None):
     """Bash interpreter
 
     Example
@@ -342,13 +442,13 @@ async def bash(source):
     script = 'bash main.sh; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.sh", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 # Fortran libs are missing... go figure.
 
 # @register('gfortran', 'f08', language='Fortran 2008')
-async def fortran(source):
+async def fortran(source, on_output=None):
     """GNU Fortran Compiler (most recent standard)
 
     This compiles the given code to Fortran using the 2008 standard.
@@ -377,11 +477,11 @@ async def fortran(source):
     script = 'gfortran main.f08 && ./a.out; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.f08", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 # @register('gfortran90', 'f90', language='Fortran 1990')
-async def fortran90(source):
+async def fortran90(source, on_output=None):
     """GNU Fortran Compiler (1990 Standard)
 
     Example:
@@ -405,11 +505,11 @@ async def fortran90(source):
     script = 'gfortran main.f90 && ./a.out; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.f90", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 # @register('gfortran95', 'f95', language='Fortran 1995')
-async def fortran95(source):
+async def fortran95(source, on_output=None):
     """GNU Fortran Compiler (1995 Standard)
 
     Example:
@@ -433,11 +533,11 @@ async def fortran95(source):
     script = 'gfortran main.f95 && ./a.out; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.f95", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("gawk", language="GNU Awk")
-async def awk(source):
+async def awk(source, on_output=None):
     """GNU AWK interpreter.
 
     Example:
@@ -455,11 +555,11 @@ async def awk(source):
     script = 'awk -f main.awk; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.awk", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register(language="Lua")
-async def lua(source):
+async def lua(source, on_output=None):
     """Lua interpreter.
 
     Example:
@@ -480,11 +580,11 @@ async def lua(source):
     script = 'lua main.lua; echo "Returned $?"'
     cc = Coliru(script, SourceFile("main.lua", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
 
 
 @register("makefile", language="GNU Make")
-async def make(source):
+async def make(source, on_output=None):
     """GNU-make.
 
     Allows you to write a basic Makefile and execute it. Note that Makefiles
@@ -517,4 +617,4 @@ async def make(source):
     script = 'make -f Makefile; echo "Returned $?"'
     cc = Coliru(script, SourceFile("Makefile", source))
     sesh = await traits.CogTraits.acquire_http()
-    return await cc.execute(sesh)
+    return await cc.execute(sesh, on_output=on_output)
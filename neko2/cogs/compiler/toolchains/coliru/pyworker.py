@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runs Python snippets locally in a warm worker process.
+
+This is started ahead of time by a ``WarmPool``, imports the modules named
+on the command line, and then waits for a job on standard input. The first
+line of the job is the mode: ``repl`` to run the code through replify, so
+each expression statement is echoed like in the interactive shell, or
+``script`` to run it like a normal file. The rest is the code.
+
+Each worker only runs one job, then exits. This only depends on the standard
+library, and does not import anything from neko2, as it is run in isolated
+mode.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import importlib  # Preloading modules.
+import importlib.util  # Loading replify.
+import os  # Paths.
+import runpy  # Running scripts.
+import sys  # Arguments and standard input.
+import traceback  # Errors.
+
+
+def _load_replify():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replify.py")
+    spec = importlib.util.spec_from_file_location("replify", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    for name in sys.argv[1:]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    replify = _load_replify()
+    del sys.argv[1:]
+
+    # Blocks until we are given a job.
+    mode, _, source = sys.stdin.read().partition("\n")
+
+    if mode == "repl":
+        replify.run(source)
+    else:
+        # Write the file out so that tracebacks can show the code.
+        with open("main.py", "w") as fp:
+            fp.write(source)
+        sys.argv[0] = "main.py"
+        try:
+            runpy.run_path("main.py", run_name="__main__")
+        except SystemExit:
+            raise
+        except BaseException:
+            error, value, tb = sys.exc_info()
+            # Only show the frames that are from their code.
+            while tb is not None and tb.tb_frame.f_code.co_filename != "main.py":
+                tb = tb.tb_next
+            traceback.print_exception(error, value, tb)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
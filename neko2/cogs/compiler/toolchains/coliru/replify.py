@@ -41,9 +41,14 @@ import fileinput
 import inspect
 import sys
 import textwrap
+import traceback
 
 
 def main():
+    run("".join(fileinput.input()))
+
+
+def run(source):
     # How to parse each module level statement.
     FIRST_MODE = "exec"
     # How to parse each individual statement.
@@ -56,8 +61,6 @@ def main():
     # mode, input must be terminated by at least one newline character. This
     # is to facilitate detection of incomplete and complete statements in
     # the code module.
-    source = "".join(fileinput.input())
-
     while not source.endswith("\n\n"):
         source += "\n"
 
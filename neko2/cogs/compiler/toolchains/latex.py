@@ -31,11 +31,12 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 import io  # BytesIO
 
-import PIL.Image  # PIL Image loading
-import PIL.ImageDraw  # PIL Image drawing
 import discord  # Discord.py
 
-from neko2.shared import traits  # IOBound, CpuBound, and HTTP pools.
+from neko2.shared import lazy, scheduler, traits  # IOBound, CpuBound, and HTTP pools.
+
+# PIL Image loading
+image = lazy.lazy_import("PIL.Image")
 
 # URL endpoint to use.
 end_point = "http://latex.codecogs.com/"
@@ -161,7 +162,7 @@ class LatexCogHelper(traits.CogTraits):
         """
 
         def cpu_work():
-            old_img: PIL.Image.Image = PIL.Image.open(in_img)
+            old_img: image.Image = image.open(in_img)
 
             new_w = int(old_img.width * padding_pct_width)
             new_w = max(new_w, padding_min_width)
@@ -170,17 +171,17 @@ class LatexCogHelper(traits.CogTraits):
             new_x = int((new_w - old_img.width) / 2)
             new_y = int((new_h - old_img.height) / 2)
 
-            new_img = PIL.Image.new("RGBA", (new_w, new_h), (0x0, 0x0, 0x0, 0x0))
+            new_img = image.new("RGBA", (new_w, new_h), (0x0, 0x0, 0x0, 0x0))
 
             new_img.paste(old_img, (new_x, new_y))
 
-            non_transparent = PIL.Image.new("RGBA", (new_w, new_h), bg_colour)
+            non_transparent = image.new("RGBA", (new_w, new_h), bg_colour)
 
-            new_img = PIL.Image.alpha_composite(non_transparent, new_img)
+            new_img = image.alpha_composite(non_transparent, new_img)
 
             new_img.save(out_img, "PNG")
 
-        await cls.run_in_io_executor(cpu_work)
+        await cls.run_in_io_executor(cpu_work, lane=scheduler.CPU)
 
     @classmethod
     async def get_send_image(cls, ctx, content: str) -> discord.Message:
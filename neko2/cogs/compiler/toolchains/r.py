@@ -33,11 +33,15 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import asyncio
 import base64
 import json
-from typing import List, Optional, Tuple
+import time
+from typing import Dict, List, Optional, Tuple
 
-import async_timeout
 from dataclasses import dataclass
 
+from neko2.shared import metrics, scheduler, traits
+
+__all__ = ("HOST", "CranRResult", "JobTracker", "tracker", "eval_r")
+
 HOST = "https://rdrr.io"
 
 INVOKE_EP = "/snippets/run"
@@ -46,6 +50,12 @@ INVOKE_REQ = "POST"
 RETRIEVE_EP = "/snippets/get/"
 RETRIEVE_REQ = "GET"
 
+metrics.registry.describe("r_jobs_in_flight", "R jobs waiting on rdrr.io to finish.")
+metrics.registry.describe(
+    "r_job_seconds", "Time from submitting an R job to getting the result."
+)
+metrics.registry.describe("r_jobs_total", "R jobs that finished, by outcome.")
+
 
 @dataclass()
 class CranRResult:
@@ -56,14 +66,184 @@ class CranRResult:
     output: str
 
 
-async def eval_r(session, source: str, timeout=60, polling_pause=1):
+def _decode_images(images: List[dict]) -> List[Tuple[bytes, str]]:
+    # Plots can be several hundred KiB of base 64 each, so this is run on
+    # a thread rather than on the loop.
+    return [
+        # TODO: find out what $type means.
+        (base64.b64decode(image["$binary"]), image["$type"])
+        for image in images
+    ]
+
+
+class _Job:
+    __slots__ = ("url", "session", "future", "submitted_at", "deadline", "timer")
+
+    def __init__(self, url, session, future, timeout):
+        self.url = url
+        self.session = session
+        self.future = future
+        self.submitted_at = time.monotonic()
+        self.deadline = self.submitted_at + timeout
+        self.timer = None
+
+
+class JobTracker:
+    """
+    Waits on every R job that is running on rdrr.io from a single task.
+
+    Rather than each command polling for its own job once a second, all
+    in-flight jobs are polled together each round. The pause between rounds
+    starts at ``min_interval`` and doubles each round where nothing finished,
+    up to ``max_interval``. It goes back down to ``min_interval`` whenever
+    a job finishes or a new one is submitted, so short jobs still return
+    quickly while long ones do not hammer the API.
+
+    Each job is failed when its time is up by a timer of its own, so a slow
+    round cannot keep anyone waiting past their deadline. Each request is
+    also given at most ``request_timeout`` seconds, so that one request that
+    hangs does not hold up polling for every other job.
+
+    :param min_interval: the shortest pause between rounds, in seconds.
+    :param max_interval: the longest pause between rounds, in seconds.
+    :param request_timeout: the longest to wait on a single poll, in seconds.
+    """
+
+    def __init__(self, min_interval=0.5, max_interval=4, request_timeout=10):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.request_timeout = request_timeout
+        self._jobs: Dict[str, _Job] = {}
+        self._interval = min_interval
+        self._wake = None
+        self._poller = None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def submit(self, session, identifier: str, timeout=60) -> asyncio.Future:
+        """
+        Starts tracking the job with the given ID.
+
+        :param session: the client session to poll with.
+        :param identifier: the ID rdrr.io gave the job.
+        :param timeout: how long to wait before giving up, in seconds.
+        :return: a future for the raw JSON response of the finished job.
+            This raises ``asyncio.TimeoutError`` if the job takes too long.
+        """
+        loop = asyncio.get_event_loop()
+        job = _Job(
+            f"{HOST}{RETRIEVE_EP}{identifier}", session, loop.create_future(), timeout
+        )
+        self._jobs[identifier] = job
+        self._update_depth()
+
+        job.timer = loop.call_later(timeout, self._expire, job)
+        # If whoever is waiting gives up, stop polling for them.
+        job.future.add_done_callback(lambda _: self._forget(identifier, job))
+
+        # New jobs are probably quick, so poll again soon.
+        self._interval = self.min_interval
+        if self._poller is None or self._poller.done():
+            self._wake = asyncio.Event()
+            self._poller = loop.create_task(self._poll_forever())
+        else:
+            self._wake.set()
+
+        return job.future
+
+    @staticmethod
+    def _expire(job):
+        if not job.future.done():
+            job.future.set_exception(asyncio.TimeoutError())
+            metrics.registry.inc("r_jobs_total", outcome="timeout")
+
+    def _forget(self, identifier, job):
+        job.timer.cancel()
+        if self._jobs.get(identifier) is job:
+            del self._jobs[identifier]
+            self._update_depth()
+
+    def _update_depth(self):
+        metrics.registry.set("r_jobs_in_flight", len(self._jobs))
+
+    async def _poll_forever(self):
+        while self._jobs:
+            finished = await self._poll_once()
+
+            if finished:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self._interval * 2, self.max_interval)
+
+            if not self._jobs:
+                break
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_once(self) -> int:
+        """Polls every job once, returning how many finished."""
+        jobs = list(self._jobs.values())
+        outcomes = await asyncio.gather(
+            *(self._poll_job_in_time(job) for job in jobs), return_exceptions=True
+        )
+
+        finished = 0
+        now = time.monotonic()
+        for job, outcome in zip(jobs, outcomes):
+            if job.future.done():
+                continue
+            elif isinstance(outcome, BaseException):
+                job.future.set_exception(outcome)
+                finished += 1
+                metrics.registry.inc("r_jobs_total", outcome="error")
+            elif outcome is not None:
+                job.future.set_result(outcome)
+                finished += 1
+                metrics.registry.observe("r_job_seconds", now - job.submitted_at)
+                metrics.registry.inc("r_jobs_total", outcome=outcome["state"])
+        return finished
+
+    async def _poll_job_in_time(self, job: _Job) -> Optional[dict]:
+        """
+        Polls the job, giving up on the request after ``request_timeout`` or
+        at the job's deadline, whichever is sooner. A request that timed out
+        counts as not finished yet. The job's own timer fails it once the
+        deadline has passed.
+        """
+        timeout = min(self.request_timeout, job.deadline - time.monotonic())
+        try:
+            return await asyncio.wait_for(self._poll_job(job), max(0, timeout))
+        except asyncio.TimeoutError:
+            return None
+
+    @staticmethod
+    async def _poll_job(job: _Job) -> Optional[dict]:
+        """Gets the response for the job if it has finished, or None."""
+        async with job.session.request(RETRIEVE_REQ, job.url) as retrieve:
+            retrieve.raise_for_status()
+            response = await retrieve.json()
+
+        if response["state"] == "complete" or response["result"] == "failure":
+            return response
+        return None
+
+
+# Tracks all jobs for this process.
+tracker = JobTracker()
+
+
+async def eval_r(session, source: str, timeout=60):
     """
     Evaluates the given R code asynchronously and returns a CranRResult if
     we complete the task within the given time frame.
     :param session: the client session for aiohttp to use.
     :param source: source to evaluate.
     :param timeout: timeout to die after (default is 1 minute)
-    :param polling_pause: the rate to poll at in seconds. Defaults to 1.
     :return: CranRResult object.
     """
     transmit = await session.request(
@@ -83,36 +263,13 @@ async def eval_r(session, source: str, timeout=60, polling_pause=1):
     if any(f not in first_response for f in ("_id", "result")):
         raise RuntimeError(f"Unexpected response: {first_response}")
 
-    identifier = first_response["_id"]
-
-    result_url = f"{HOST}{RETRIEVE_EP}{identifier}"
-
-    # The job will be running in the background. We should keep checking
+    # The job will be running in the background. The tracker keeps checking
     # for a given period of time before giving up.
-    with async_timeout.timeout(timeout):
-        while True:  # Breaks by asyncio.TimeoutError eventually.
-            retrieve = await session.request(RETRIEVE_REQ, result_url)
+    second_response = await tracker.submit(session, first_response["_id"], timeout)
 
-            # Raise errors
-            retrieve.raise_for_status()
-
-            second_response = await retrieve.json()
-
-            if second_response["state"] == "complete":
-                break
-            elif second_response["result"] == "failure":
-                break
-            else:
-                await asyncio.sleep(polling_pause)
-
-    # Decipher images from base 64 into raw bytes. Yes, this is blocking,
-    # but it should be a fairly fast operation to perform.
-    images = []
-    for image in second_response["images"]:
-        b64 = image["$binary"]
-        image_type = image["$type"]  # TODO: find out what this means.
-        byte_data = base64.b64decode(b64)
-        images.append((byte_data, image_type))
+    images = await traits.CogTraits.run_in_io_executor(
+        _decode_images, [second_response["images"]], lane=scheduler.CPU
+    )
 
     return CranRResult(
         second_response["failReason"],
@@ -125,6 +282,8 @@ async def eval_r(session, source: str, timeout=60, polling_pause=1):
 
 # Just like for Coliru. Unit testing time.
 if __name__ == "__main__":
+    import aiohttp
+
     source = "\n".join(
         (
             "library(ggplot2)",
@@ -142,5 +301,8 @@ if __name__ == "__main__":
         )
     )
 
-    result = asyncio.get_event_loop().run_until_complete(eval_r(source))
-    print(result)
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            print(await eval_r(session, source))
+
+    asyncio.get_event_loop().run_until_complete(main())
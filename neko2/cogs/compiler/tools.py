@@ -30,8 +30,12 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 import asyncio
 import re
+import time
+import typing
 
-from neko2.shared import commands
+import discord
+
+from neko2.shared import commands, metrics
 
 __inline_block = r"`([^\s`][^`]*?)`"
 
@@ -48,10 +52,6 @@ __fnab = (
     r"`((?:[^.\s\\/`][^`\\/]*){1}?)`"
     r"\s*```(?:[a-zA-Z0-9]+)?\s([\s\S(^\\`{3})]*?)\s*```"
 )
-__highlighted_block = r"```([a-zA-Z0-9]+)\s([\s\S(^\\`{3})]*?)\s*```"
-
-# Used to detect code blocks.
-code_block_re = re.compile(__highlighted_block)
 
 # A general inline block
 inline_block_re = re.compile(__inline_block)
@@ -61,7 +61,7 @@ file_name_and_block_re = re.compile(__fnab)
 
 # Used to detect four-space indentation in Makefiles so that they can be
 # replaced with tab control characters.
-four_space_re = re.compile(r"^ {4}")
+four_space_re = re.compile(r"^(?: {4})+", re.MULTILINE)
 
 
 def fix_makefile(input_code: str) -> str:
@@ -71,25 +71,243 @@ def fix_makefile(input_code: str) -> str:
     :param input_code: the input string.
     :return: the makefile-friendly string.
     """
-    strings = []
-    for line in input_code.splitlines():
-        while four_space_re.match(line):
-            line = four_space_re.sub("\t", line)
-        strings.append(line)
-    return "\n".join(strings)
+    return four_space_re.sub(lambda m: "\t" * (len(m.group()) // 4), input_code)
+
+
+# How long to wait after an edit for any more edits before rerunning.
+EDIT_DEBOUNCE = 1.5
+# How long to keep rerunning a command on edits after it was first run.
+EDIT_TIMEOUT = 30 * 60
+
+# Message ID -> whatever is rerunning the command from that message.
+_rerunners: typing.Dict[int, "EditRerunner"] = {}
+
+metrics.registry.describe(
+    "compiler_edit_reruns_total", "Edits to compiler commands, by what we did."
+)
+
+
+class EditRerunner:
+    """
+    Reruns a command each time the message that invoked it is edited, for
+    a while after it was first run.
+
+    People tend to edit several times in quick succession while fixing a
+    typo, so we wait until they have stopped editing for ``debounce``
+    seconds before rerunning anything. If they edit again while the command
+    is still running, that run is cancelled, as nobody wants the output for
+    the old code any more. Edits that only change whitespace at the ends of
+    lines are ignored.
+
+    :param ctx: the context the command was first invoked in.
+    :param debounce: seconds to wait for further edits.
+    :param timeout: seconds after which to stop listening for edits.
+    """
+
+    def __init__(self, ctx, *, debounce=EDIT_DEBOUNCE, timeout=EDIT_TIMEOUT):
+        if not hasattr(ctx.command, "qualified_names"):
+            raise TypeError(
+                "This only works on command types that are derived from "
+                "neko2.shared.commands.CommandMixin."
+            )
+
+        self.ctx = ctx
+        self.debounce = debounce
+        self.deadline = time.monotonic() + timeout
+        self.booklet = None
+        self.additional_messages = ()
+        self._last_key = self._key(ctx.message.content)
+        self._running: typing.Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(content: str) -> str:
+        return "\n".join(line.rstrip() for line in content.strip().splitlines())
+
+    def set_responses(self, booklet, additional_messages):
+        """Sets what to delete before the command is next rerun."""
+        self.booklet = booklet
+        self.additional_messages = additional_messages
+
+    def _is_rerun(self, _before, after) -> bool:
+        ctx = self.ctx
+        if after.id != ctx.message.id or not after.content.startswith(ctx.prefix):
+            return False
+        content = after.content[len(ctx.prefix) :].lstrip()
+        return any(content.startswith(n) for n in ctx.command.qualified_names)
+
+    async def _next_edit(self, timeout):
+        """
+        Waits for an edit, then for the edits to stop, and gets the message
+        as it was last edited.
+
+        :raises asyncio.TimeoutError: if nothing is edited in time.
+        """
+        wait_for = self.ctx.bot.wait_for
+        _, after = await wait_for("message_edit", check=self._is_rerun, timeout=timeout)
+        while True:
+            try:
+                _, after = await wait_for(
+                    "message_edit", check=self._is_rerun, timeout=self.debounce
+                )
+            except asyncio.TimeoutError:
+                return after
+
+    async def _delete_responses(self):
+        for message in self.additional_messages:
+            await commands.try_delete(message)
+        if self.booklet is not None:
+            await commands.try_delete(await self.booklet.root_resp)
+        self.set_responses(None, ())
+
+    def _on_rerun_done(self, new_ctx, task):
+        """
+        Reruns are not invoked by the bot, so nothing else would see their
+        errors. Hand them to the usual error handler instead.
+        """
+        if task.cancelled():
+            return
+        ex = task.exception()
+        if ex is None:
+            return
+        elif not isinstance(ex, commands.CommandError):
+            ex = commands.CommandInvokeError(ex)
+        self.ctx.bot.dispatch("command_error", new_ctx, ex)
+
+    async def listen(self):
+        """Listens for edits until we time out."""
+        ctx = self.ctx
+        try:
+            while True:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+
+                try:
+                    after = await self._next_edit(remaining)
+                except asyncio.TimeoutError:
+                    return
+
+                key = self._key(after.content)
+                if key == self._last_key:
+                    metrics.registry.inc(
+                        "compiler_edit_reruns_total", action="unchanged"
+                    )
+                    continue
+                self._last_key = key
+
+                if self._running is not None and not self._running.done():
+                    self._running.cancel()
+                    metrics.registry.inc("compiler_edit_reruns_total", action="cancel")
+                    # Let it unwind first, so that anything it sent before it
+                    # was cancelled has been remembered and gets deleted.
+                    await asyncio.wait([self._running])
+
+                await self._delete_responses()
+
+                new_ctx = await ctx.bot.get_context(after)
+                self._running = ctx.bot.loop.create_task(ctx.command.reinvoke(new_ctx))
+                self._running.add_done_callback(
+                    lambda task, new_ctx=new_ctx: self._on_rerun_done(new_ctx, task)
+                )
+                metrics.registry.inc("compiler_edit_reruns_total", action="rerun")
+        finally:
+            if _rerunners.get(ctx.message.id) is self:
+                del _rerunners[ctx.message.id]
+
+
+def remember_responses(ctx, booklet=None, *additional_messages):
+    """
+    If the command is being rerun on edits, remembers the responses to delete
+    before it is next rerun. Call this as soon as anything is sent, as a rerun
+    can be cancelled at any point if the message is edited again, and it would
+    never reach ``listen_to_edit`` to do this for us.
+    """
+    rerunner = _rerunners.get(ctx.message.id)
+    if rerunner is not None:
+        rerunner.set_responses(booklet, additional_messages)
 
 
 async def listen_to_edit(ctx, booklet=None, *additional_messages):
-    # Lets the book start up first, otherwise we get an error. If
-    # we cant send, then just give up.
-    for _ in range(0, 60):
-        await asyncio.sleep(1)
-
-        async def custom_delete():
-            for message in additional_messages:
-                await message.delete()
-            await (await booklet.root_resp).delete()
-
-        await commands.wait_for_edit(
-            ctx=ctx, msg=booklet.root_resp, timeout=1800, custom_delete=custom_delete
-        )
+    """
+    Reruns the command if the invoking message is edited, deleting the
+    booklet and any additional messages first.
+
+    If the command is already being rerun on edits, this just remembers the
+    new responses to delete next time, and returns straight away.
+    """
+    rerunner = _rerunners.get(ctx.message.id)
+    if rerunner is not None:
+        rerunner.set_responses(booklet, additional_messages)
+        return
+
+    rerunner = EditRerunner(ctx)
+    rerunner.set_responses(booklet, additional_messages)
+    _rerunners[ctx.message.id] = rerunner
+    await rerunner.listen()
+
+
+class OutputPreview:
+    """
+    Shows the first page of output from a long running job while the rest of
+    it is still arriving. Nothing is shown for jobs that finish quickly.
+    Pass ``update`` as the ``on_output`` of a job, and call ``close`` once
+    the job has finished, or once we stop waiting for it. Jobs can be shared
+    with other commands and outlive us, so nothing is shown after closing.
+
+    :param ctx: the context to reply to.
+    :param max_lines: how many lines make up the first page.
+    :param delay: how long the job must have been running before we show
+        anything.
+    :param interval: the least time to leave between edits.
+    """
+
+    def __init__(self, ctx, *, max_lines=25, delay=2.0, interval=2.0):
+        self.ctx = ctx
+        self.max_lines = max_lines
+        self.delay = delay
+        self.interval = interval
+        self.message = None
+        self._started_at = time.monotonic()
+        self._shown_at = None
+        self._shown = None
+        self._closed = False
+
+    async def update(self, output: str):
+        now = time.monotonic()
+        if self._closed:
+            return
+        elif now - self._started_at < self.delay:
+            return
+        elif self._shown_at is not None and now - self._shown_at < self.interval:
+            return
+
+        page = "\n".join(output.split("\n", self.max_lines)[: self.max_lines])
+        page = page.replace("```", "ˋˋˋ")[:1900]
+        if page == self._shown:
+            return
+
+        content = f"```markdown\n{page}\n```\n_Still running..._"
+        try:
+            if self.message is None:
+                message = await self.ctx.send(content)
+                if self._closed:
+                    # We were closed while sending it.
+                    await message.delete()
+                    return
+                self.message = message
+            else:
+                await self.message.edit(content=content)
+        except discord.HTTPException:
+            pass
+
+        self._shown_at, self._shown = now, page
+
+    async def close(self):
+        """Removes the preview, if one was shown, and stops showing it."""
+        self._closed = True
+        if self.message is not None:
+            try:
+                await self.message.delete()
+            except discord.HTTPException:
+                pass
+            self.message = None
@@ -32,11 +32,11 @@ import asyncio
 import re  # Regex
 import typing  # Type checking
 
-import bs4  # HTML parser
-
 from discomaton import userinput  # Option picker
 from discomaton.factories import bookbinding
-from neko2.shared import commands, errors, traits  # standard errors; HTTP pool
+from neko2.shared import commands, errors, lazy, traits  # standard errors; HTTP pool
+
+bs4 = lazy.lazy_import("bs4")  # HTML parser
 
 # CppReference stuff
 result_path = re.compile(r"^/w/c(pp)?/", re.I)
@@ -81,7 +81,7 @@ class CppCog(traits.CogTraits):
         # Parse the HTML response.
         tree = bs4.BeautifulSoup(resp)
 
-        cls.logger.info(href)
+        cls.logger.debug(href)
 
         if href.startswith("/w/"):
             # Assume we are redirected to the first result page
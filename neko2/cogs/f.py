@@ -69,6 +69,17 @@ class RespectsCog:
         self.bot = bot
         self.buckets: typing.Dict[discord.TextChannel, F] = {}
 
+    def __export_state(self):
+        """
+        Keeps any open buckets when this extension is reloaded. The same dict
+        is handed over, so buckets still waiting to time out will be removed
+        from the new cog.
+        """
+        return self.buckets
+
+    def __import_state(self, state):
+        self.buckets = state
+
     if ENABLE_NAKED:
 
         async def on_message(self, message):
@@ -32,13 +32,28 @@ import datetime
 import enum
 import io
 
-import PIL.Image as image
-import PIL.ImageDraw as draw
 import discord
 
-from neko2.shared import commands, ioutil, traits
+from neko2.shared import commands, ioutil, lazy, scheduler, traits
 
-default_map_image = image.open(ioutil.in_here("mercator-small.png"))
+image = lazy.lazy_import("PIL.Image")
+draw = lazy.lazy_import("PIL.ImageDraw")
+
+_default_map_image_path = ioutil.in_here("mercator-small.png")
+_default_map_image = None
+
+
+def get_default_map_image() -> "PIL.Image.Image":
+    """
+    Lazily decodes the default mercator bitmap the first time it is needed,
+    rather than at import time.
+    """
+    global _default_map_image
+    if _default_map_image is None:
+        img = image.open(_default_map_image_path)
+        img.load()
+        _default_map_image = img
+    return _default_map_image
 
 
 class MapCoordinate(enum.Enum):
@@ -54,7 +69,7 @@ class MercatorProjection:
     :param map_image: the image object to use for the projection.
     """
 
-    def __init__(self, map_image: image.Image = None):
+    def __init__(self, map_image: "PIL.Image.Image" = None):
         """
         Creates a mercator projection from the given Image object.
 
@@ -63,7 +78,7 @@ class MercatorProjection:
         If no image is given, the default mercator bitmap is used.
         """
         if map_image is None:
-            map_image = default_map_image.copy()
+            map_image = get_default_map_image().copy()
 
         self.image = map_image
         self.ox, self.oy = map_image.width / 2, map_image.height / 2
@@ -104,7 +119,7 @@ class MercatorProjection:
         """Deep copy the projection."""
         return MercatorProjection(self.image.copy())
 
-    def pen(self) -> draw.ImageDraw:
+    def pen(self) -> "PIL.ImageDraw.ImageDraw":
         """Gets an object capable of drawing over the projection."""
         return draw.ImageDraw(self.image)
 
@@ -140,16 +155,15 @@ class SpaceCog(traits.CogTraits):
             """
             pen.ellipse([(x - 4, y - 4), (x + 4, y + 4)], (255, 0, 0))
 
-            return mercator.image
-
-        img = await self.run_in_io_executor(_plot)
+            # PNG encoding is slow, so do it here rather than on the loop.
+            mercator.image.save(bytesio, "PNG")
 
-        img.save(bytesio, "PNG")
+        await self.run_in_io_executor(_plot, lane=scheduler.CPU)
 
         # Seek back to the start
         bytesio.seek(0)
 
-    @commands.command(brief="Shows you where the ISS is.")
+    @commands.command(brief="Shows you where the ISS is.", cost=3)
     @commands.cooldown(1, 30, commands.BucketType.guild)
     async def iss(self, ctx):
         """
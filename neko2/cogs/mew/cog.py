@@ -32,16 +32,14 @@ import os
 import random
 import traceback
 
-import discord
-
-from neko2.shared import commands, configfiles, ioutil, scribe
+from neko2.shared import commands, configfiles, ioutil, traits
 
 # Relative to this directory.
 bindings_file = "bindings"
 assets_directory = ioutil.in_here("assets")
 
 
-class MewReactsCog(scribe.Scribe):
+class MewReactsCog(traits.CogTraits):
     """Reactions cog."""
 
     def __init__(self):
@@ -99,7 +97,7 @@ class MewReactsCog(scribe.Scribe):
                     if ctx.invoked_with == "mewd":
                         await ctx.message.delete()
                     file_name = random.choice(self.images[react_name])
-                    await ctx.send(file=discord.File(file_name))
+                    await ctx.send(file=await self.asset_file(file_name))
                 except FileNotFoundError:
                     traceback.print_exc()
                     await ctx.send(
@@ -31,12 +31,13 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import contextlib
 import io
 from urllib import parse
-import xmlrpc.client as xmlrpcclient
 
 import discord
 
 from discomaton.factories import bookbinding
-from neko2.shared import alg, commands, string, traits
+from neko2.shared import alg, commands, lazy, scheduler, string, traits
+
+xmlrpcclient = lazy.lazy_import("xmlrpc.client")
 
 
 class PyCog(traits.CogTraits):
@@ -53,7 +54,7 @@ class PyCog(traits.CogTraits):
 
                 return data
 
-        data = await self.run_in_io_executor(executor)
+        data = await self.run_in_io_executor(executor, lane=scheduler.INTERACTIVE)
 
         bb = bookbinding.StringBookBinder(
             ctx, max_lines=20, prefix="```markdown", suffix="```"
@@ -31,12 +31,13 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from typing import List, Tuple
 
-import bs4
 from dataclasses import dataclass
 import discord
 
 from discomaton import option_picker
-from neko2.shared import alg, commands, string, traits
+from neko2.shared import alg, commands, lazy, string, traits
+
+bs4 = lazy.lazy_import("bs4")
 
 base_url = "https://tldrlegal.com/"
 
@@ -29,9 +29,10 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-import googletrans
 from discomaton.factories import bookbinding
-from neko2.shared import traits, commands, fuzzy
+from neko2.shared import circuitbreaker, traits, commands, fuzzy, lazy
+
+googletrans = lazy.lazy_import("googletrans")
 
 
 class TransCog(traits.CogTraits):
@@ -78,9 +79,10 @@ class TransCog(traits.CogTraits):
                 dest_lang = fuzzy_wuzzy_match(dest_lang)
 
             def pool():
-                return googletrans.Translator().translate(
-                    phrase, dest_lang, source_lang
-                )
+                with self.circuit("translate.google.com").guard():
+                    return googletrans.Translator().translate(
+                        phrase, dest_lang, source_lang
+                    )
 
             result = await self.run_in_io_executor(pool)
 
@@ -102,6 +104,9 @@ class TransCog(traits.CogTraits):
                 else:
                     await ctx.send(book.pages[0])
 
+        except circuitbreaker.CircuitOpenError:
+            # Let the error handler explain this one.
+            raise
         except Exception as ex:
             await ctx.send(str(ex).title(), delete_after=10)
 
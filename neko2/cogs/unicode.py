@@ -40,11 +40,12 @@ import re
 from typing import Optional, Union
 import unicodedata
 
-import bs4
 from dataclasses import dataclass
 
 from discomaton.factories import bookbinding
-from neko2.shared import alg, collections, commands, errors, traits
+from neko2.shared import alg, collections, commands, errors, lazy, traits
+
+bs4 = lazy.lazy_import("bs4")
 
 
 def _make_fileformat_url(codepoint: int) -> str:
@@ -42,7 +42,7 @@ import traceback
 
 import discord
 
-from neko2.shared import alg, commands, traits
+from neko2.shared import alg, commands, scheduler, traits
 from . import conversions, lex, models, parser
 
 # Wait 30 minutes.
@@ -95,7 +95,9 @@ class UnitCog(traits.CogTraits):
                 else:
                     raise ValueError("No valid message found in history.")
 
-            e = await self.run_in_io_executor(self.worker, [query])
+            e = await self.run_in_io_executor(
+                self.worker, [query], lane=scheduler.INTERACTIVE
+            )
             await ctx.send(embed=e)
 
         except ValueError as ex:
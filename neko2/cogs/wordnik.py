@@ -33,12 +33,14 @@ import typing
 import urllib.error
 
 # The API poops out XML tags.
-import bs4
 from discord import embeds
-from wordnik import WordApi, swagger
 
 from discomaton import book
-from neko2.shared import alg, commands, configfiles, errors, traits
+from neko2.shared import alg, commands, configfiles, errors, lazy, traits
+
+bs4 = lazy.lazy_import("bs4")
+swagger = lazy.lazy_import("wordnik.swagger")
+WordApi = lazy.lazy_import("wordnik.WordApi")
 
 config_file = "wordnik"
 
@@ -120,23 +122,38 @@ class WordnikCog(traits.CogTraits):
 
     def __init__(self):
         self._token = configfiles.get_config_data(config_file)
-        self.api_client = swagger.ApiClient(self._token, wordnik_endpoint)
-        self.api = WordApi.WordApi(self.api_client)
+        self._api = None
+
+    @property
+    def api(self):
+        """
+        Gets the Wordnik API client. This is only made on first use, as it
+        pulls in the swagger client.
+        """
+        if self._api is None:
+            api_client = swagger.ApiClient(self._token, wordnik_endpoint)
+            self._api = WordApi.WordApi(api_client)
+        return self._api
 
     async def _lookup(self, phrase: str) -> typing.List[dict]:
         """Executes the lookup in a thread pool to prevent blocking."""
 
-        partial = functools.partial(
-            self.api.getDefinitions,
-            phrase,
-            sourceDictionaries="all",
-            includeRelated=True,
-            useCanonical=True,
-            includeTags=True,
-        )
+        def call():
+            # A 404 just means the word does not exist, which is not the
+            # fault of the service.
+            with self.circuit("api.wordnik.com").guard(
+                lambda ex: not isinstance(ex, urllib.error.HTTPError) or ex.code >= 500
+            ):
+                return self.api.getDefinitions(
+                    phrase,
+                    sourceDictionaries="all",
+                    includeRelated=True,
+                    useCanonical=True,
+                    includeTags=True,
+                )
 
         try:
-            results = await self.run_in_io_executor(partial)
+            results = await self.run_in_io_executor(call)
             if not isinstance(results, list):
                 raise errors.NotFound("No result was found.")
             else:
@@ -91,6 +91,12 @@ class XkcdCache(threading.Thread, scribe.Scribe, metaclass=morefunctools.Singlet
 
     @threaded_cached_property_with_ttl(TTL_LIFESPAN)
     def cached_metadata(self):
+        """
+        The metadata of every comic we have crawled. This reads from disk
+        when it is not cached, so only access it off the event loop, such as
+        from this thread or in ``run_in_io_executor``. The file is rewritten
+        every few hours, so it is not suitable for ``read_asset``.
+        """
         data = []
         if os.path.exists(CACHE_FILE):
             with open(CACHE_FILE) as fp:
@@ -31,26 +31,105 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import concurrent.futures  # Thread pool for pre-importing.
+import importlib  # Dynamic imports.
 import logging  # Loggers.
+import os  # CPU count.
 import traceback  # Traceback utils.
 import typing  # Type checking
 
 from neko2.modules import modules  # Modules to load with.
-from neko2.shared import alg  # Timing.
+from neko2.shared import alg, profiler  # Timing.
 
-__all__ = ("auto_load_modules",)
+__all__ = ("auto_load_modules", "preimport_modules")
 
 
-def auto_load_modules(bot) -> typing.List[typing.Tuple[BaseException, str]]:
+def _import_one(module) -> typing.Tuple[str, float, typing.Optional[BaseException]]:
+    """
+    Imports the given module, returning the name, the time taken and any
+    exception that was raised. This never raises.
+    """
+    # noinspection PyBroadException
+    try:
+        _, time = alg.time_it(importlib.import_module, module)
+    except BaseException as ex:
+        return module, 0.0, ex
+    else:
+        return module, time, None
+
+
+def preimport_modules(
+    names: typing.Iterable[str], *, max_workers: int = None
+) -> typing.Dict[str, float]:
+    """
+    Imports each of the given modules concurrently in a thread pool, so that
+    any blocking module-level IO overlaps rather than running back to back.
+    This does not call any setup functions; the modules just end up in
+    ``sys.modules`` so that loading them as extensions later is cheap.
+
+    Importing concurrently is not always safe (e.g. a pair of modules that
+    import each other may trip the import lock deadlock detection). Any module
+    that fails to import here is simply skipped, and will be imported again
+    on the calling thread when it is loaded as an extension. That way, any
+    genuine error is reported from the usual place.
+
+    :param names: the fully qualified module names to import.
+    :param max_workers: the maximum number of threads to use. Defaults to the
+        number of logical cores, plus four, as most of this is IO bound.
+    :return: a mapping of each successfully imported module to the time taken
+        to import it in seconds.
+    """
+    logger = logging.getLogger(__name__)
+
+    names = list(names)
+    if not names:
+        return {}
+
+    max_workers = max_workers or min(len(names), (os.cpu_count() or 1) + 4)
+
+    times = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+        for module, time, ex in pool.map(_import_one, names):
+            if ex is None:
+                times[module] = time
+            else:
+                logger.warning(
+                    f"Could not pre-import {module} ({type(ex).__qualname__}: "
+                    f"{ex}). Will retry sequentially."
+                )
+    return times
+
+
+def _format_table(rows: typing.List[typing.Tuple[str, str, str, str]]) -> str:
+    """Formats rows of strings into a left-aligned plain text table."""
+    header = ("MODULE", "IMPORT", "SETUP", "STATUS")
+    rows = [header, *rows]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = [
+        "  ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip()
+        for row in rows
+    ]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def auto_load_modules(
+    bot, *, concurrent_imports=True
+) -> typing.List[typing.Tuple[BaseException, str]]:
     """
     Auto-loads any modules into the given bot.
     :param bot: the bot to load modules into.
-    :param config_file: optional. Config file to read. Defaults to the
-            'modules.yaml' file if unspecified.
+    :param concurrent_imports: defaults to True. If True, all modules are
+        imported concurrently first, and then each extension is set up
+        sequentially on the calling thread. If False, each module is imported
+        and set up one after the other.
 
     If any extensions fail to load, then we do not halt. A traceback is printed
     and we continue. Any errors are returned in a collection of 2-tuples paired
     with the name of the corresponding extension that caused the error.
+
+    Once done, a table of how long each module took to import and to set up
+    is logged.
     """
     logger = logging.getLogger(__name__)
 
@@ -59,7 +138,27 @@ def auto_load_modules(bot) -> typing.List[typing.Tuple[BaseException, str]]:
     if modules is None:
         logger.warning("No modules were listed.")
     else:
-        for module in modules:
+        # Sorted so the table is readable and the load order is deterministic.
+        ordered_modules = sorted(modules)
+
+        if concurrent_imports:
+            import_times, total_import_time = alg.time_it(
+                preimport_modules, ordered_modules
+            )
+            logger.info(
+                f"Pre-imported {len(import_times)}/{len(ordered_modules)} "
+                f"modules in {total_import_time * 1000:,.2f}ms"
+            )
+        else:
+            import_times = {}
+
+        rows = []
+        for module in ordered_modules:
+            import_time = import_times.get(module)
+            import_cell = (
+                f"{import_time * 1000:,.2f}ms" if import_time is not None else "-"
+            )
+
             # noinspection PyBroadException
             try:
                 _, time = alg.time_it(lambda: bot.load_extension(module))
@@ -67,8 +166,17 @@ def auto_load_modules(bot) -> typing.List[typing.Tuple[BaseException, str]]:
                 logger.fatal(f"FAILED TO LOAD {module}. SEE TRACEBACK BELOW.")
                 traceback.print_exc()
                 errors.append((ex, module))
+                rows.append((module, import_cell, "-", type(ex).__qualname__))
             else:
                 logger.info(f"Loaded module {module} in {time * 1000:,.2f}ms")
+                rows.append((module, import_cell, f"{time * 1000:,.2f}ms", "OK"))
+                profiler.startup.record(
+                    f"load_extension {module}",
+                    time,
+                    preimport_ms=import_time and round(import_time * 1000, 3),
+                )
+
+        logger.info("Module startup times:\n" + _format_table(rows))
         logger.warning(
             f"Loaded {len(modules) - len(errors)}/{len(modules)} "
             "modules successfully. Will now start bot."
@@ -32,6 +32,7 @@ import copy  # Deep and shallow copies of objects.
 import inspect  # Inspection
 import os  # Access to file system tools.
 import signal  # Access to kernel signals.
+import sys  # Module cache.
 import time  # Measuring uptime.
 import traceback  # Exception traceback utilities.
 
@@ -40,10 +41,10 @@ import discord  # Basic discord.py bits and pieces.
 from discord.ext import commands  # Discord.py extensions.
 from discord.utils import oauth_url  # OAuth URL generator
 
-from neko2.engine import errorhandler  # Error handling.
-from neko2.shared import perms, scribe  # Logging
+from neko2.engine import errorhandler, instrumentation, watchdog  # Error handling.
+from neko2.shared import admission, lazy, perms, scribe, traits  # Logging
 
-__all__ = ("BotInterrupt", "Bot")
+__all__ = ("BotInterrupt", "Bot", "AutoShardedBot")
 
 # Sue me.
 BotInterrupt = KeyboardInterrupt
@@ -98,6 +99,19 @@ class Bot(commands.Bot, scribe.Scribe):
     - on_remove_cog(cog)
     - on_load_extension(extension)
     - on_unload_extension(name)
+    - on_reload_extension(extension)
+
+    Reloading
+    ---------
+    Cogs may implement a pair of private methods to keep hold of in-memory
+    state (interaction history, warmed caches, etc) when the extension they
+    belong to is reloaded with ``reload_extension``:
+
+    - ``__export_state(self)`` - returns any object holding state to keep.
+    - ``__import_state(self, state)`` - takes the object the old instance of
+        the cog exported.
+
+    State is matched between the old and new cogs by class name.
 
     :param _unused_loop: the event loop to run on.
     :param bot_config:
@@ -105,6 +119,17 @@ class Bot(commands.Bot, scribe.Scribe):
         - ``auth`` - this must contain a ``token`` and a ``client_id`` member.
         - ``bot`` - this contains a group of kwargs to pass to the Discord.py
             Bot constructor.
+        - ``warm_imports`` - optional, defaults to true. If true, any modules
+            that cogs import lazily are imported in the background once the
+            bot is ready.
+        - ``metrics_port`` - optional. If set, metrics are served in the
+            Prometheus text format at ``http://127.0.0.1:<port>/metrics``.
+        - ``loop_lag_threshold`` - optional, defaults to 0.5. How long in
+            seconds the event loop can be blocked for before the watchdog
+            reports what is blocking it. Set to null to disable the watchdog.
+        - ``admission`` - optional. A dict of keyword arguments for the
+            ``admission.AdmissionController`` that limits how quickly each
+            user and guild can invoke commands. Set to null to disable it.
     """
 
     def __init__(self, _unused_loop, bot_config: dict):
@@ -117,6 +142,21 @@ class Bot(commands.Bot, scribe.Scribe):
         self.token = auth["token"]
         self.client_id = auth.get("client_id", None)
         self.debug = bot_config.pop("debug", False)
+        self.warm_imports = bot_config.pop("warm_imports", True)
+        self.metrics_port = bot_config.pop("metrics_port", None)
+
+        loop_lag_threshold = bot_config.pop("loop_lag_threshold", 0.5)
+        if loop_lag_threshold:
+            self.watchdog = watchdog.LoopWatchdog(self.loop, loop_lag_threshold)
+        else:
+            self.watchdog = None
+
+        admission_config = bot_config.pop("admission", {})
+        if admission_config is not None:
+            self.admission = admission.AdmissionController(**admission_config)
+            self.add_check(self.admission.check)
+        else:
+            self.admission = None
 
         # Used to prevent recursively calling logout.
         self._logged_in = False
@@ -128,6 +168,7 @@ class Bot(commands.Bot, scribe.Scribe):
         self._on_exit_coros = []
 
         self.add_cog(errorhandler.ErrorHandler(True, self))
+        self.add_cog(instrumentation.Instrumentation(self, self.metrics_port))
 
     def on_exit(self, func):
         """
@@ -169,12 +210,24 @@ class Bot(commands.Bot, scribe.Scribe):
 
         return user
 
+    async def invoke(self, ctx):
+        """Tags any logs from this command with where it was invoked from."""
+        scribe.set_context(
+            command=ctx.command.qualified_name if ctx.command else None,
+            guild=ctx.guild.id if ctx.guild else None,
+            channel=ctx.channel.id,
+            author=ctx.author.id,
+        )
+        await super().invoke(ctx)
+
     async def start(self, token):
         """Starts the bot with the given token."""
         self.logger.info(f"Invite me to your server at {self.invite}")
         self._logged_in = True
         self.dispatch("start")
         setattr(self, "start_time", time.time())
+        if self.watchdog is not None:
+            self.watchdog.start()
         await super().start(token)
 
     # noinspection PyBroadException
@@ -218,6 +271,9 @@ class Bot(commands.Bot, scribe.Scribe):
 
         self._logged_in = False
 
+        if self.watchdog is not None:
+            self.watchdog.stop()
+
         # Call on_exit handlers
         for handler in self._on_exit_funcs:
             handler()
@@ -285,6 +341,83 @@ class Bot(commands.Bot, scribe.Scribe):
         self.logger.info(f"Unloading extension {name!r}")
         super().unload_extension(name)
 
+    def _cogs_in_extension(self, name):
+        """Yields each loaded cog that was defined within the given extension."""
+        for cog in list(self.cogs.values()):
+            module = type(cog).__module__
+            if module == name or module.startswith(name + "."):
+                yield cog
+
+    def _export_cog_states(self, name) -> dict:
+        """
+        Exports the state of each cog in the given extension that supports it,
+        as a dict mapping the cog class name to the exported state.
+        """
+        states = {}
+        for cog in self._cogs_in_extension(name):
+            cog_name = type(cog).__name__
+            exporter = getattr(cog, f"_{cog_name}__export_state", None)
+            if exporter is not None:
+                states[cog_name] = exporter()
+        return states
+
+    def _import_cog_states(self, name, states: dict):
+        """
+        Hands exported state to each cog in the given extension that has the
+        same class name as the cog that exported it.
+        """
+        for cog in self._cogs_in_extension(name):
+            cog_name = type(cog).__name__
+            importer = getattr(cog, f"_{cog_name}__import_state", None)
+            if importer is not None and cog_name in states:
+                self.logger.info(f"Handing state over to reloaded cog {cog_name}")
+                importer(states[cog_name])
+
+    def reload_extension(self, name):
+        """
+        Reloads the given extension from disk, handing over any state the old
+        cogs export to the new cogs.
+
+        If the new version fails to load, the old version is set up again
+        with its state, and the error is re-raised. This means a broken
+        change will not leave the extension missing.
+
+        :param name: the extension to reload.
+        :return: the reloaded extension.
+        """
+        if name not in self.extensions:
+            raise ModuleNotFoundError(f"{name} is not loaded, so cannot be reloaded.")
+
+        old_lib = self.extensions[name]
+        states = self._export_cog_states(name)
+        self.logger.info(
+            f"Reloading extension {name!r}, keeping state for "
+            f'{", ".join(states) or "no cogs"}'
+        )
+
+        self.unload_extension(name)
+
+        try:
+            extension = self.load_extension(name)
+        except BaseException as ex:
+            self.logger.error(
+                f"Reloading {name!r} failed ({type(ex).__qualname__}: {ex}). "
+                "Restoring the previous version."
+            )
+            # Anything partially added by the broken version.
+            for cog in list(self._cogs_in_extension(name)):
+                self.remove_cog(type(cog).__name__)
+
+            sys.modules[name] = old_lib
+            old_lib.setup(self)
+            self.extensions[name] = old_lib
+            self._import_cog_states(name, states)
+            raise
+        else:
+            self._import_cog_states(name, states)
+            self.dispatch("reload_extension", extension)
+            return extension
+
     # noinspection PyBroadException
     def run(self):
         """Do not allow."""
@@ -296,6 +429,10 @@ class Bot(commands.Bot, scribe.Scribe):
 
     async def on_ready(self):
         """Set the presence to ready once...well...ready."""
+        if self.warm_imports:
+            # Pull in anything imported lazily now that nothing is waiting on us.
+            self.loop.create_task(traits.CogTraits.run_in_io_executor(lazy.warm_all))
+
         # noinspection PyTypeChecker
         prefix = await self.get_prefix(None)
 
@@ -305,3 +442,11 @@ class Bot(commands.Bot, scribe.Scribe):
                 type=discord.ActivityType.watching, name=f"for {prefix}help"
             ),
         )
+
+
+class AutoShardedBot(commands.AutoShardedBot, Bot):
+    """
+    The same as ``Bot``, but able to run several shards in one process. This
+    is used by each worker under the supervisor, which passes the shards that
+    worker owns as ``shard_ids`` and ``shard_count`` in the ``bot`` config.
+    """
@@ -29,16 +29,28 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.*giggl
 """
 import asyncio  # Async sleep
+import collections  # Counters, ordered dicts.
+import hashlib  # Fingerprints.
 import logging
 import sys
+import time  # Error windows.
 import traceback  # Traceback utils.
+import typing  # Type checking.
 
 import aiohttp
 import discord  # Embeds
 from discord.ext.commands import Paginator
 import discord.ext.commands.errors as dpyext_errors  # Errors for ext.
 
-from neko2.shared import excuses, morefunctools, string
+from neko2.shared import (
+    admission,
+    circuitbreaker,
+    commands,
+    excuses,
+    morefunctools,
+    scheduler,
+    string,
+)
 from . import extrabits
 
 # Respond with a reaction.
@@ -46,6 +58,7 @@ ignored_errors = {
     dpyext_errors.CommandNotFound: "\N{BLACK QUESTION MARK ORNAMENT}",
     dpyext_errors.DisabledCommand: "\N{NO ENTRY SIGN}",
     dpyext_errors.CommandOnCooldown: "\N{SNOWFLAKE}",
+    admission.AdmissionRejected: "\N{SNOWFLAKE}",
     NotImplementedError: "\N{CONSTRUCTION SIGN}",
 }
 
@@ -61,6 +74,8 @@ handled_errors = {
     discord.Forbidden,
     discord.NotFound,
     aiohttp.ClientError,
+    circuitbreaker.CircuitOpenError,
+    scheduler.SchedulerOverloadedError,
 }
 
 
@@ -122,10 +137,156 @@ async def _dm_me_error(*, bot, cog, ctx, error, event_method):
             await owner.send(page[-15:])
 
 
+def fingerprint(error: BaseException, frames: int = 5) -> str:
+    """
+    Identifies errors that are "the same" as each other, by the type of the
+    error and where the innermost few frames of the traceback were.
+    """
+    parts = [f"{type(error).__module__}.{type(error).__qualname__}"]
+    for frame in traceback.extract_tb(error.__traceback__)[-frames:]:
+        parts.append(f"{frame.filename}:{frame.name}:{frame.lineno}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()[:12]
+
+
+class ErrorStats:
+    """Everything we know about one fingerprint."""
+
+    __slots__ = (
+        "fingerprint",
+        "error_type",
+        "example",
+        "total",
+        "commands",
+        "first_seen",
+        "last_seen",
+        "window_started",
+        "window_count",
+        "window_commands",
+    )
+
+    def __init__(self, fingerprint, error, now):
+        self.fingerprint = fingerprint
+        self.error_type = type(error).__qualname__
+        self.example = string.trunc(str(error), 200) or "—"
+        self.total = 0
+        self.commands = collections.Counter()
+        self.first_seen = now
+        self.last_seen = now
+        # Start of the current digest window, or None if no window is open.
+        self.window_started = None
+        self.window_count = 0
+        self.window_commands = collections.Counter()
+
+
+class ErrorDigest(typing.NamedTuple):
+    """Summary of one fingerprint over a window."""
+
+    fingerprint: str
+    error_type: str
+    example: str
+    count: int
+    commands: typing.List[typing.Tuple[str, int]]
+    started: float
+    ended: float
+
+
+class ErrorAggregator:
+    """
+    Groups errors by fingerprint, keeping counts overall and per command, and
+    over a rolling window so that one digest can be sent per fingerprint per
+    window rather than one message per error.
+
+    :param window: how long each digest window lasts in seconds.
+    :param max_fingerprints: how many fingerprints to remember. The least
+        recently seen ones are forgotten first.
+    """
+
+    def __init__(self, window: float = 300, max_fingerprints: int = 500):
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._stats: "collections.OrderedDict[str, ErrorStats]" = (
+            collections.OrderedDict()
+        )
+
+    def record(
+        self, error, *, command=None, now=None, report=True
+    ) -> typing.Tuple[str, bool]:
+        """
+        Records an occurrence of the given error.
+
+        :param report: false to only count it, if it will not be reported.
+            This does not open a window, as no digest is ever sent for it.
+        :return: the fingerprint, and true if this is the first occurrence in
+            a new window (i.e. it should be reported straight away).
+        """
+        now = time.time() if now is None else now
+        fp = fingerprint(error)
+
+        stats = self._stats.get(fp)
+        if stats is None:
+            stats = self._stats[fp] = ErrorStats(fp, error, now)
+            while len(self._stats) > self.max_fingerprints:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(fp)
+
+        command = command or "<no command>"
+        stats.total += 1
+        stats.commands[command] += 1
+        stats.last_seen = now
+
+        if not report:
+            return fp, False
+
+        first = stats.window_started is None
+        if first:
+            stats.window_started = now
+            stats.window_count = 0
+            stats.window_commands.clear()
+        stats.window_count += 1
+        stats.window_commands[command] += 1
+        return fp, first
+
+    def close_window(self, fp, now=None) -> typing.Optional[ErrorDigest]:
+        """
+        Closes the current window for the given fingerprint, so that the next
+        occurrence opens a new one.
+
+        :return: a digest of the window, or None if there was no open window.
+        """
+        stats = self._stats.get(fp)
+        if stats is None or stats.window_started is None:
+            return None
+
+        digest = ErrorDigest(
+            fp,
+            stats.error_type,
+            stats.example,
+            stats.window_count,
+            stats.window_commands.most_common(),
+            stats.window_started,
+            time.time() if now is None else now,
+        )
+        stats.window_started = None
+        return digest
+
+    def stats(self, command=None) -> typing.List[ErrorStats]:
+        """
+        Gets the stats for each fingerprint, most frequent first. If a command
+        is given, only fingerprints seen in that command are included.
+        """
+        stats = [
+            s for s in self._stats.values() if command is None or command in s.commands
+        ]
+        key = (lambda s: s.commands[command]) if command else (lambda s: s.total)
+        return sorted(stats, key=key, reverse=True)
+
+
 class ErrorHandler(extrabits.InternalCogType):
     def __init__(self, should_dm_on_error, bot):
         super().__init__(bot)
         self.should_dm_on_error = should_dm_on_error
+        self.aggregator = ErrorAggregator()
 
     async def handle_error(self, *, bot, cog=None, ctx=None, error, event_method=None):
         """Send your errors here to be handled properly."""
@@ -142,18 +303,43 @@ class ErrorHandler(extrabits.InternalCogType):
     async def __handle_error(
         self, *, bot, cog=None, ctx=None, error, event_method=None
     ):
-        # Print the traceback first. This means I still see the TB even if
-        # something else breaks when outputting results to discord.
-        tb = traceback.format_exception(type(error), error, error.__traceback__)
+        cause = error.__cause__ or error
 
         if cog:
             rel_log = logging.getLogger(type(cog).__name__)
         else:
             rel_log = self.logger
 
-        rel_log.warning("An error was handled.\n" + "".join(tb).strip())
+        # Every unexpected error is counted, but only those that would be
+        # DMed to me are fingerprinted in the logs and sent as a digest.
+        unexpected = (
+            type(cause) not in handled_errors and type(cause) not in ignored_errors
+        )
+        reports = unexpected and self.should_dm_on_error and not bot.debug
 
-        cause = error.__cause__ or error
+        fp, first = None, True
+        if unexpected:
+            command = ctx.command.qualified_name if ctx and ctx.command else None
+            fp, first = self.aggregator.record(cause, command=command, report=reports)
+            if reports and first:
+                self.bot.loop.create_task(self._send_digest_later(fp))
+
+        # Print the traceback first. This means I still see the TB even if
+        # something else breaks when outputting results to discord. We only
+        # bother with the full traceback once per window for each fingerprint.
+        if not reports:
+            tb = traceback.format_exception(type(error), error, error.__traceback__)
+            rel_log.warning("An error was handled.\n" + "".join(tb).strip())
+        elif first:
+            tb = traceback.format_exception(type(error), error, error.__traceback__)
+            rel_log.warning(
+                f"An error was handled (fingerprint {fp}).\n" + "".join(tb).strip()
+            )
+        else:
+            rel_log.warning(
+                f"An error was handled (fingerprint {fp}, already reported): "
+                f"{type(cause).__qualname__}: {cause}"
+            )
 
         # Don't reply to errors with cool downs. Just add a reaction and stop.
         if type(cause) in handled_errors:
@@ -186,12 +372,16 @@ class ErrorHandler(extrabits.InternalCogType):
                     traceback.format_exception(type(cause), cause, cause.__traceback__)
                 )
 
-            if self.should_dm_on_error and not bot.debug:
-                reply += "\n\nEspy has been sent a DM about this issue."
-                # DM me some information about what went wrong.
-                await _dm_me_error(
-                    bot=bot, ctx=ctx, cog=cog, error=cause, event_method=event_method
-                )
+            if reports:
+                if first:
+                    reply += "\n\nEspy has been sent a DM about this issue."
+                    # DM me some information about what went wrong.
+                    await _dm_me_error(
+                        bot=bot, ctx=ctx, cog=cog, error=cause, event_method=event_method
+                    )
+                else:
+                    # Any more of these get sent as one digest later.
+                    reply += "\n\nEspy already knows about this issue."
 
         destination = ctx if ctx else bot.get_owner()
 
@@ -219,6 +409,71 @@ class ErrorHandler(extrabits.InternalCogType):
 
         fut(reply)
 
+    async def _send_digest_later(self, fp):
+        """
+        Waits for the window to end, then DMs the owner a digest of any more
+        occurrences of the error since the first one was reported.
+        """
+        await asyncio.sleep(self.aggregator.window)
+        digest = self.aggregator.close_window(fp)
+
+        # The first one was reported already.
+        if digest is None or digest.count <= 1:
+            return
+        elif not self.should_dm_on_error or self.bot.debug:
+            return
+
+        embed = discord.Embed(
+            title=f"`{digest.error_type}` happened {digest.count - 1:,} more times",
+            description=f"Example: `{digest.example}`",
+            colour=0xFF8000,
+        )
+        embed.add_field(name="Fingerprint", value=f"`{digest.fingerprint}`")
+        embed.add_field(
+            name="Window",
+            value=f"{(digest.ended - digest.started) / 60:,.1f} minutes",
+        )
+        embed.add_field(
+            name="By command",
+            value="\n".join(f"`{c}`: {n:,}" for c, n in digest.commands[:10]),
+            inline=False,
+        )
+
+        # noinspection PyBroadException
+        try:
+            owner = self.bot.get_user(self.bot.owner_id)
+            await owner.send(embed=embed)
+        except BaseException:
+            traceback.print_exc()
+
+    @commands.is_owner()
+    @commands.command(hidden=True, brief="Shows error statistics.")
+    async def errors(self, ctx, *, command=None):
+        """
+        Shows how often each distinct error has happened since startup. If a
+        command name is given, only errors from that command are counted.
+
+        Only unexpected errors are counted, so bad arguments and cooldowns do
+        not show up here.
+        """
+        stats = self.aggregator.stats(command)
+
+        pag = Paginator(prefix="```", suffix="```")
+        pag.add_line(f'{"FINGERPRINT":<13} {"COUNT":>6} {"LAST SEEN (UTC)":<20} ERROR')
+        for s in stats:
+            count = s.commands[command] if command else s.total
+            last = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(s.last_seen))
+            pag.add_line(f"{s.fingerprint:<13} {count:>6} {last:<20} {s.error_type}")
+            if not command:
+                top = ", ".join(f"{c} ({n})" for c, n in s.commands.most_common(3))
+                pag.add_line(f"{'':<13} in {top}")
+
+        if not stats:
+            pag.add_line("No errors recorded.")
+
+        for page in pag.pages:
+            await ctx.send(page)
+
     async def on_command_error(self, context, exception):
         """
         Handles invoking command error handlers.
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Records how long each command takes and how often it fails, and exposes
+everything in the metrics registry to the owner, and optionally to a
+Prometheus scraper on localhost.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import time  # Timing.
+
+from aiohttp import web  # Metrics endpoint.
+from discord.ext.commands import Paginator
+
+from neko2.shared import circuitbreaker, commands, metrics, traits
+from . import extrabits
+
+# How many rows to show for each table in the metrics command.
+MAX_ROWS = 15
+
+metrics.registry.describe("commands_total", "Commands invoked, by outcome.")
+metrics.registry.describe(
+    "command_seconds", "Time from a command being invoked to it finishing."
+)
+metrics.registry.describe(
+    "command_prepare_seconds",
+    "Time spent on checks, cooldowns and argument conversion.",
+)
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:,.1f}"
+
+
+def _table(title, histograms, errors=None):
+    """
+    Formats histograms keyed by labels as a table of percentiles, busiest
+    first.
+    """
+    rows = sorted(histograms.items(), key=lambda kv: kv[1].count, reverse=True)
+    lines = [
+        title,
+        f'{"":<32} {"COUNT":>7} {"ERRORS":>7} {"P50":>9} {"P95":>9} {"P99":>9}',
+    ]
+    for labels, histogram in rows[:MAX_ROWS]:
+        name = ", ".join(value for _, value in labels) or "-"
+        errs = "-" if errors is None else errors.get(labels, 0)
+        p50, p95, p99 = histogram.percentiles(50, 95, 99)
+        lines.append(
+            f"{name[:32]:<32} {histogram.count:>7} {errs:>7} "
+            f"{_ms(p50):>9} {_ms(p95):>9} {_ms(p99):>9}"
+        )
+    if not rows:
+        lines.append("Nothing recorded yet.")
+    return "\n".join(lines)
+
+
+def _lanes():
+    """Formats the current state of each scheduler lane as a table."""
+    lines = [
+        "Scheduler lanes",
+        f'{"":<32} {"RUNNING":>7} {"LIMIT":>7} {"QUEUED":>7} {"REJECTED":>9}',
+    ]
+    for name, lane in sorted(traits.CogTraits.lanes().items()):
+        rejected = metrics.registry.counter("scheduler_rejections_total", lane=name)
+        lines.append(
+            f"{name:<32} {lane.running:>7} {lane.concurrency:>7} "
+            f"{lane.queued:>7} {rejected.value:>9}"
+        )
+    return "\n".join(lines)
+
+
+class Instrumentation(extrabits.InternalCogType):
+    """
+    :param bot: the bot.
+    :param port: the port to serve Prometheus metrics on at ``/metrics``, or
+        None to not serve them.
+    """
+
+    def __init__(self, bot, port=None):
+        super().__init__(bot)
+        self.port = port
+        self._runner = None
+
+        if port is not None:
+            bot.loop.create_task(self._start_server())
+
+    async def _start_server(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._serve_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        # Only ever expose this locally.
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        self.logger.info(f"Serving metrics on http://127.0.0.1:{self.port}/metrics")
+
+    @staticmethod
+    async def _serve_metrics(_):
+        return web.Response(
+            body=metrics.registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    def __unload(self):
+        if self._runner is not None:
+            self.bot.loop.create_task(self._runner.cleanup())
+
+    @staticmethod
+    def _finish(ctx, outcome):
+        if ctx.command is None:
+            return
+
+        name = ctx.command.qualified_name
+        metrics.registry.inc("commands_total", command=name, outcome=outcome)
+
+        started_at = getattr(ctx, "metrics_started_at", None)
+        if started_at is not None:
+            metrics.registry.observe(
+                "command_seconds", time.perf_counter() - started_at, command=name
+            )
+
+    async def on_command(self, ctx):
+        ctx.metrics_started_at = time.perf_counter()
+
+    async def on_command_completion(self, ctx):
+        self._finish(ctx, "ok")
+
+    async def on_command_error(self, ctx, error):
+        error = getattr(error, "original", error)
+        self._finish(ctx, type(error).__name__)
+
+    @commands.is_owner()
+    @commands.command(
+        hidden=True, brief="Shows command latencies, executor waits and HTTP timings."
+    )
+    async def metrics(self, ctx):
+        """
+        Percentiles are in milliseconds, and are calculated from the most
+        recent samples only.
+        """
+        registry = metrics.registry
+
+        errors = {}
+        for labels, counter in registry.counters("commands_total").items():
+            outcome = dict(labels)["outcome"]
+            if outcome != "ok":
+                key = (("command", dict(labels)["command"]),)
+                errors[key] = errors.get(key, 0) + counter.value
+
+        sections = [
+            _table("Commands", registry.histograms("command_seconds"), errors),
+            _table(
+                "Checks, cooldowns and conversion",
+                registry.histograms("command_prepare_seconds"),
+            ),
+            _table(
+                "Executor queue wait", registry.histograms("executor_queue_wait_seconds")
+            ),
+            _table("Executor run time", registry.histograms("executor_run_seconds")),
+            _table("HTTP requests", registry.histograms("http_request_seconds")),
+            _lanes(),
+        ]
+
+        pag = Paginator(prefix="```", suffix="```")
+        for section in sections:
+            for line in section.splitlines():
+                pag.add_line(line)
+            pag.add_line("")
+
+        for page in pag.pages:
+            await ctx.send(page)
+
+    @commands.is_owner()
+    @commands.command(hidden=True, brief="Shows the state of each circuit breaker.")
+    async def circuits(self, ctx):
+        lines = [f'{"HOST":<32} {"STATE":<9} {"FAILURES":>8} {"TRIPS":>6} {"RETRY IN":>9}']
+        for breaker in sorted(circuitbreaker.breakers(), key=lambda b: b.name):
+            info = breaker.to_dict()
+            retry_in = f'{info["retry_in"]:,.0f}s' if info["retry_in"] else "-"
+            lines.append(
+                f'{info["name"][:32]:<32} {info["state"]:<9} '
+                f'{info["failures"]:>8} {info["trips"]:>6} {retry_in:>9}'
+            )
+        if len(lines) == 1:
+            lines.append("Nothing has been contacted yet.")
+
+        pag = Paginator(prefix="```", suffix="```")
+        for line in lines:
+            pag.add_line(line)
+        for page in pag.pages:
+            await ctx.send(page)
@@ -31,11 +31,12 @@ WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 import asyncio
 import logging
+import os
 import sys
 import traceback
 
-from neko2.engine import BotInterrupt, autoloader, client
-from neko2.shared import configfiles, scribe, traits
+from neko2.engine import BotInterrupt, autoloader, client, supervisor
+from neko2.shared import configfiles, profiler, scribe, traits
 
 
 class NekoSquaredBotProcess(scribe.Scribe):
@@ -43,12 +44,28 @@ class NekoSquaredBotProcess(scribe.Scribe):
     Holds the bot, and the resource handlers.
     """
 
-    def __init__(self, args=sys.argv):
+    def __init__(
+        self,
+        args=sys.argv,
+        *,
+        shard_ids=None,
+        shard_count=None,
+        health_pipe=None,
+        heartbeat_interval=15,
+    ):
         """
         Inits the bot process handler.
         :param args: command line args to process.
+        :param shard_ids: if we are a worker under the supervisor, the shards
+            to run. Otherwise, we run every shard ourselves.
+        :param shard_count: the total number of shards across all workers.
+        :param health_pipe: if we are a worker under the supervisor, the pipe
+            to send heartbeats to it down.
+        :param heartbeat_interval: how often to send heartbeats, in seconds.
         """
         self.args = args
+        self.health_pipe = health_pipe
+        self.heartbeat_interval = heartbeat_interval
 
         # Initialise file-based logging to prevent spamming the
         # journal.
@@ -84,47 +101,126 @@ class NekoSquaredBotProcess(scribe.Scribe):
 
         
         """
-        logging.basicConfig(level="INFO")
+        scribe.configure(level="INFO", json=scribe.JSON_FLAG in self.args)
         # Stops rate limiting spam from books.
         logging.getLogger("discord.http").setLevel("WARNING")
 
-        if len(self.args) > 1:
-            config_path = self.args[1]
-            configfiles.CONFIG_DIRECTORY = config_path
+        startup = profiler.startup
 
-        try:
-            import uvloop
+        with startup.section("NekoSquaredBotProcess.__init__"):
+            # Flags such as --profile-startup are not positional arguments.
+            positional_args = [arg for arg in self.args[1:] if not arg.startswith("--")]
 
-            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
-        except:
-            self.logger.warning(
-                "UVloop could not be loaded. Using default "
-                "asyncio event policy implementation..."
-            )
-        else:
-            self.logger.info(
-                "UVloop was detected. Switched to that asyncio "
-                "event policy implementation!"
-            )
-        finally:
-            loop = asyncio.get_event_loop()
+            if positional_args:
+                config_path = positional_args[0]
+                configfiles.CONFIG_DIRECTORY = config_path
+
+            with startup.section("uvloop policy setup"):
+                try:
+                    import uvloop
+
+                    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+                except:
+                    self.logger.warning(
+                        "UVloop could not be loaded. Using default "
+                        "asyncio event policy implementation..."
+                    )
+                else:
+                    self.logger.info(
+                        "UVloop was detected. Switched to that asyncio "
+                        "event policy implementation!"
+                    )
+                finally:
+                    loop = asyncio.get_event_loop()
+
+            self.loop = loop
+
+            with startup.section("configfiles.get_from_config_dir"):
+                cfg_file = configfiles.get_from_config_dir("discord")
+
+            # Parsed config is cached, so only re-read files that change.
+            configfiles.watch()
+
+            with startup.section("client.Bot construction"):
+                bot_config = cfg_file.sync_get()
+                bot_class = client.Bot
+
+                if shard_ids is not None:
+                    # Only run the shards the supervisor gave us.
+                    bot_config.setdefault("bot", {}).update(
+                        shard_ids=shard_ids, shard_count=shard_count
+                    )
+                    # Each worker needs a port of its own.
+                    if bot_config.get("metrics_port") is not None:
+                        bot_config["metrics_port"] += shard_ids[0]
+                    bot_class = client.AutoShardedBot
+                    self.logger.info(f"Running shards {shard_ids} of {shard_count}")
 
-        self.loop = loop
+                self.bot = bot_class(self.loop, bot_config)
 
-        cfg_file = configfiles.get_from_config_dir("discord")
-        self.bot = client.Bot(self.loop, cfg_file.sync_get())
+            setattr(self.bot, "neko2botprocess", self)
 
-        setattr(self.bot, "neko2botprocess", self)
+            # Acquire resources
+            with startup.section("CogTraits._alloc"):
+                # noinspection PyProtectedMember
+                self.loop.run_until_complete(traits.CogTraits._alloc(self.loop))
 
-        # Acquire resources
-        # noinspection PyProtectedMember
-        self.loop.run_until_complete(traits.CogTraits._alloc(self.loop))
+            with startup.section("autoloader.auto_load_modules"):
+                _ = autoloader.auto_load_modules(self.bot)
 
-        _ = autoloader.auto_load_modules(self.bot)
+        if startup.enabled:
+            startup.mark("modules loaded")
+            self.logger.info(f"Wrote startup profile to {startup.write_report()}")
+
+            @self.bot.listen("on_ready")
+            async def _write_startup_profile_on_ready():
+                # Only bother recording the first time we become ready.
+                if "ready" not in startup.marks:
+                    startup.mark("ready")
+                    startup.write_report()
+                    startup.disable()
+
+        if self.health_pipe is not None:
+
+            @self.bot.listen("on_ready")
+            async def _report_ready():
+                self._send_health(supervisor.READY)
+
+    def _send_health(self, kind):
+        """Sends a message to the supervisor about how we are doing."""
+        self.health_pipe.send(
+            (
+                kind,
+                {
+                    "pid": os.getpid(),
+                    "guilds": len(self.bot.guilds),
+                    "latency": self.bot.latency,
+                    "uptime": self.bot.uptime,
+                },
+            )
+        )
+
+    async def _report_health(self):
+        """
+        Sends heartbeats to the supervisor until we stop. If the event loop
+        gets stuck, these stop arriving, and the supervisor restarts us.
+        """
+        try:
+            while True:
+                self._send_health(supervisor.HEARTBEAT)
+                await asyncio.sleep(self.heartbeat_interval)
+        except (BrokenPipeError, EOFError, OSError):
+            self.logger.fatal("Lost contact with the supervisor, so shutting down")
+            await self.bot.logout()
 
     # noinspection PyProtectedMember, PyBroadException
     def run(self):
         """Runs the bot until it logs out or an interrupt is hit."""
+        if self.health_pipe is not None:
+            health_task = self.loop.create_task(self._report_health())
+        else:
+            health_task = None
+
         try:
             try:
                 self.loop.run_until_complete(self.bot.start(self.bot.token))
@@ -151,5 +247,14 @@ class NekoSquaredBotProcess(scribe.Scribe):
         except KeyboardInterrupt:
             return
         finally:
+            if health_task is not None:
+                health_task.cancel()
+                try:
+                    self._send_health(supervisor.STOPPING)
+                except (BrokenPipeError, OSError):
+                    pass
+
             self.loop.run_until_complete(traits.CogTraits._dealloc())
             delattr(self.bot, "neko2botprocess")
+            # Flush anything still waiting to be logged.
+            scribe.shutdown()
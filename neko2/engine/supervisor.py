@@ -0,0 +1,470 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Runs the bot as several worker processes, each owning a subset of the
+Discord shards, so that we are not limited to a single core.
+
+The supervisor itself never connects to Discord. It spawns each worker with
+the same command line arguments (so the same config directory), along with
+the shard IDs that worker owns. Workers report back over a pipe with regular
+heartbeats. If a worker exits, or stops sending heartbeats (for example,
+because its event loop is stuck), it is stopped and started again, backing
+off exponentially if it keeps dying.
+
+Signals sent to the supervisor:
+- ``SIGTERM``/``SIGINT`` - stop every worker gracefully, then exit.
+- ``SIGHUP`` - restart each worker in turn, waiting for each one to become
+    ready again before restarting the next one.
+
+Enable this by passing ``--workers=N`` on the command line, optionally with
+``--shards=M`` to split M shards between the N workers (defaults to one
+shard per worker).
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import dataclasses  # Worker specifications.
+import multiprocessing  # Worker processes.
+import multiprocessing.connection  # Waiting on several pipes at once.
+import signal  # Signal handling.
+import time  # Timing.
+import typing  # Type checking.
+
+from neko2.shared import scribe  # Logging.
+
+__all__ = (
+    "WORKERS_FLAG",
+    "SHARDS_FLAG",
+    "WorkerSpec",
+    "Supervisor",
+    "split_shards",
+    "get_flag",
+    "run_bot_worker",
+)
+
+WORKERS_FLAG = "--workers"
+SHARDS_FLAG = "--shards"
+
+# Messages workers send to the supervisor.
+HEARTBEAT = "heartbeat"
+READY = "ready"
+STOPPING = "stopping"
+
+
+@dataclasses.dataclass()
+class WorkerSpec:
+    """
+    Everything a worker process needs to know to start.
+
+    :param index: the worker number.
+    :param shard_ids: the shards this worker owns.
+    :param shard_count: the total number of shards across all workers.
+    :param args: the command line arguments to run the bot with.
+    :param heartbeat_interval: how often to send heartbeats, in seconds.
+    :param generation: how many times this worker has been started before.
+    """
+
+    index: int
+    shard_ids: typing.List[int]
+    shard_count: int
+    args: typing.List[str]
+    heartbeat_interval: float
+    generation: int = 0
+
+
+def split_shards(shard_count: int, worker_count: int) -> typing.List[typing.List[int]]:
+    """
+    Splits the shard IDs into contiguous runs, one per worker, with sizes
+    differing by no more than one.
+    """
+    if worker_count < 1:
+        raise ValueError("Need at least one worker")
+    elif shard_count < worker_count:
+        raise ValueError(
+            f"Cannot split {shard_count} shard(s) between {worker_count} workers"
+        )
+
+    per_worker, remainder = divmod(shard_count, worker_count)
+    splits, start = [], 0
+    for i in range(worker_count):
+        end = start + per_worker + (1 if i < remainder else 0)
+        splits.append(list(range(start, end)))
+        start = end
+    return splits
+
+
+def get_flag(args: typing.Sequence[str], flag: str) -> typing.Optional[str]:
+    """Gets the value of a ``--flag=value`` argument, or None if not given."""
+    for arg in args:
+        if arg.startswith(flag + "="):
+            return arg[len(flag) + 1 :]
+    return None
+
+
+def run_bot_worker(spec: WorkerSpec, conn):
+    """
+    The entry point of each worker process. This runs the bot with the
+    shards in the given spec, sending heartbeats down the given pipe.
+    """
+    from neko2.engine import runner
+
+    runner.NekoSquaredBotProcess(
+        spec.args,
+        shard_ids=spec.shard_ids,
+        shard_count=spec.shard_count,
+        health_pipe=conn,
+        heartbeat_interval=spec.heartbeat_interval,
+    ).run()
+
+
+class _Worker:
+    """Supervisor-side bookkeeping for a single worker process."""
+
+    def __init__(self, spec: WorkerSpec):
+        self.spec = spec
+        self.process = None
+        self.conn = None
+        self.started_at = None
+        self.last_heartbeat = None
+        self.ready = False
+        self.status = {}
+        # Consecutive crashes, used for backoff.
+        self.failures = 0
+        # When to next start the worker, if it is not running.
+        self.start_at = 0.0
+        # When to give up waiting for a graceful stop and kill the worker.
+        self.kill_at = None
+        # False if we stopped the worker because it was unhealthy.
+        self.intentional = True
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def to_dict(self):
+        return {
+            "index": self.spec.index,
+            "shard_ids": self.spec.shard_ids,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "ready": self.ready,
+            "generation": self.spec.generation,
+            "failures": self.failures,
+            "last_heartbeat": self.last_heartbeat,
+            **self.status,
+        }
+
+
+class Supervisor(scribe.Scribe):
+    """
+    Spawns and watches over the worker processes.
+
+    :param worker_count: how many processes to run.
+    :param shard_count: how many shards to split between them. Defaults to
+        one per worker.
+    :param args: the command line arguments to give each worker.
+    :param target: the function each worker process runs. This takes a
+        ``WorkerSpec`` and the worker end of a pipe. Defaults to running
+        the bot.
+    :param heartbeat_timeout: how long a worker can go without a heartbeat
+        before it is considered stuck and restarted.
+    :param startup_timeout: how long a worker has to send its first
+        heartbeat, as loading all the extensions can take a while.
+    :param stop_timeout: how long to wait for a worker to stop gracefully
+        before killing it.
+    :param backoff: how long to wait before restarting a worker after its
+        first crash. This doubles with each consecutive crash.
+    :param max_backoff: the most we will ever wait before restarting.
+    :param stable_after: how long a worker has to run before its crash count
+        is reset.
+    :param start_method: the multiprocessing start method to use.
+    """
+
+    def __init__(
+        self,
+        worker_count: int,
+        shard_count: int = None,
+        args: typing.Sequence[str] = (),
+        *,
+        target: typing.Callable = run_bot_worker,
+        heartbeat_timeout: float = 60,
+        startup_timeout: float = 300,
+        stop_timeout: float = 30,
+        backoff: float = 1,
+        max_backoff: float = 300,
+        stable_after: float = 600,
+        start_method: str = "spawn",
+    ):
+        shard_count = worker_count if shard_count is None else shard_count
+
+        self.target = target
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.stop_timeout = stop_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.context = multiprocessing.get_context(start_method)
+
+        self.workers = [
+            _Worker(WorkerSpec(i, shard_ids, shard_count, list(args), heartbeat_timeout / 4))
+            for i, shard_ids in enumerate(split_shards(shard_count, worker_count))
+        ]
+
+        self._stopping = False
+        # Indexes of workers still waiting for a rolling restart.
+        self._rolling_restart: typing.List[int] = []
+        # The worker being restarted by the rolling restart, and the
+        # generation it was on when we stopped it.
+        self._restarting: typing.Optional[typing.Tuple[_Worker, int]] = None
+
+    @classmethod
+    def from_argv(cls, args: typing.Sequence[str], **kwargs):
+        """
+        Creates a supervisor from the ``--workers`` and ``--shards`` flags
+        in the given command line arguments.
+        """
+        worker_count = int(get_flag(args, WORKERS_FLAG))
+        shard_count = get_flag(args, SHARDS_FLAG)
+        shard_count = int(shard_count) if shard_count is not None else None
+        return cls(worker_count, shard_count, args, **kwargs)
+
+    def status(self) -> typing.List[dict]:
+        """Gets the last known status of each worker."""
+        return [worker.to_dict() for worker in self.workers]
+
+    def _spawn(self, worker: _Worker):
+        if worker.started_at is not None:
+            worker.spec.generation += 1
+
+        parent_conn, child_conn = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=self.target,
+            args=(worker.spec, child_conn),
+            name=f"neko2-worker-{worker.spec.index}",
+            daemon=False,
+        )
+        process.start()
+        # The child has its own copy now.
+        child_conn.close()
+
+        worker.process = process
+        worker.conn = parent_conn
+        worker.started_at = time.monotonic()
+        worker.last_heartbeat = None
+        worker.ready = False
+        worker.status = {}
+        worker.kill_at = None
+
+        self.logger.info(
+            f"Started worker {worker.spec.index} (pid {process.pid}) for shards "
+            f"{worker.spec.shard_ids} of {worker.spec.shard_count}"
+        )
+
+    def _stop(self, worker: _Worker, intentional=True):
+        """
+        Asks a worker to stop gracefully. It is killed if it takes too long.
+
+        :param intentional: False if the worker is being stopped because it
+            is unhealthy, in which case it is restarted with a backoff.
+        """
+        if worker.alive and worker.kill_at is None:
+            self.logger.info(f"Stopping worker {worker.spec.index}")
+            worker.intentional = intentional
+            worker.process.terminate()
+            worker.kill_at = time.monotonic() + self.stop_timeout
+        # Whether or not it says so, it is not serving anything any more.
+        worker.ready = False
+
+    def _receive(self, worker: _Worker):
+        """Reads every message the worker has sent us so far."""
+        try:
+            while worker.conn.poll():
+                kind, payload = worker.conn.recv()
+                worker.last_heartbeat = time.monotonic()
+                worker.status.update(payload)
+                if kind == READY and not worker.ready:
+                    worker.ready = True
+                    self.logger.info(f"Worker {worker.spec.index} is ready")
+                elif kind == STOPPING:
+                    worker.ready = False
+        except (EOFError, OSError):
+            # The worker has gone away. We will notice it is dead shortly.
+            worker.conn.close()
+            worker.conn = None
+
+    def _reap(self, worker: _Worker, now: float):
+        """Handles a worker process that has exited."""
+        worker.process.join()
+        exit_code = worker.process.exitcode
+        worker.process = None
+        planned = worker.kill_at is not None and worker.intentional
+        worker.kill_at = None
+        worker.ready = False
+
+        if worker.conn is not None:
+            worker.conn.close()
+            worker.conn = None
+
+        if self._stopping:
+            self.logger.info(f"Worker {worker.spec.index} exited with code {exit_code}")
+            return
+
+        if now - worker.started_at >= self.stable_after:
+            worker.failures = 0
+
+        if planned:
+            # We asked it to stop, so start it again straight away.
+            worker.start_at = now
+            log = self.logger.info
+        else:
+            worker.failures += 1
+            delay = min(self.backoff * 2 ** (worker.failures - 1), self.max_backoff)
+            worker.start_at = now + delay
+            log = self.logger.warning
+
+        log(
+            f"Worker {worker.spec.index} exited with code {exit_code}. Restarting "
+            f"in {worker.start_at - now:,.2f}s"
+        )
+
+    def _check_health(self, worker: _Worker, now: float):
+        """Stops any worker that has not been heard from for too long."""
+        if worker.kill_at is not None:
+            if now >= worker.kill_at:
+                self.logger.error(
+                    f"Worker {worker.spec.index} did not stop in time. Killing it."
+                )
+                worker.process.kill()
+            return
+
+        if worker.last_heartbeat is None:
+            silent_for, limit = now - worker.started_at, self.startup_timeout
+        else:
+            silent_for, limit = now - worker.last_heartbeat, self.heartbeat_timeout
+
+        if silent_for > limit:
+            self.logger.error(
+                f"Worker {worker.spec.index} has not sent a heartbeat for "
+                f"{silent_for:,.2f}s. Restarting it."
+            )
+            self._stop(worker, intentional=False)
+
+    def poll(self, timeout: float = 1.0):
+        """
+        Runs one round of supervision: reads any heartbeats, restarts any
+        dead or stuck workers, and moves any rolling restart along.
+        """
+        conns = [w.conn for w in self.workers if w.conn is not None]
+        if conns:
+            multiprocessing.connection.wait(conns, timeout)
+        else:
+            time.sleep(timeout)
+
+        now = time.monotonic()
+
+        for worker in self.workers:
+            if worker.conn is not None:
+                self._receive(worker)
+
+            if worker.process is not None and worker.process.exitcode is not None:
+                self._reap(worker, now)
+
+            if not worker.alive:
+                if not self._stopping and now >= worker.start_at:
+                    self._spawn(worker)
+            else:
+                self._check_health(worker, now)
+
+        restarting = self._restarting
+        if restarting is not None:
+            worker, generation = restarting
+            # Wait for it to exit, start again, and become ready before we
+            # move on to the next one.
+            if worker.spec.generation > generation and worker.ready:
+                self._restarting = None
+
+        if (
+            self._restarting is None
+            and self._rolling_restart
+            and all(w.ready for w in self.workers)
+        ):
+            worker = self.workers[self._rolling_restart.pop(0)]
+            self._restarting = (worker, worker.spec.generation)
+            self._stop(worker)
+
+    def restart_all(self):
+        """Restarts each worker in turn, waiting for each to become ready."""
+        self.logger.info("Performing a rolling restart of all workers")
+        self._rolling_restart = [w.spec.index for w in self.workers]
+
+    def stop(self):
+        """Asks every worker to stop, and stops supervising."""
+        self._stopping = True
+        self._rolling_restart.clear()
+        self._restarting = None
+        for worker in self.workers:
+            self._stop(worker)
+
+    def wait_for_exit(self):
+        """Waits for every worker to exit, killing any that take too long."""
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+
+            worker.process.join(self.stop_timeout)
+            if worker.process.is_alive():
+                self.logger.error(
+                    f"Worker {worker.spec.index} did not stop in time. Killing it."
+                )
+                worker.process.kill()
+                worker.process.join()
+
+            if worker.conn is not None:
+                worker.conn.close()
+                worker.conn = None
+
+    def run(self):
+        """Supervises the workers until we receive SIGTERM or SIGINT."""
+        args = self.workers[0].spec.args
+        scribe.configure(level="INFO", json=scribe.JSON_FLAG in args)
+
+        def on_stop(signal_no, _):
+            self.logger.warning(f"Received signal {signal_no}. Stopping workers.")
+            self.stop()
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *_: self.restart_all())
+
+        try:
+            while not self._stopping:
+                self.poll()
+        finally:
+            self.stop()
+            self.wait_for_exit()
+            self.logger.info("All workers have stopped")
+            scribe.shutdown()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Watches the event loop for anything that blocks it.
+
+A task on the loop wakes up at a regular interval and records how late it
+was (the scheduling lag). Meanwhile, a separate thread keeps an eye on when
+that task last ran. If the loop has not got round to running it for longer
+than the threshold, the thread grabs the stack of the loop thread, which
+shows whatever is hogging it, and works out which cog and command that code
+belongs to. This is logged once the loop recovers, along with how long it
+was blocked for in total.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio  # Event loop.
+import collections  # Recent reports.
+import dataclasses  # Reports.
+import sys  # Thread frames.
+import threading  # Monitor thread.
+import time  # Timing.
+import traceback  # Stack formatting.
+import typing  # Type checking.
+
+from neko2.shared import metrics, scribe
+
+__all__ = ("BlockReport", "LoopWatchdog")
+
+metrics.registry.describe("loop_lag_seconds", "How late the loop runs scheduled tasks.")
+metrics.registry.describe(
+    "loop_blocked_total", "Times the loop was blocked for longer than the threshold."
+)
+
+
+@dataclasses.dataclass()
+class BlockReport:
+    """Describes one occasion the loop was blocked for too long."""
+
+    # When the block was detected, as a UNIX timestamp.
+    detected_at: float
+    # How long the loop was blocked for in seconds. This is only known once
+    # the loop recovers, so is the time so far until then.
+    duration: float
+    # The loop thread stack at the point the block was detected.
+    stack: str
+    # The module, cog and command the blocking code seems to belong to, if
+    # this could be worked out.
+    module: typing.Optional[str] = None
+    cog: typing.Optional[str] = None
+    command: typing.Optional[str] = None
+
+    @property
+    def culprit(self) -> str:
+        parts = []
+        if self.command:
+            parts.append(f"command {self.command!r}")
+        if self.cog:
+            parts.append(f"cog {self.cog}")
+        if self.module and not self.cog:
+            parts.append(f"module {self.module}")
+        return ", ".join(parts) or "unknown code"
+
+
+def _attribute(frame) -> typing.Tuple[str, str, str]:
+    """
+    Walks up from the innermost frame, finding the first frame in a cog
+    module, and the command being invoked, if any.
+    """
+    module = cog = command = None
+
+    while frame is not None:
+        f_globals, f_locals = frame.f_globals, frame.f_locals
+        name = f_globals.get("__name__", "")
+
+        if module is None and name.startswith("neko2.cogs"):
+            module = name
+            this = f_locals.get("self")
+            if this is not None:
+                cog = type(this).__name__
+
+        if command is None:
+            ctx = f_locals.get("ctx")
+            ctx_command = getattr(ctx, "command", None)
+            if ctx_command is not None:
+                command = getattr(ctx_command, "qualified_name", None)
+
+        if module is not None and command is not None:
+            break
+
+        frame = frame.f_back
+
+    return module, cog, command
+
+
+class LoopWatchdog(scribe.Scribe):
+    """
+    :param loop: the event loop to watch.
+    :param threshold: how long in seconds the loop can go without running
+        our task before we consider it blocked.
+    :param interval: how often to check in seconds.
+    :param keep: how many reports to keep for inspection later.
+    """
+
+    def __init__(self, loop, threshold=0.5, interval=0.1, keep=20):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.reports: typing.Deque[BlockReport] = collections.deque(maxlen=keep)
+
+        self._last_beat = time.monotonic()
+        self._pending: typing.Optional[BlockReport] = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Starts watching. This must be called from the loop thread."""
+        if self.running:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = self.loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._monitor, name="neko2-loop-watchdog", daemon=True
+        )
+        self._thread.start()
+        self.logger.info(
+            f"Watching the event loop for blocks over {self.threshold * 1000:,.0f}ms"
+        )
+
+    def stop(self):
+        """Stops watching."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            before = self.loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self.loop.time() - before - self.interval)
+            self._last_beat = time.monotonic()
+
+            metrics.registry.observe("loop_lag_seconds", lag)
+
+            report = self._pending
+            if report is not None:
+                self._pending = None
+                report.duration = lag + self.interval
+                self._finish(report)
+
+    def _finish(self, report: BlockReport):
+        """Called on the loop once the loop has recovered from a block."""
+        self.reports.append(report)
+        metrics.registry.inc(
+            "loop_blocked_total", cog=report.cog or "", command=report.command or ""
+        )
+        self.logger.warning(
+            f"The event loop was blocked for about {report.duration * 1000:,.0f}ms "
+            f"by {report.culprit}. Stack when detected:\n{report.stack}"
+        )
+
+    def _monitor(self):
+        """Runs on a separate thread, looking for blocks."""
+        while not self._stop.wait(self.interval):
+            since_beat = time.monotonic() - self._last_beat
+            if since_beat < self.threshold + self.interval or self._pending:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            module, cog, command = _attribute(frame)
+            self._pending = BlockReport(
+                detected_at=time.time(),
+                duration=since_beat,
+                stack="".join(traceback.format_stack(frame)),
+                module=module,
+                cog=cog,
+                command=command,
+            )
+            # Let the logs show it is still happening, in case it never ends.
+            self.logger.warning(
+                f"The event loop has been blocked for {since_beat * 1000:,.0f}ms "
+                f"by {self._pending.culprit}"
+            )
+            del frame
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Token bucket admission control for commands.
+
+Every user and every guild gets a bucket of tokens that refills at a steady
+rate up to some capacity. Invoking a command takes its ``cost`` in tokens
+from both the user's bucket and the guild's bucket. If either does not have
+enough, the command is turned away until it does. Cheap commands cost a
+single token, whereas things that tie up workers for a while, such as
+compiling code or rendering LaTeX, cost more, so a burst of spam can only
+ever queue up a bounded amount of expensive work.
+
+This works alongside the cooldowns discord.py provides, which are still
+useful for limiting individual commands.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import collections  # Ordered dicts.
+import threading  # Locking.
+import time  # Refilling.
+import typing  # Type checking.
+
+from discord.ext.commands import errors as dpyext_errors
+
+from neko2.shared import metrics
+
+__all__ = ("AdmissionRejected", "TokenBucket", "AdmissionController")
+
+metrics.registry.describe(
+    "admission_rejections_total",
+    "Commands turned away because a user or guild ran out of tokens.",
+)
+
+
+class AdmissionRejected(dpyext_errors.CheckFailure):
+    """Raised when a command is turned away. Says when to try again."""
+
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__(
+            f"You are going a bit fast. Try again in {retry_after:,.1f}s."
+            if scope == "user"
+            else f"This server is going a bit fast. Try again in {retry_after:,.1f}s."
+        )
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    :param rate: how many tokens are added each second.
+    :param capacity: the most tokens the bucket can hold. It starts full.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """How long until ``cost`` tokens are available. Zero if they are now."""
+        self._refill(now)
+        # Anything costing more than the capacity only has to wait for a
+        # full bucket, otherwise it could never run.
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= min(cost, self.capacity)
+
+
+class AdmissionController:
+    """
+    Holds a bucket for each user and guild seen recently.
+
+    :param user_rate: tokens each user regains per second.
+    :param user_burst: the most tokens each user can save up.
+    :param guild_rate: tokens each guild regains per second.
+    :param guild_burst: the most tokens each guild can save up.
+    :param max_buckets: how many buckets of each kind to keep track of. The
+        least recently used buckets are forgotten past this point, which
+        only ever works in the favour of whoever owned them.
+    """
+
+    def __init__(
+        self,
+        *,
+        user_rate: float = 0.5,
+        user_burst: float = 10,
+        guild_rate: float = 2.0,
+        guild_burst: float = 40,
+        max_buckets: int = 10_000,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._users: typing.Dict[int, TokenBucket] = collections.OrderedDict()
+        self._guilds: typing.Dict[int, TokenBucket] = collections.OrderedDict()
+
+    def _bucket(self, buckets, key, rate, capacity, now) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, capacity, now)
+            while len(buckets) > self.max_buckets:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, user_id: int, guild_id: typing.Optional[int], cost: float, now=None):
+        """
+        Takes ``cost`` tokens from the user and guild, if both have enough.
+        Nothing is taken from either otherwise.
+
+        :param user_id: the ID of the user invoking the command.
+        :param guild_id: the ID of the guild, or None in DMs.
+        :param cost: how many tokens the command costs.
+        :raises AdmissionRejected: if there are not enough tokens.
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            checks = [
+                (
+                    "user",
+                    self._bucket(
+                        self._users, user_id, self.user_rate, self.user_burst, now
+                    ),
+                )
+            ]
+            if guild_id is not None:
+                checks.append(
+                    (
+                        "guild",
+                        self._bucket(
+                            self._guilds,
+                            guild_id,
+                            self.guild_rate,
+                            self.guild_burst,
+                            now,
+                        ),
+                    )
+                )
+
+            for scope, bucket in checks:
+                wait = bucket.wait_time(cost, now)
+                if wait:
+                    metrics.registry.inc("admission_rejections_total", scope=scope)
+                    raise AdmissionRejected(scope, wait)
+
+            for _, bucket in checks:
+                bucket.take(cost)
+
+    async def check(self, ctx) -> bool:
+        """
+        A global check for the bot. This charges the cost of the command being
+        invoked once per invocation. Checks done on other commands along the
+        way, such as by the help command to see what can be run, are free. If
+        a subcommand costs more than its group, only the difference is taken
+        when the subcommand is reached. The bot owner is never turned away.
+        """
+        if ctx.author.id == ctx.bot.owner_id:
+            return True
+
+        charged = getattr(ctx, "admission_cost", None)
+        if charged is not None and ctx.command is not ctx.invoked_subcommand:
+            return True
+
+        cost = getattr(ctx.command, "cost", 1)
+        extra = cost - (charged or 0)
+        if extra > 0:
+            self.admit(ctx.author.id, ctx.guild.id if ctx.guild else None, extra)
+        ctx.admission_cost = max(cost, charged or 0)
+        return True
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Reads files that never change while we are running, such as reaction
+images, the ISS map and scripts we send off to compilers, and keeps them in
+memory as ``bytes``.
+
+Once a file is cached, reading it again costs nothing: no thread pool, no
+syscalls. Reads that miss the cache in the same iteration of the event loop
+are batched into a single job on the executor, rather than each taking a
+separate trip to a thread.
+
+Files bigger than ``max_file_bytes`` are never cached. ``discord_file``
+hands those to discord.py by path, so it can stream them from disk.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio  # Futures.
+import collections  # Ordered dicts.
+import io  # Bytes IO.
+import os  # Paths.
+import threading  # Locking.
+import typing  # Type checking.
+
+import discord  # Files.
+
+from neko2.shared import metrics, scribe
+
+__all__ = ("AssetCache", "cache")
+
+metrics.registry.describe("asset_reads_total", "Asset reads, by cache outcome.")
+
+
+def _read_file(path) -> bytes:
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+class AssetCache(scribe.Scribe):
+    """
+    :param max_bytes: the most bytes to hold in memory in total. The least
+        recently used files are dropped past this point.
+    :param max_file_bytes: files bigger than this are never cached.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_file_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._entries: typing.Dict[str, bytes] = collections.OrderedDict()
+        self._pending: typing.Dict[str, asyncio.Future] = {}
+
+    def get_cached(self, path) -> typing.Optional[bytes]:
+        """Gets the file if it is in memory, or None otherwise. Never blocks."""
+        path = os.path.abspath(path)
+        with self._lock:
+            data = self._entries.get(path)
+            if data is not None:
+                self._entries.move_to_end(path)
+        return data
+
+    def _store(self, path, data: bytes):
+        if len(data) > self.max_file_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[path] = data
+            self.size += len(data)
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _load(self, path) -> typing.Optional[bytes]:
+        """
+        Reads and caches the file, or returns None if it is too big to
+        cache. This blocks.
+        """
+        if os.stat(path).st_size > self.max_file_bytes:
+            return None
+        data = _read_file(path)
+        self._store(path, data)
+        return data
+
+    def read_sync(self, path) -> bytes:
+        """Gets the contents of the file. This blocks on a cache miss."""
+        data = self.get_cached(path)
+        if data is None:
+            metrics.registry.inc("asset_reads_total", outcome="miss")
+            path = os.path.abspath(path)
+            data = self._load(path)
+            if data is None:
+                data = _read_file(path)
+        else:
+            metrics.registry.inc("asset_reads_total", outcome="hit")
+        return data
+
+    def _load_many(self, paths) -> list:
+        results = []
+        for path in paths:
+            # noinspection PyBroadException
+            try:
+                results.append((path, self._load(path), None))
+            except BaseException as ex:
+                results.append((path, None, ex))
+        return results
+
+    def _flush(self, loop, executor):
+        batch, self._pending = self._pending, {}
+        job = loop.run_in_executor(executor, self._load_many, list(batch))
+
+        def on_done(job):
+            if job.cancelled() or job.exception():
+                for future in batch.values():
+                    if not future.done():
+                        future.set_exception(
+                            job.exception() or asyncio.CancelledError()
+                        )
+                return
+
+            for path, data, ex in job.result():
+                future = batch[path]
+                if future.done():
+                    continue
+                elif ex is not None:
+                    future.set_exception(ex)
+                else:
+                    future.set_result(data)
+
+        job.add_done_callback(on_done)
+
+    async def _fetch(self, path, loop, executor) -> typing.Optional[bytes]:
+        """
+        Gets the file from the cache, or from disk along with anything else
+        requested in this iteration of the loop. None means the file is too
+        big to cache.
+        """
+        data = self.get_cached(path)
+        if data is not None:
+            metrics.registry.inc("asset_reads_total", outcome="hit")
+            return data
+
+        metrics.registry.inc("asset_reads_total", outcome="miss")
+        loop = loop or asyncio.get_event_loop()
+        path = os.path.abspath(path)
+
+        future = self._pending.get(path)
+        if future is None:
+            if not self._pending:
+                loop.call_soon(self._flush, loop, executor)
+            future = self._pending[path] = loop.create_future()
+
+        # Don't let one caller giving up cancel the read for everyone else.
+        return await asyncio.shield(future)
+
+    async def read(self, path, *, loop=None, executor=None) -> bytes:
+        """
+        Gets the contents of the file.
+
+        :param path: the path of the file.
+        :param loop: the event loop to use.
+        :param executor: the executor to read files on.
+        """
+        data = await self._fetch(path, loop, executor)
+        if data is None:
+            loop = loop or asyncio.get_event_loop()
+            data = await loop.run_in_executor(executor, _read_file, path)
+        return data
+
+    async def discord_file(
+        self, path, filename=None, *, loop=None, executor=None
+    ) -> discord.File:
+        """
+        Makes a file to upload to Discord. Cached files are wrapped without
+        copying them. Anything too big to cache is left for discord.py to
+        stream from disk.
+
+        :param path: the path of the file.
+        :param filename: the name to upload the file as. Defaults to the name
+            of the file.
+        """
+        filename = filename or os.path.basename(path)
+        data = await self._fetch(path, loop, executor)
+        if data is None:
+            return discord.File(path, filename)
+        else:
+            return discord.File(io.BytesIO(data), filename)
+
+    def invalidate(self, path=None):
+        """Drops the given file from memory, or every file if None is given."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.size = 0
+            else:
+                data = self._entries.pop(os.path.abspath(path), None)
+                if data is not None:
+                    self.size -= len(data)
+
+
+# The process-wide asset cache.
+cache = AssetCache()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Circuit breakers for upstream services, keyed by host.
+
+Each breaker starts closed, letting everything through. After enough
+consecutive failures (errors, server errors, or calls that take far too
+long), it opens, and any further calls fail straight away with a
+``CircuitOpenError`` instead of waiting for yet another timeout. After a
+while, it half-opens, letting a single probe call through. If that works,
+the breaker closes again. If not, it opens again for twice as long as
+before, up to a limit.
+
+HTTP requests made with sessions from ``CogTraits`` go through these
+automatically. Anything else, such as third party clients run in an
+executor, can use a breaker explicitly:
+
+    with circuitbreaker.get("api.wordnik.com").guard():
+        ...
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio  # CancelledError
+import threading  # Locking.
+import time  # Timing.
+import typing  # Type checking.
+
+import aiohttp  # Trace configs.
+
+from neko2.shared import errors, metrics, scribe
+
+__all__ = (
+    "CLOSED",
+    "OPEN",
+    "HALF_OPEN",
+    "CircuitOpenError",
+    "CircuitBreaker",
+    "get",
+    "breakers",
+    "trace_config",
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+metrics.registry.describe(
+    "circuit_rejections_total", "Calls rejected because a circuit breaker was open."
+)
+metrics.registry.describe("circuit_trips_total", "Times a circuit breaker opened.")
+
+
+class CircuitOpenError(errors.CommandExecutionError):
+    """Raised instead of calling a service whose breaker is open."""
+
+    def __init__(self, breaker: "CircuitBreaker"):
+        retry_in = max(0.0, breaker.opened_until - time.monotonic())
+        super().__init__(
+            f"{breaker.name} seems to be down at the moment, so I am not "
+            f"bothering it for another {retry_in:,.0f}s. Please try again later!"
+        )
+        self.breaker = breaker
+
+
+def _default_is_failure(_: BaseException) -> bool:
+    return True
+
+
+class CircuitBreaker(scribe.Scribe):
+    """
+    :param name: the name of the service, usually the host.
+    :param failure_threshold: how many consecutive failures open the breaker.
+    :param slow_call: calls taking longer than this many seconds count as
+        failures, even if they succeed.
+    :param reset_timeout: how long to stay open for the first time, before
+        letting a probe through.
+    :param max_reset_timeout: the longest we will ever stay open for.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        slow_call: float = 20.0,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 600.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_until = 0.0
+        self._current_timeout = reset_timeout
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Gets the current state, moving from open to half-open if it is time."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self.opened_until:
+                self._state = HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """
+        Call before contacting the service.
+
+        :raises CircuitOpenError: if the call should not be made.
+        """
+        state = self.state
+        with self._lock:
+            if state == CLOSED:
+                return
+            elif state == HALF_OPEN and not self._probing:
+                # Let this one through to see if the service is back.
+                self._probing = True
+                return
+
+        metrics.registry.inc("circuit_rejections_total", host=self.name)
+        raise CircuitOpenError(self)
+
+    def record_success(self, duration: float = 0.0):
+        """Call once a call has succeeded, with how long it took."""
+        if duration > self.slow_call:
+            self.record_failure()
+            return
+
+        with self._lock:
+            if self._state != CLOSED:
+                self.logger.info(f"{self.name} is back. Closing the circuit.")
+            self._state = CLOSED
+            self.failures = 0
+            self._probing = False
+            self._current_timeout = self.reset_timeout
+
+    def record_failure(self):
+        """Call once a call has failed."""
+        with self._lock:
+            self.failures += 1
+
+            if self._state == HALF_OPEN and self._probing:
+                # The probe failed, so back off for longer this time.
+                self._current_timeout = min(
+                    self._current_timeout * 2, self.max_reset_timeout
+                )
+                self._open()
+            elif self._state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def record_cancelled(self):
+        """Call if a call was cancelled, so it is neither a success nor failure."""
+        with self._lock:
+            self._probing = False
+
+    def _open(self):
+        self._state = OPEN
+        self._probing = False
+        self.trips += 1
+        self.opened_until = time.monotonic() + self._current_timeout
+        metrics.registry.inc("circuit_trips_total", host=self.name)
+        self.logger.warning(
+            f"{self.name} failed {self.failures} times in a row. Opening the "
+            f"circuit for {self._current_timeout:,.0f}s."
+        )
+
+    def guard(self, is_failure: typing.Callable[[BaseException], bool] = None):
+        """
+        Makes a context manager that checks the breaker before the body runs,
+        and records whether the body succeeded afterwards. This works around
+        both blocking and asynchronous code.
+
+        :param is_failure: decides whether an exception raised by the body
+            means the service is unhealthy. By default, any exception does.
+            Exceptions are always re-raised either way.
+        """
+        return _Guard(self, is_failure or _default_is_failure)
+
+    def to_dict(self) -> dict:
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in": max(0.0, self.opened_until - time.monotonic())
+            if state == OPEN
+            else 0.0,
+        }
+
+
+class _Guard:
+    __slots__ = ("breaker", "is_failure", "start")
+
+    def __init__(self, breaker, is_failure):
+        self.breaker = breaker
+        self.is_failure = is_failure
+        self.start = None
+
+    def __enter__(self):
+        self.breaker.before_call()
+        self.start = time.monotonic()
+        return self.breaker
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.breaker.record_success(time.monotonic() - self.start)
+        elif isinstance(exc, asyncio.CancelledError):
+            self.breaker.record_cancelled()
+        elif self.is_failure(exc):
+            self.breaker.record_failure()
+        else:
+            # The service answered; it just was not what we wanted.
+            self.breaker.record_success(time.monotonic() - self.start)
+        return False
+
+
+_breakers: typing.Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get(host: str) -> CircuitBreaker:
+    """Gets the breaker for the given host, making it if needed."""
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def breakers() -> typing.List[CircuitBreaker]:
+    """Gets every breaker made so far."""
+    with _breakers_lock:
+        return list(_breakers.values())
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    Makes a trace config for aiohttp client sessions that checks the breaker
+    for the host of each request, and records the outcome. Server errors
+    (5xx) count as failures.
+    """
+
+    async def on_request_start(_, trace_ctx, params):
+        trace_ctx.breaker = get(params.url.host)
+        # Raises if open, which aborts the request.
+        trace_ctx.breaker.before_call()
+        trace_ctx.start = time.monotonic()
+
+    async def on_request_end(_, trace_ctx, params):
+        if params.response.status >= 500:
+            trace_ctx.breaker.record_failure()
+        else:
+            trace_ctx.breaker.record_success(time.monotonic() - trace_ctx.start)
+
+    async def on_request_exception(_, trace_ctx, params):
+        if isinstance(params.exception, asyncio.CancelledError):
+            trace_ctx.breaker.record_cancelled()
+        else:
+            trace_ctx.breaker.record_failure()
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Finds syntax highlighted markdown code blocks in messages.
+
+This scans the text once, left to right, rather than using a regular
+expression with a lazy body that can backtrack badly on huge messages with
+no closing fence. Results are remembered per message and edit, so the same
+message is not scanned again each time something asks for its code.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import typing  # Type checking.
+
+from neko2.shared import collections  # TTL cache.
+
+__all__ = ("CodeBlock", "scan", "find")
+
+FENCE = "```"
+
+_language_chars = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+)
+
+# (message ID, time of last edit, text) -> code block, or None. Edits are
+# listened for for half an hour, so there is no point remembering for longer.
+_cache = collections.TtlCache(30 * 60, max_size=512)
+_missing = object()
+
+
+class CodeBlock(typing.NamedTuple):
+    #: The language given after the opening fence.
+    language: str
+    #: The code, without any whitespace at the end.
+    source: str
+
+
+def scan(text: str) -> typing.Optional[CodeBlock]:
+    """
+    Finds the first code block in the given text that has a language
+    specified. The language must be followed by whitespace, such as a new
+    line, otherwise it is treated as part of the code instead.
+
+    This runs in time linear to the length of the text.
+
+    :return: the code block, or None if there is not one.
+    """
+    start = 0
+    while True:
+        opening = text.find(FENCE, start)
+        if opening == -1:
+            return None
+
+        i = opening + len(FENCE)
+        while i < len(text) and text[i] in _language_chars:
+            i += 1
+
+        if i == opening + len(FENCE) or i == len(text) or not text[i].isspace():
+            # Not a highlighted block, so try the next fence along.
+            start = opening + 1
+            continue
+
+        closing = text.find(FENCE, i + 1)
+        if closing == -1:
+            # There are no more fences, so nothing later can match either.
+            return None
+
+        language = text[opening + len(FENCE) : i]
+        return CodeBlock(language, text[i + 1 : closing].rstrip())
+
+
+def find(text: str, message=None) -> typing.Optional[CodeBlock]:
+    """
+    Like ``scan``, but remembers the result for the given message until it
+    is next edited.
+
+    :param text: the text to scan. This is usually the content of the
+        message, or part of it.
+    :param message: the message the text came from, if any.
+    """
+    if message is None:
+        return scan(text)
+
+    key = (message.id, message.edited_at, text)
+    block = _cache.get(key, _missing)
+    if block is _missing:
+        block = scan(text)
+        _cache[key] = block
+    return block
@@ -29,12 +29,14 @@ OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from collections import *
+from collections.abc import MutableSet, Sequence, Set  # Gone from collections in 3.10.
 
+import time
 import typing
 
 from cached_property import cached_property
 
-__all__ = ("OrderedSet", "MutableOrderedSet", "Stack", "TwoWayDict")
+__all__ = ("OrderedSet", "MutableOrderedSet", "Stack", "TwoWayDict", "TtlCache")
 
 SetType = typing.TypeVar("SetType")
 
@@ -229,3 +231,52 @@ class TwoWayDict(OrderedDict):
         if "_reversed_representation" in self.__dict__:
             del self.__dict__["_reversed_representation"]
         return super().__setitem__(key, value)
+
+
+class TtlCache:
+    """
+    A mapping that forgets entries a fixed time after they are added, and
+    forgets the least recently used entries once it holds too many.
+
+    :param ttl: how many seconds to remember each entry for.
+    :param max_size: the most entries to hold at once.
+    """
+
+    __slots__ = ("ttl", "max_size", "_data")
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        # Key -> (expires_at, value)
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        elif entry[0] <= time.monotonic():
+            del self._data[key]
+            return default
+        else:
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def __contains__(self, key) -> bool:
+        sentinel = object()
+        return self.get(key, sentinel) is not sentinel
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
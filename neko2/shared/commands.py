@@ -54,6 +54,8 @@ from discord.ext.commands.core import *
 # noinspection PyUnresolvedReferences
 from discord.ext.commands.errors import *
 
+from neko2.shared import metrics
+
 BaseCommand = discord_commands.Command
 BaseGroup = discord_commands.Group
 BaseGroupMixin = discord_commands.GroupMixin
@@ -71,9 +73,13 @@ class CommandMixin:
     usage: property
     clean_params: property
     examples: list
+    cost: float
 
     def __init__(self, *args, **kwargs):
         self.examples = kwargs.pop("examples", [])
+        # How many admission tokens invoking this takes. Anything that ties
+        # up workers for a while should cost more than the default.
+        self.cost = kwargs.pop("cost", 1)
 
     @cached_property.cached_property
     def names(self) -> typing.FrozenSet[str]:
@@ -101,6 +107,13 @@ class Command(discord_commands.Command, CommandMixin):
         discord_commands.Command.__init__(self, *args, **kwargs)
         CommandMixin.__init__(self, *args, **kwargs)
 
+    async def prepare(self, ctx):
+        """Times the checks, cooldowns and argument conversion."""
+        with metrics.registry.timer(
+            "command_prepare_seconds", command=self.qualified_name
+        ):
+            await discord_commands.Command.prepare(self, ctx)
+
 
 class Group(discord_commands.Group, CommandMixin):
     """Neko command group: tweaks some stuff Discord.py provides."""
@@ -109,6 +122,13 @@ class Group(discord_commands.Group, CommandMixin):
         discord_commands.Group.__init__(self, **kwargs)
         CommandMixin.__init__(self, **kwargs)
 
+    async def prepare(self, ctx):
+        """Times the checks, cooldowns and argument conversion."""
+        with metrics.registry.timer(
+            "command_prepare_seconds", command=self.qualified_name
+        ):
+            await discord_commands.Group.prepare(self, ctx)
+
     def command(self, **kwargs):
         kwargs.setdefault("cls", Command)
         return super().command(**kwargs)
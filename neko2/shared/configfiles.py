@@ -3,6 +3,19 @@
 """
 Handles reading config files.
 
+Parsed documents are cached process-wide, keyed by path, and only read and
+deserialised again once the file changes on disk (the device, inode,
+modification time or size differ). Without a watcher running, each read
+costs a single ``stat`` call to check this. Once ``watch()`` has been called,
+a background thread looks out for changes instead (using inotify if
+``inotify_simple`` is installed, otherwise by polling), so reads of unchanged
+files do not touch the disk at all.
+
+The first time a file is parsed, the result is also written in marshal
+format to a ``__pycache__`` directory next to it, tagged with the source
+file's modification time and size. Later processes load that directly
+instead of parsing the file again, for as long as the source is unchanged.
+
 ===
 
 MIT License
@@ -28,10 +41,15 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import ast  # Literal evaluation
+import asyncio  # Executors
+import copy  # Deep copies
 import io  # Streams
+import marshal  # Compiled caches
 import os  # File operations
+import sys  # Cache tag
+import threading  # Locking, watcher thread
 import typing  # Type checking
-import warnings  # Warnings
 
 import aiofiles  # Async file IO
 
@@ -43,6 +61,8 @@ __all__ = (
     "get_config_data",
     "get_from_config_dir",
     "get_config_data_async",
+    "watch",
+    "stop_watching",
 )
 
 # Overwrite this variable to alter where we look for config files if you
@@ -60,40 +80,354 @@ def _try_import(name):
         return None
 
 
+yaml = _try_import("yaml")
+
+
+def deserialize_yaml(fp):
+    """
+    Deserializes YAML using the safe loader, which cannot construct arbitrary
+    Python objects. The C implementation is used if PyYAML was built with
+    libyaml, as it is many times faster.
+    """
+    loader = getattr(yaml, "CSafeLoader", None) or yaml.SafeLoader
+    return yaml.load(fp, Loader=loader)
+
+
 def deserialize_python(fp):
-    warnings.warn(
-        "Deserializing Python source by eval. This risks arbitrary "
-        "code execution exploits being injected."
-    )
-    string = "\n".join(fp.readlines())
-    return eval(string, globals={}, locals={})
+    """
+    Deserializes a Python literal, such as a dict of strings and numbers.
+    Nothing is executed, so anything other than a literal is rejected.
+    """
+    return ast.literal_eval(fp.read())
 
 
 # Functions to call to deserialize each type.
 deserializers = {
     ".json": _try_import("json").load,
-    ".yaml": _try_import("yaml").load,
+    ".yaml": deserialize_yaml,
     ".py": deserialize_python,
 }
 
+# Bump this if the layout of compiled caches ever changes.
+_COMPILED_VERSION = 1
+
+# Returned when a compiled cache is missing or out of date.
+_MISSING = object()
+
+# Optional. Lets us watch for changes rather than polling.
+inotify_simple = _try_import("inotify_simple")
+
+
+def _stamp(path) -> tuple:
+    """Identifies the current version of a file on disk."""
+    st = os.stat(path)
+    return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class _Document:
+    __slots__ = ("stamp", "value", "dirty")
+
+    def __init__(self, stamp, value):
+        self.stamp = stamp
+        self.value = value
+        # Set by the watcher when the file changes.
+        self.dirty = False
+
+
+class _ConfigRegistry(scribe.Scribe):
+    """
+    Process-wide cache of resolved config file paths and parsed documents.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._resolved: typing.Dict[typing.Tuple[str, bool], typing.Tuple[str, str]] = {}
+        self._documents: typing.Dict[str, _Document] = {}
+        self.watcher: typing.Optional["_Watcher"] = None
+
+    def resolve(self, base, should_guess, resolver):
+        """Resolves a path and extension once, remembering the result."""
+        key = (base, should_guess)
+        with self._lock:
+            if key not in self._resolved:
+                self._resolved[key] = resolver(base, should_guess)
+            return self._resolved[key]
+
+    def forget(self, path):
+        """Forgets everything about the given resolved path."""
+        with self._lock:
+            self._documents.pop(path, None)
+            for key, (resolved, _) in list(self._resolved.items()):
+                if resolved == path:
+                    del self._resolved[key]
+
+    def lookup(self, path) -> typing.Tuple[bool, typing.Any, typing.Optional[tuple]]:
+        """
+        Looks up a cached document.
+
+        :return: whether it was a hit, the cached value if so, and the stamp
+            of the file on disk if we had to check it (to store with the
+            value once it has been read again).
+        """
+        with self._lock:
+            doc = self._documents.get(path)
+
+        if doc is not None and not doc.dirty and self.watcher is not None:
+            return True, doc.value, doc.stamp
+
+        try:
+            stamp = _stamp(path)
+        except FileNotFoundError:
+            self.forget(path)
+            raise
+
+        if doc is not None and doc.stamp == stamp:
+            doc.dirty = False
+            return True, doc.value, stamp
+        return False, None, stamp
+
+    def store(self, path, stamp, value):
+        with self._lock:
+            self._documents[path] = _Document(stamp, value)
+            if self.watcher is not None:
+                self.watcher.add(path)
+
+    def invalidate(self, path=None):
+        """Drops the given cached document, or all of them if None."""
+        with self._lock:
+            if path is None:
+                self._documents.clear()
+            else:
+                self._documents.pop(path, None)
+
+    def is_cached(self, path) -> bool:
+        with self._lock:
+            doc = self._documents.get(path)
+        return doc is not None and not doc.dirty
+
+    def mark_changed(self, path=None):
+        """
+        Called by the watcher when a file may have changed. The stamp is
+        checked on the next read to be sure. Passing None marks everything.
+        """
+        with self._lock:
+            docs = self._documents.values() if path is None else [self._documents.get(path)]
+            for doc in docs:
+                if doc is not None:
+                    doc.dirty = True
+
+    def paths(self) -> typing.List[str]:
+        with self._lock:
+            return list(self._documents)
+
+    def stamp_of(self, path):
+        with self._lock:
+            doc = self._documents.get(path)
+        return doc.stamp if doc is not None else None
+
+
+_registry = _ConfigRegistry()
+
+
+def _compiled_path(path) -> str:
+    """
+    Gets where the compiled cache for the given file lives. Marshal data is
+    specific to the interpreter version, so this is tagged with it.
+    """
+    directory, name = os.path.split(path)
+    tag = sys.implementation.cache_tag
+    return os.path.join(directory, "__pycache__", f"{name}.{tag}.marshal")
+
+
+def _load_compiled(data: bytes, stamp: tuple):
+    """
+    Loads compiled cache data, if it was made from the same version of the
+    source file that the stamp describes. Otherwise, ``_MISSING`` is returned.
+    """
+    try:
+        version, mtime, size, value = marshal.loads(data)
+    except Exception:
+        return _MISSING
+
+    if version != _COMPILED_VERSION or (mtime, size) != stamp[2:]:
+        return _MISSING
+    return value
+
+
+def _read_compiled(path, stamp):
+    try:
+        with open(_compiled_path(path), "rb") as fp:
+            return _load_compiled(fp.read(), stamp)
+    except OSError:
+        return _MISSING
+
+
+def _write_compiled(path, stamp, value):
+    """
+    Writes the compiled cache for a file. This silently gives up if the
+    value cannot be marshalled (e.g. YAML dates) or the directory cannot be
+    written to.
+    """
+    try:
+        data = marshal.dumps((_COMPILED_VERSION, stamp[2], stamp[3], value))
+    except ValueError:
+        return
+
+    compiled = _compiled_path(path)
+    temp = f"{compiled}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(compiled), exist_ok=True)
+        with open(temp, "wb") as fp:
+            fp.write(data)
+        # Atomic, so other processes never see half a file.
+        os.replace(temp, compiled)
+    except OSError as ex:
+        ConfigFile.logger.debug(f"Could not write compiled cache {compiled}: {ex}")
+
+
+class _Watcher(threading.Thread, scribe.Scribe):
+    """
+    Marks cached documents as changed when their files change on disk.
+
+    If ``inotify_simple`` is available, we watch the directory each file is
+    in (editors often replace files rather than writing to them, which an
+    inotify watch on the file itself would miss). Otherwise, we stat every
+    cached file at the given interval.
+    """
+
+    def __init__(self, registry, interval):
+        super().__init__(name="neko2-config-watcher", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        # Watch descriptor to directory, and directory to watch descriptor.
+        self._wd2dir = {}
+        self._dir2wd = {}
+
+        if inotify_simple is not None:
+            self._inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            self._mask = (
+                flags.CLOSE_WRITE
+                | flags.MOVED_TO
+                | flags.CREATE
+                | flags.DELETE
+                | flags.ATTRIB
+            )
+        else:
+            self._inotify = None
+
+        for path in registry.paths():
+            self.add(path)
+
+    def add(self, path):
+        """Makes sure the given file is being watched."""
+        if self._inotify is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        with self._lock:
+            if directory not in self._dir2wd:
+                try:
+                    wd = self._inotify.add_watch(directory, self._mask)
+                except OSError as ex:
+                    # Gone already. We will notice on the next read.
+                    self.logger.warning(f"Cannot watch {directory}: {ex}")
+                    return
+                self._dir2wd[directory] = wd
+                self._wd2dir[wd] = directory
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        self.logger.info(
+            "Watching config files using "
+            + ("inotify" if self._inotify is not None else f"polling every {self.interval}s")
+        )
+        while not self._stop_event.is_set():
+            try:
+                if self._inotify is not None:
+                    self._wait_inotify()
+                else:
+                    self._poll()
+            except Exception:
+                self.logger.exception("Config watcher failed; marking everything changed")
+                self.registry.mark_changed()
+                self._stop_event.wait(self.interval)
+
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _wait_inotify(self):
+        events = self._inotify.read(timeout=int(self.interval * 1000))
+        if not events:
+            return
+
+        changed = set()
+        with self._lock:
+            for event in events:
+                directory = self._wd2dir.get(event.wd)
+                if directory is not None:
+                    changed.add(os.path.join(directory, event.name))
+
+        for path in self.registry.paths():
+            if os.path.abspath(path) in changed:
+                self.logger.info(f"{path} changed on disk")
+                self.registry.mark_changed(path)
+
+    def _poll(self):
+        self._stop_event.wait(self.interval)
+        for path in self.registry.paths():
+            try:
+                stamp = _stamp(path)
+            except OSError:
+                stamp = None
+            # Only report each change once, until it is read again.
+            if stamp != self.registry.stamp_of(path) and self.registry.is_cached(path):
+                self.logger.info(f"{path} changed on disk")
+                self.registry.mark_changed(path)
+
+
+def watch(interval: float = 5.0):
+    """
+    Starts watching cached config files for changes in the background, so
+    reads of unchanged files no longer need to check the disk.
+
+    :param interval: how often to poll in seconds, if inotify is not
+        available.
+    """
+    with _registry._lock:
+        if _registry.watcher is None:
+            _registry.watcher = _Watcher(_registry, interval)
+            _registry.watcher.start()
+
+
+def stop_watching():
+    """Stops watching for changes. Reads go back to checking the disk."""
+    with _registry._lock:
+        watcher, _registry.watcher = _registry.watcher, None
+    if watcher is not None:
+        watcher.stop()
+
 
 class ConfigFile(scribe.Scribe):
     """
     Representation of a configuration file that allows for read-only
-    access. This model assumes that the config file is not changeable at
-    runtime; thus the data is cached after the first access.
+    access. The data is cached process-wide after the first access, and is
+    only read again if the file changes. Each read returns a copy, so
+    callers are free to modify what they are given.
 
     This also will attempt to guess the file extension if omitted, for example,
     if you attempt to load `foo`, but `foo` does not exist, the class will
     attempt to resolve `foo.json`, then `foo.yaml`, etc. If one of those is
     found, then that is loaded instead.
 
-    Note. This is not thread-safe.
-
-    The constructor will block for a very short period of time whilst it
-    checks that the file is a valid file inode and that it exists. This is only
-    really a problem if you are constantly making these objects in a coroutine
-    and you have a very slow file system.
+    The first time a given path is used, the constructor will block for a
+    very short period of time whilst it checks that the file is a valid file
+    inode and that it exists. The result is remembered, so this is only done
+    once per path.
 
     :param path: the path of the file to read. If extension is omitted, we
         attempt to find it.
@@ -102,19 +436,23 @@ class ConfigFile(scribe.Scribe):
     """
 
     def __init__(self, path, *, should_guess=True):
-        path, ext = self._get_extension(path, should_guess)
-
-        if not path:
+        path, ext = _registry.resolve(path, should_guess, self._resolve)
+        self.path = path
+        try:
+            self.deserializer = deserializers[ext]
+        except KeyError:
+            raise NotImplementedError(f"No deserialiser is defined for {ext}")
+
+    @classmethod
+    def _resolve(cls, base, should_guess) -> typing.Tuple[str, str]:
+        resolved = cls._get_extension(base, should_guess)
+        if not resolved:
             raise ValueError("Not a valid path")
-        elif not os.access(path, os.R_OK):
+
+        path, _ = resolved
+        if not os.access(path, os.R_OK):
             raise PermissionError(f"I do not have read access to {path!r}.")
-        else:
-            self.path = path
-            self._value = None
-            try:
-                self.deserializer = deserializers[ext]
-            except KeyError:
-                raise NotImplementedError(f"No deserialiser is defined for {ext}")
+        return resolved
 
     @staticmethod
     def _get_extension(
@@ -142,46 +480,63 @@ class ConfigFile(scribe.Scribe):
 
     async def async_get(self):
         """Asynchronously reads the config from file."""
-        if self._value is not None:
-            return self._value
-        else:
-            self.logger.info(
-                f"Asynchronously deserialising {self.path} using "
-                f'{getattr(self.deserializer, "__module__")}.'
-                f"{self.deserializer.__name__}"
-            )
-            async with aiofiles.open(self.path) as fp:
-                with io.StringIO(await fp.read()) as str_io:
-                    str_io.seek(0)
-
-                    return self.deserializer(str_io)
+        hit, value, stamp = _registry.lookup(self.path)
+        if not hit:
+            try:
+                async with aiofiles.open(_compiled_path(self.path), "rb") as fp:
+                    value = _load_compiled(await fp.read(), stamp)
+            except OSError:
+                value = _MISSING
+
+            if value is _MISSING:
+                self.logger.info(
+                    f"Asynchronously deserialising {self.path} using "
+                    f'{getattr(self.deserializer, "__module__")}.'
+                    f"{self.deserializer.__name__}"
+                )
+                async with aiofiles.open(self.path) as fp:
+                    with io.StringIO(await fp.read()) as str_io:
+                        str_io.seek(0)
+
+                        value = self.deserializer(str_io)
+
+                await asyncio.get_event_loop().run_in_executor(
+                    None, _write_compiled, self.path, stamp, value
+                )
+            _registry.store(self.path, stamp, value)
+
+        return copy.deepcopy(value)
 
     def sync_get(self):
         """Blocks while we read the config from the file."""
-        if self._value is not None:
-            return self._value
-        else:
-            self.logger.info(
-                f"Deserialising {self.path} using "
-                f'{getattr(self.deserializer, "__module__")}.'
-                f"{self.deserializer.__name__}"
-            )
+        hit, value, stamp = _registry.lookup(self.path)
+        if not hit:
+            value = _read_compiled(self.path, stamp)
+
+            if value is _MISSING:
+                self.logger.info(
+                    f"Deserialising {self.path} using "
+                    f'{getattr(self.deserializer, "__module__")}.'
+                    f"{self.deserializer.__name__}"
+                )
+
+                with open(self.path) as fp:
+                    value = self.deserializer(fp)
+                _write_compiled(self.path, stamp, value)
+            _registry.store(self.path, stamp, value)
 
-            with open(self.path) as fp:
-                return self.deserializer(fp)
+        return copy.deepcopy(value)
 
     def invalidate(self):
         """
         Invalidates the cache. This causes the next read to cause a new file
         read operation.
         """
-        old = self._value
-        self._value = None
-        return old
+        _registry.invalidate(self.path)
 
     @property
     def is_cached(self):
-        return self._value is not None
+        return _registry.is_cached(self.path)
 
 
 def get_from_config_dir(file_name, *, load_now=True):
@@ -84,14 +84,15 @@ def json(file, *, relative_to_here=True):
 
 
 def yaml(file, *, relative_to_here=True):
-    """Loads a YAML file on the fly and returns the data."""
+    """Loads a YAML file on the fly with the safe loader and returns the data."""
     import yaml
 
     if relative_to_here:
         file = in_here(file, nested_by=1)
 
+    loader = getattr(yaml, "CSafeLoader", None) or yaml.SafeLoader
     with open(file) as fp:
-        return yaml.load(fp)
+        return yaml.load(fp, Loader=loader)
 
 
 def get_inode_type(*paths):
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Deferred imports for heavy third party dependencies.
+
+Most processes only ever handle a small fraction of the commands that need
+things like ``bs4`` or ``PIL``, so there is no point paying to import them
+when the bot starts. Instead, cogs can do this:
+
+    bs4 = lazy.lazy_import("bs4")
+
+...and use ``bs4`` as if it were the module. The real import happens the
+first time an attribute is accessed. Anything registered here can also be
+imported ahead of time in the background with ``warm_all``, which the bot
+does once it is ready unless ``warm_imports`` is disabled in the config.
+
+Note that annotations at module or class level are evaluated at import time,
+so avoid using lazy modules in those, or the import will happen anyway.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import importlib  # Dynamic imports.
+import logging  # Logging.
+import threading  # Locks.
+import types  # ModuleType
+import typing  # Type checking.
+
+from neko2.shared import alg  # Timing.
+
+__all__ = ("LazyModule", "lazy_import", "is_loaded", "warm_all")
+
+# Every lazy module we have handed out, by name.
+_registry: typing.Dict[str, "LazyModule"] = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """
+    Stands in for a module until an attribute is first accessed, at which
+    point the real module is imported and every attribute lookup is forwarded
+    to it from then on.
+
+    :param name: the fully qualified name of the module to import.
+    """
+
+    __slots__ = ("_name", "_module", "_lock")
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self) -> types.ModuleType:
+        """Imports the module if it has not been imported yet."""
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module, time = alg.time_it(importlib.import_module, self._name)
+                    logging.getLogger(__name__).info(
+                        f"Lazily imported {self._name} in {time * 1000:,.2f}ms"
+                    )
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._load(), key, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Gets a lazy stand-in for the given module. Asking for the same module
+    more than once gives the same object.
+
+    :param name: the fully qualified name of the module.
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def is_loaded(name: str) -> bool:
+    """True if the given lazily imported module has actually been imported."""
+    module = _registry.get(name)
+    # noinspection PyProtectedMember
+    return module is not None and module._module is not None
+
+
+def warm_all() -> typing.List[typing.Tuple[str, BaseException]]:
+    """
+    Imports every lazy module that has not yet been imported. This blocks,
+    so run it in an executor.
+
+    :return: a list of each module that failed to import, paired with the
+        exception that was raised.
+    """
+    logger = logging.getLogger(__name__)
+
+    with _registry_lock:
+        # noinspection PyProtectedMember
+        pending = [m for m in _registry.values() if m._module is None]
+
+    failures = []
+    for module in pending:
+        # noinspection PyBroadException
+        try:
+            # noinspection PyProtectedMember
+            module._load()
+        except BaseException as ex:
+            # noinspection PyProtectedMember
+            logger.warning(f"Could not warm {module._name}: {ex}")
+            # noinspection PyProtectedMember
+            failures.append((module._name, ex))
+    return failures
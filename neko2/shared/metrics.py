@@ -0,0 +1,352 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+In-process metrics: counters, and histograms that can report percentiles.
+
+Anything can record into the process-wide ``registry``:
+
+    metrics.registry.inc("things_done_total", kind="foo")
+    metrics.registry.observe("thing_seconds", 0.25, kind="foo")
+
+    with metrics.registry.timer("thing_seconds", kind="foo"):
+        ...
+
+Histograms keep cumulative bucket counts for the Prometheus text format, as
+well as a window of the most recent samples to work out percentiles from.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import collections  # Sample windows.
+import contextlib  # Context managers.
+import threading  # Locking.
+import time  # Timing.
+import typing  # Type checking.
+
+import aiohttp  # HTTP tracing.
+
+__all__ = (
+    "DEFAULT_BUCKETS",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "registry",
+    "http_trace_config",
+)
+
+# Bucket upper bounds in seconds. These suit anything from a cache hit up to
+# a slow compiler run.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# How many of the most recent samples each histogram keeps for percentiles.
+DEFAULT_WINDOW = 1024
+
+Labels = typing.Tuple[typing.Tuple[str, str], ...]
+
+
+class Counter:
+    """A number that only ever goes up."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    """A number that can go up and down, such as the length of a queue."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Records observations into buckets, and keeps a window of the most recent
+    observations to calculate percentiles with.
+
+    :param buckets: the upper bounds of each bucket.
+    :param window: how many recent samples to keep.
+    """
+
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "recent", "_lock")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=DEFAULT_WINDOW):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def percentiles(self, *ps: float) -> typing.List[typing.Optional[float]]:
+        """
+        Gets the given percentiles (0-100) of the recent samples using the
+        nearest rank method. Each is None if nothing has been recorded yet.
+        """
+        with self._lock:
+            samples = sorted(self.recent)
+
+        if not samples:
+            return [None] * len(ps)
+
+        results = []
+        for p in ps:
+            rank = max(1, -(-len(samples) * p // 100))
+            results.append(samples[min(int(rank), len(samples)) - 1])
+        return results
+
+    def percentile(self, p: float) -> typing.Optional[float]:
+        """Gets a single percentile (0-100) of the recent samples."""
+        return self.percentiles(p)[0]
+
+    def cumulative_buckets(self) -> typing.List[typing.Tuple[str, int]]:
+        """Gets each bucket bound with the number of samples at or below it."""
+        with self._lock:
+            counts, total = list(self.bucket_counts), self.count
+
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative.append((_format_number(bound), running))
+        cumulative.append(("+Inf", total))
+        return cumulative
+
+
+def _format_number(number) -> str:
+    return repr(float(number)) if isinstance(number, float) else str(number)
+
+
+def _format_labels(labels: Labels, **extra) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class Registry:
+    """Holds every metric, keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: typing.Dict[str, typing.Dict[Labels, Counter]] = {}
+        self._gauges: typing.Dict[str, typing.Dict[Labels, Gauge]] = {}
+        self._histograms: typing.Dict[str, typing.Dict[Labels, Histogram]] = {}
+        self._descriptions: typing.Dict[str, str] = {}
+
+    @staticmethod
+    def _labels(labels: dict) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def describe(self, name: str, description: str):
+        """Sets the help text shown for a metric in the Prometheus output."""
+        self._descriptions[name] = description
+
+    def counter(self, name: str, **labels) -> Counter:
+        """Gets the counter with the given name and labels, making it if needed."""
+        key = self._labels(labels)
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            if key not in family:
+                family[key] = Counter()
+            return family[key]
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        """Gets the gauge with the given name and labels, making it if needed."""
+        key = self._labels(labels)
+        with self._lock:
+            family = self._gauges.setdefault(name, {})
+            if key not in family:
+                family[key] = Gauge()
+            return family[key]
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        """Gets the histogram with the given name and labels, making it if needed."""
+        key = self._labels(labels)
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            if key not in family:
+                family[key] = Histogram()
+            return family[key]
+
+    def inc(self, name: str, amount=1, **labels):
+        self.counter(name, **labels).inc(amount)
+
+    def set(self, name: str, value, **labels):
+        self.gauge(name, **labels).set(value)
+
+    def observe(self, name: str, value: float, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Records how long the body of the ``with`` block takes in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counters(self, name: str) -> typing.Dict[Labels, Counter]:
+        """Gets a copy of every counter with the given name, keyed by labels."""
+        with self._lock:
+            return dict(self._counters.get(name, {}))
+
+    def gauges(self, name: str) -> typing.Dict[Labels, Gauge]:
+        """Gets a copy of every gauge with the given name, keyed by labels."""
+        with self._lock:
+            return dict(self._gauges.get(name, {}))
+
+    def histograms(self, name: str) -> typing.Dict[Labels, Histogram]:
+        """Gets a copy of every histogram with the given name, keyed by labels."""
+        with self._lock:
+            return dict(self._histograms.get(name, {}))
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = {n: dict(f) for n, f in self._counters.items()}
+            gauges = {n: dict(f) for n, f in self._gauges.items()}
+            histograms = {n: dict(f) for n, f in self._histograms.items()}
+
+        lines = []
+
+        for name in sorted(counters):
+            if name in self._descriptions:
+                lines.append(f"# HELP {name} {self._descriptions[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, counter in sorted(counters[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+
+        for name in sorted(gauges):
+            if name in self._descriptions:
+                lines.append(f"# HELP {name} {self._descriptions[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, gauge in sorted(gauges[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {gauge.value}")
+
+        for name in sorted(histograms):
+            if name in self._descriptions:
+                lines.append(f"# HELP {name} {self._descriptions[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(histograms[name].items()):
+                for bound, count in histogram.cumulative_buckets():
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, le=bound)} {count}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry.
+registry = Registry()
+
+registry.describe("http_request_seconds", "Time taken by outgoing HTTP requests.")
+registry.describe(
+    "executor_queue_wait_seconds", "Time jobs wait for a free executor thread."
+)
+registry.describe("executor_run_seconds", "Time jobs take to run in an executor.")
+
+
+def http_trace_config(target: Registry = registry) -> aiohttp.TraceConfig:
+    """
+    Makes a trace config for aiohttp client sessions that records how long
+    each request takes, by host, method and status.
+    """
+
+    async def on_request_start(_, trace_ctx, params):
+        trace_ctx.start = time.perf_counter()
+
+    async def on_request_end(_, trace_ctx, params):
+        target.observe(
+            "http_request_seconds",
+            time.perf_counter() - trace_ctx.start,
+            host=params.url.host,
+            method=params.method,
+            status=params.response.status,
+        )
+
+    async def on_request_exception(_, trace_ctx, params):
+        target.observe(
+            "http_request_seconds",
+            time.perf_counter() - trace_ctx.start,
+            host=params.url.host,
+            method=params.method,
+            status=type(params.exception).__name__,
+        )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
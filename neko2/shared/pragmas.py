@@ -0,0 +1,129 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Parses ``#pragma neko [flag]`` lines out of source code in one pass.
+
+Compiled languages let users turn on extra flags by adding pragmas to their
+code, like so:
+
+    #pragma neko math
+    #pragma neko pthread
+
+Rather than each language splitting the source into lines and searching the
+lines once per flag it knows about, a single regular expression finds every
+pragma at once, regardless of how many there are.
+
+Run this module directly to benchmark it against large sources.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import enum  # Flags.
+import re  # Regular expressions.
+import typing  # Type checking.
+
+__all__ = ("Pragma", "Directives", "parse")
+
+
+class Pragma(enum.Flag):
+    """Flags that can be turned on with a pragma."""
+
+    NONE = 0
+    #: Force 32 bit output.
+    M32 = enum.auto()
+    #: Dump assembly rather than running the program.
+    ASM = enum.auto()
+    #: Link the C++ filesystem library.
+    FS = enum.auto()
+    #: Compile with gcc rather than clang.
+    GCC = enum.auto()
+    #: Link the maths library.
+    MATH = enum.auto()
+    #: Link pthreads.
+    PTHREAD = enum.auto()
+
+
+# What users write after ``#pragma neko`` for each flag.
+_names = {
+    "32": Pragma.M32,
+    "asm": Pragma.ASM,
+    "fs": Pragma.FS,
+    "gcc": Pragma.GCC,
+    "math": Pragma.MATH,
+    "pthread": Pragma.PTHREAD,
+}
+
+# A pragma must be on a line on its own.
+_pragma_re = re.compile(
+    r"^[ \t]*#[ \t]*pragma[ \t]+neko[ \t]+(\S+)[ \t]*\r?$", re.MULTILINE
+)
+
+
+class Directives(typing.NamedTuple):
+    #: The flags that were turned on.
+    flags: Pragma
+    #: The source, with the pragmas we understood blanked out.
+    source: str
+
+
+def parse(source: str, supported: Pragma = ~Pragma.NONE) -> Directives:
+    """
+    Finds the pragmas in the given source.
+
+    Any pragma that was understood is replaced with an empty line, so that
+    line numbers in compiler errors still match up with what the user wrote.
+    Pragmas that are unknown or not in ``supported`` are left alone.
+
+    :param source: the source code to parse.
+    :param supported: the flags the language knows about. Defaults to all.
+    :return: the flags that were set, and the cleaned source.
+    """
+    flags = Pragma.NONE
+
+    def replace(match):
+        nonlocal flags
+        flag = _names.get(match.group(1).lower(), Pragma.NONE) & supported
+        if not flag:
+            return match.group(0)
+        flags |= flag
+        return ""
+
+    source = _pragma_re.sub(replace, source)
+    return Directives(flags, source)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    body = "int x = 0;\n    x += 1;\n"
+    for lines in (1_000, 10_000, 100_000):
+        src = (
+            "#pragma neko math\n#pragma neko 32\n"
+            + body * (lines // 2)
+            + "#pragma neko asm\n"
+        )
+        number = max(1, 200_000 // lines)
+        time = timeit.timeit(lambda: parse(src), number=number) / number
+        print(f"{lines:>7,} lines: {time * 1000:8.3f}ms per parse")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Opt-in startup profiling.
+
+Pass ``--profile-startup`` on the command line to record nested timings for
+each stage of starting the bot, along with the cost of each module import.
+A JSON report is written to ``startup-profile.json`` in the working
+directory, or to the given path if the flag is passed as
+``--profile-startup=path/to/report.json``.
+
+This has to be installed before anything heavy gets imported for the import
+costs to be meaningful, so it only depends on the standard library.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import contextlib  # Context managers.
+import json  # Report serialisation.
+import os  # Process info.
+import platform  # Interpreter info.
+import sys  # Meta path and argv.
+import threading  # Per-thread section stacks.
+import time  # Timing.
+import typing  # Type checking.
+
+__all__ = ("FLAG", "DEFAULT_REPORT_PATH", "WATCHED_MODULES", "StartupProfiler", "startup")
+
+# The command line flag that enables profiling.
+FLAG = "--profile-startup"
+
+# Where to write the report if no path is given with the flag.
+DEFAULT_REPORT_PATH = "startup-profile.json"
+
+# Heavy third party dependencies we always want the import cost of, even if
+# they did not make it into the top of the report.
+WATCHED_MODULES = ("discord", "aiohttp", "PIL", "bs4", "googletrans", "wordnik")
+
+# How many of the most expensive imports to include in the report.
+TOP_IMPORTS = 40
+
+
+class _Section:
+    """A timed region of startup, possibly containing nested regions."""
+
+    __slots__ = ("name", "start", "end", "children", "extra")
+
+    def __init__(self, name, start, **extra):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.children = []
+        self.extra = extra
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin) -> dict:
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.extra,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class _TimedImportFinder:
+    """
+    Meta path finder that never finds anything itself. Instead it asks the
+    rest of the meta path for a spec and wraps the loader's ``exec_module``
+    so that the time taken to execute each module is recorded.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._local = threading.local()
+
+    def find_spec(self, fullname, path=None, target=None):
+        # Prevent recursing into ourself while we query the other finders.
+        if getattr(self._local, "finding", False):
+            return None
+
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        loader = spec.loader
+        # Builtin and frozen importers are classes shared by every module they
+        # load, so we cannot patch them per module. They are cheap anyway.
+        if loader is None or isinstance(loader, type) or not hasattr(
+            loader, "exec_module"
+        ):
+            return spec
+
+        exec_module = loader.exec_module
+        profiler = self.profiler
+
+        def timed_exec_module(module):
+            stack = profiler._import_stack()
+            entry = {"module": fullname, "children_ms": 0.0}
+            stack.append(entry)
+            start = time.perf_counter()
+            try:
+                return exec_module(module)
+            finally:
+                cumulative = (time.perf_counter() - start) * 1000
+                stack.pop()
+                if stack:
+                    stack[-1]["children_ms"] += cumulative
+                profiler._record_import(
+                    fullname, cumulative, cumulative - entry["children_ms"]
+                )
+
+        loader.exec_module = timed_exec_module
+        return spec
+
+
+class StartupProfiler:
+    """
+    Records nested timings of startup and the cost of each import. While
+    disabled, every method is a cheap no-op, so this can be left in place
+    around startup code permanently.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.report_path = None
+        self._origin = time.perf_counter()
+        self._root = _Section("startup", self._origin)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._imports: typing.Dict[str, typing.Tuple[float, float]] = {}
+        self.marks: typing.Dict[str, float] = {}
+        self._finder = None
+
+    def enable(self, report_path=DEFAULT_REPORT_PATH):
+        """
+        Enables profiling and starts timing any imports from now on.
+
+        :param report_path: where to write the report to.
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self.report_path = report_path
+        self._origin = time.perf_counter()
+        self._root = _Section("startup", self._origin)
+        self._finder = _TimedImportFinder(self)
+        sys.meta_path.insert(0, self._finder)
+
+    def enable_from_argv(self, argv: typing.Sequence[str] = None) -> bool:
+        """
+        Enables profiling if the startup profiling flag is present in the
+        given arguments (defaults to ``sys.argv``).
+
+        :return: True if profiling was enabled.
+        """
+        for arg in sys.argv if argv is None else argv:
+            if arg == FLAG:
+                self.enable()
+            elif arg.startswith(FLAG + "="):
+                self.enable(arg[len(FLAG) + 1 :] or DEFAULT_REPORT_PATH)
+        return self.enabled
+
+    def disable(self):
+        """
+        Stops profiling. Anything recorded so far is kept, but nothing more
+        is recorded, and no report is written, until profiling is enabled
+        again.
+        """
+        self.enabled = False
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        self._finder = None
+
+    def _import_stack(self) -> list:
+        stack = getattr(self._local, "import_stack", None)
+        if stack is None:
+            stack = self._local.import_stack = []
+        return stack
+
+    def _section_stack(self) -> typing.List[_Section]:
+        stack = getattr(self._local, "section_stack", None)
+        if stack is None:
+            stack = self._local.section_stack = [self._root]
+        return stack
+
+    def _record_import(self, name, cumulative_ms, self_ms):
+        with self._lock:
+            self._imports[name] = (cumulative_ms, self_ms)
+
+    @contextlib.contextmanager
+    def section(self, name: str, **extra):
+        """
+        Times the body of the ``with`` block as a section of startup. Sections
+        opened inside another section on the same thread are nested under it.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._section_stack()
+        section = _Section(name, time.perf_counter(), **extra)
+        with self._lock:
+            stack[-1].children.append(section)
+        stack.append(section)
+        try:
+            yield section
+        finally:
+            section.end = time.perf_counter()
+            stack.pop()
+
+    def record(self, name: str, seconds: float, **extra):
+        """
+        Records a section that was timed elsewhere as a leaf of the current
+        section.
+        """
+        if not self.enabled:
+            return
+
+        end = time.perf_counter()
+        section = _Section(name, end - seconds, **extra)
+        section.end = end
+        with self._lock:
+            self._section_stack()[-1].children.append(section)
+
+    def mark(self, name: str):
+        """Records a named point in time, such as when we become ready."""
+        if self.enabled:
+            self.marks[name] = time.perf_counter()
+
+    def report(self) -> dict:
+        """Produces the report as a JSON-serialisable dict."""
+        with self._lock:
+            imports = dict(self._imports)
+
+        top = sorted(imports.items(), key=lambda kv: kv[1][0], reverse=True)
+        watched = {}
+        for name in WATCHED_MODULES:
+            if name in imports:
+                watched[name] = round(imports[name][0], 3)
+            else:
+                # Either imported before profiling began, or never imported.
+                watched[name] = "preloaded" if name in sys.modules else None
+
+        return {
+            "generated_at": time.time(),
+            "pid": os.getpid(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "argv": list(sys.argv),
+            "total_ms": round(self._root.duration * 1000, 3),
+            "marks_ms": {
+                name: round((at - self._origin) * 1000, 3)
+                for name, at in self.marks.items()
+            },
+            "sections": self._root.to_dict(self._origin),
+            "watched_imports_ms": watched,
+            "top_imports": [
+                {
+                    "module": name,
+                    "cumulative_ms": round(cumulative, 3),
+                    "self_ms": round(self_ms, 3),
+                }
+                for name, (cumulative, self_ms) in top[:TOP_IMPORTS]
+            ],
+            "imported_module_count": len(imports),
+        }
+
+    def write_report(self, path=None) -> typing.Optional[str]:
+        """
+        Writes the report to disk if profiling is enabled.
+
+        :param path: the path to write to. Defaults to the path given when
+            profiling was enabled.
+        :return: the path written to, or None if disabled.
+        """
+        if not self.enabled:
+            return None
+
+        path = path or self.report_path or DEFAULT_REPORT_PATH
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+        return path
+
+
+# The process-wide startup profiler.
+startup = StartupProfiler()
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Runs build scripts on this machine, in a throwaway directory, with limits on
+how much time, memory and output they can use.
+
+Each job is run with ``unshare`` in its own mount, PID, network, IPC and
+UTS namespaces, as a dedicated unprivileged user, with no capabilities and
+no way to gain privileges. It sees a read-only copy of the filesystem with
+its directory as ``/tmp``, and with the bot's configuration hidden. It can
+only see and signal its own processes, and cannot reach the network. When
+the job exits or is killed, so is everything it started. Only so many jobs
+run at once; the rest wait their turn.
+
+This needs the bot to be running as root, so that it can set up the
+namespaces and switch to the sandbox user. There is no seccomp filter, so
+jobs can still make any system call the kernel lets that user make.
+
+Programs that are slow to start, like interpreters, can also be kept started
+ahead of time in a ``WarmPool``, and handed jobs on their standard input.
+
+This is not a substitute for a separate machine. It relies on whatever
+compilers and interpreters are installed here, and these must be readable
+by the sandbox user.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio  # Subprocesses.
+import os  # Process groups.
+import pwd  # The sandbox user.
+import resource  # Resource limits.
+import shutil  # Finding executables, removing directories.
+import signal  # Killing jobs.
+import subprocess  # Checking we can isolate jobs.
+import tempfile  # Job directories.
+import time  # Timing.
+import typing  # Type checking.
+
+from dataclasses import dataclass
+
+from neko2.shared import configfiles, scribe
+
+__all__ = ("IsolationError", "SandboxResult", "Sandbox", "WarmPool")
+
+# Run as root in the new namespaces to set up what the job can see, before
+# becoming the sandbox user and running the job. The arguments are the user
+# and group IDs, the job directory, any paths to hide, then "--" and the
+# command to run.
+_SETUP = """
+set -e
+uid=$1 gid=$2 job=$3
+shift 3
+mount --make-rprivate /
+while [ "$1" != -- ]; do
+    if [ -d "$1" ]; then
+        mount -t tmpfs -o ro,mode=0755,size=4k tmpfs "$1"
+    fi
+    shift
+done
+shift
+mount --bind "$job" /tmp
+while read -r _ _ _ _ point _; do
+    case $point in
+        /proc|/proc/*|/tmp) ;;
+        *) mount -o remount,bind,ro "$point" ;;
+    esac
+done < /proc/self/mountinfo
+cd /tmp
+exec setpriv --reuid="$uid" --regid="$gid" --clear-groups --no-new-privs \\
+    --inh-caps=-all --bounding-set=-all -- "$@"
+"""
+
+
+class IsolationError(RuntimeError):
+    """Raised when jobs cannot be isolated from the rest of this machine."""
+
+
+@dataclass()
+class SandboxResult:
+    output: str
+    returncode: typing.Optional[int]
+    timed_out: bool
+    truncated: bool
+    duration: float
+
+
+class Sandbox(scribe.Scribe):
+    """
+    :param max_concurrency: how many jobs can run at once. Defaults to the
+        number of cores we can run on.
+    :param timeout: wall clock seconds before a job is killed.
+    :param cpu_seconds: CPU seconds each process may use.
+    :param memory_bytes: the most address space each process may map.
+    :param file_bytes: the biggest file a job may write.
+    :param max_processes: the most processes the sandbox user may have,
+        across every job that is running.
+    :param max_output: the most output to keep. Jobs are killed once they
+        print more than this.
+    :param user: the name or ID of the user to run jobs as. Nothing else
+        should run as this user, and it must not be root.
+    :param hidden_paths: directories that jobs should not be able to see.
+        Defaults to the bot's working directory and configuration directory.
+    :param isolate: false to run jobs as the bot, with only the limits and
+        none of the isolation. This is only fit for testing with code you
+        trust.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = None,
+        timeout: float = 20.0,
+        cpu_seconds: int = 10,
+        memory_bytes: int = 512 * 1024 * 1024,
+        file_bytes: int = 16 * 1024 * 1024,
+        max_processes: int = 64,
+        max_output: int = 64 * 1024,
+        user: typing.Union[str, int] = "neko2-sandbox",
+        hidden_paths: typing.Sequence[str] = None,
+        isolate: bool = True,
+    ):
+        self.max_concurrency = max_concurrency or len(os.sched_getaffinity(0)) or 1
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.file_bytes = file_bytes
+        self.max_processes = max_processes
+        self.max_output = max_output
+        self.user = user
+        if hidden_paths is None:
+            hidden_paths = (os.getcwd(), configfiles.CONFIG_DIRECTORY)
+        self.hidden_paths = [os.path.abspath(path) for path in hidden_paths]
+        self.isolate = isolate
+        self._semaphore = None
+        self._prefix = None
+
+    def _limit(self):
+        """Runs in the child between forking and executing the job."""
+        os.setsid()
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds))
+        resource.setrlimit(resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (self.file_bytes, self.file_bytes))
+        if self.isolate:
+            # This counts every process the sandbox user has, and root is not
+            # held to it, so it only starts to apply once we switch users.
+            resource.setrlimit(
+                resource.RLIMIT_NPROC, (self.max_processes, self.max_processes)
+            )
+
+    def _ids(self) -> typing.Tuple[int, int]:
+        """Gets the user and group IDs of the sandbox user."""
+        try:
+            if isinstance(self.user, int):
+                entry = pwd.getpwuid(self.user)
+            else:
+                entry = pwd.getpwnam(self.user)
+        except KeyError:
+            raise IsolationError(f"There is no user {self.user!r}.") from None
+        if entry.pw_uid == 0:
+            raise IsolationError("Jobs cannot be run as root.")
+        return entry.pw_uid, entry.pw_gid
+
+    def check_isolation(self) -> typing.List[str]:
+        """
+        Checks we can run jobs in isolation, by running one that does nothing.
+        This is only done properly the first time it is called, and blocks
+        until the job is done.
+
+        :return: what to run each job's command with.
+        :raises IsolationError: if jobs cannot be isolated.
+        """
+        if self._prefix is not None:
+            return self._prefix
+        elif not self.isolate:
+            self._prefix = []
+            return self._prefix
+
+        uid, gid = self._ids()
+        unshare, setpriv = shutil.which("unshare"), shutil.which("setpriv")
+        if not unshare or not setpriv:
+            raise IsolationError("Both unshare and setpriv must be installed.")
+
+        prefix = [
+            unshare,
+            *("--mount", "--pid", "--net", "--ipc", "--uts"),
+            *("--fork", "--kill-child", "--mount-proc"),
+            "--",
+            shutil.which("sh") or "/bin/sh",
+            "-c",
+            _SETUP,
+            "sandbox",
+            str(uid),
+            str(gid),
+        ]
+
+        directory = self._prepare({})
+        try:
+            process = subprocess.run(
+                [*prefix, directory, *self.hidden_paths, "--", "true"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=10,
+            )
+        except subprocess.TimeoutExpired:
+            raise IsolationError("Setting up a job took too long.") from None
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        if process.returncode != 0:
+            reason = process.stdout.decode("utf-8", "replace").strip()
+            raise IsolationError(f"Could not set up a job: {reason}")
+
+        self._prefix = prefix
+        return self._prefix
+
+    def _prepare(self, files: typing.Dict[str, str]) -> str:
+        directory = tempfile.mkdtemp(prefix="neko2-sandbox-")
+        paths = [directory]
+        for name, content in files.items():
+            path = os.path.normpath(os.path.join(directory, name))
+            # Don't let anyone write outside the job directory.
+            if os.path.dirname(path) != directory:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise ValueError(f"Invalid file name {name!r}.")
+            with open(path, "w") as fp:
+                fp.write(content)
+            paths.append(path)
+
+        if self.isolate:
+            uid, gid = self._ids()
+            for path in paths:
+                os.chown(path, uid, gid)
+        return directory
+
+    @staticmethod
+    def _kill(process):
+        """
+        Kills the job. When isolated, this kills ``unshare``, which takes the
+        job's PID namespace, and so everything the job started, with it.
+        """
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def _read(self, process, output: bytearray, on_output) -> bool:
+        """
+        Reads output into the given buffer until the job closes it, or until
+        we have enough, in which case the job is killed.
+
+        :return: true if output was cut short.
+        """
+        while True:
+            chunk = await process.stdout.read(4096)
+            if not chunk:
+                return False
+
+            truncated = len(output) + len(chunk) > self.max_output
+            if truncated:
+                chunk = chunk[: self.max_output - len(output)]
+            output += chunk
+
+            wanted = True
+            if on_output is not None:
+                wanted = await on_output(chunk) is not False
+
+            if truncated or not wanted:
+                self._kill(process)
+                return True
+
+    async def _spawn(self, argv: typing.List[str], directory: str, stdin):
+        """
+        Starts the given command in the job directory, within our limits.
+
+        :raises IsolationError: if jobs cannot be isolated.
+        """
+        if self._prefix is None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.check_isolation)
+
+        if self.isolate:
+            argv = [*self._prefix, directory, *self.hidden_paths, "--", *argv]
+            home = "/tmp"
+        else:
+            home = directory
+
+        return await asyncio.create_subprocess_exec(
+            *argv,
+            cwd=directory,
+            env={
+                "PATH": os.environ.get("PATH", os.defpath),
+                "HOME": home,
+                "LANG": "C.UTF-8",
+            },
+            stdin=stdin,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            preexec_fn=self._limit,
+        )
+
+    async def _collect(self, process, on_output, start: float) -> SandboxResult:
+        """Reads the output of a job until it finishes or we give up on it."""
+        output, timed_out, truncated = bytearray(), False, False
+        try:
+            truncated = await asyncio.wait_for(
+                self._read(process, output, on_output), self.timeout
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            self._kill(process)
+        except asyncio.CancelledError:
+            self._kill(process)
+            raise
+        finally:
+            # Give it a moment to exit after closing its output.
+            try:
+                returncode = await asyncio.wait_for(process.wait(), 1)
+            except asyncio.TimeoutError:
+                self._kill(process)
+                returncode = await process.wait()
+            # Kill anything it left running in the background.
+            self._kill(process)
+
+        return SandboxResult(
+            output=output.decode("utf-8", "replace"),
+            returncode=None if timed_out else returncode,
+            timed_out=timed_out,
+            truncated=truncated,
+            duration=time.perf_counter() - start,
+        )
+
+    def _acquire(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def run(
+        self, script: str, files: typing.Dict[str, str] = None, *, on_output=None
+    ) -> SandboxResult:
+        """
+        Runs the given bash script in a new directory holding the given files.
+
+        :param script: the bash script to run.
+        :param files: maps each file name to its content.
+        :param on_output: an optional coroutine function that is awaited with
+            each chunk of output as it arrives. If it returns False, the job
+            is stopped as if it had printed too much.
+        :raises ValueError: if a file name would escape the job directory.
+        :raises IsolationError: if jobs cannot be isolated.
+        """
+        loop = asyncio.get_event_loop()
+
+        async with self._acquire():
+            directory = await loop.run_in_executor(None, self._prepare, files or {})
+            start = time.perf_counter()
+            try:
+                process = await self._spawn(
+                    [shutil.which("bash") or "/bin/bash", "-c", script],
+                    directory,
+                    asyncio.subprocess.DEVNULL,
+                )
+                return await self._collect(process, on_output, start)
+            finally:
+                await loop.run_in_executor(None, shutil.rmtree, directory, True)
+
+
+class _Worker:
+    __slots__ = ("process", "directory")
+
+    def __init__(self, process, directory):
+        self.process = process
+        self.directory = directory
+
+
+class WarmPool(scribe.Scribe):
+    """
+    Keeps a few copies of a program started ahead of time in a sandbox, each
+    waiting for a job on its standard input. This hides the cost of starting
+    the program, such as an interpreter importing things, from whoever is
+    waiting on the job.
+
+    Each worker only ever runs a single job, so nothing one job does can
+    leak into the next. As soon as a worker is taken, another is started to
+    replace it.
+
+    Worker processes are started with the limits of the given sandbox, and
+    jobs count towards its limit on how many jobs can run at once. Note that
+    CPU time spent starting up counts against the worker's CPU limit.
+
+    :param box: the sandbox to run workers in.
+    :param argv: the command that starts a worker.
+    :param files: maps the name of each file to put in a worker's directory
+        to its content. Workers cannot see the bot's own files, so this is
+        how to give them a script to run.
+    :param size: how many idle workers to keep.
+    """
+
+    def __init__(
+        self,
+        box: Sandbox,
+        argv: typing.List[str],
+        *,
+        files: typing.Dict[str, str] = None,
+        size: int = 2,
+    ):
+        self.sandbox = box
+        self.argv = list(argv)
+        self.files = dict(files or {})
+        self.size = size
+        self._ready: typing.Optional[asyncio.Queue] = None
+        self._starting = 0
+        self._closed = False
+
+    def _fill(self):
+        """Starts as many workers as we need to have ``size`` waiting."""
+        if self._ready is None:
+            self._ready = asyncio.Queue()
+
+        loop = asyncio.get_event_loop()
+        while not self._closed and self._ready.qsize() + self._starting < self.size:
+            self._starting += 1
+            loop.create_task(self._start_worker())
+
+    async def _start_worker(self):
+        loop = asyncio.get_event_loop()
+        try:
+            directory = await loop.run_in_executor(
+                None, self.sandbox._prepare, self.files
+            )
+            try:
+                process = await self.sandbox._spawn(
+                    self.argv, directory, asyncio.subprocess.PIPE
+                )
+            except BaseException:
+                await loop.run_in_executor(None, shutil.rmtree, directory, True)
+                raise
+        except Exception as ex:
+            self.logger.error(f"Could not start a worker: {ex}")
+            # Stop anyone waiting forever.
+            self._ready.put_nowait(ex)
+            return
+        finally:
+            self._starting -= 1
+
+        worker = _Worker(process, directory)
+        if self._closed:
+            await self._discard(worker)
+        else:
+            self._ready.put_nowait(worker)
+
+    async def _discard(self, worker: _Worker):
+        self.sandbox._kill(worker.process)
+        await worker.process.wait()
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, shutil.rmtree, worker.directory, True)
+
+    async def _take(self) -> _Worker:
+        while True:
+            self._fill()
+            worker = await self._ready.get()
+            # Replace the worker we just took straight away.
+            self._fill()
+
+            if isinstance(worker, Exception):
+                raise worker
+            elif worker.process.returncode is None:
+                return worker
+            # It died while waiting, so try the next one.
+            await self._discard(worker)
+
+    async def run(self, data: bytes, *, on_output=None) -> SandboxResult:
+        """
+        Gives a worker the job, and collects what it outputs.
+
+        :param data: what to write to the worker's standard input. This is
+            closed afterwards, so the worker knows it has the whole job.
+        :param on_output: see ``Sandbox.run``.
+        """
+        if self._closed:
+            raise RuntimeError("This pool has been closed.")
+
+        async with self.sandbox._acquire():
+            worker = await self._take()
+            start = time.perf_counter()
+            try:
+                try:
+                    worker.process.stdin.write(data)
+                    await worker.process.stdin.drain()
+                    worker.process.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    # It stopped reading, but may have said why.
+                    pass
+                return await self.sandbox._collect(worker.process, on_output, start)
+            finally:
+                await self._discard(worker)
+
+    async def close(self):
+        """Stops every idle worker. The pool cannot be used after this."""
+        self._closed = True
+        while self._ready is not None and not self._ready.empty():
+            worker = self._ready.get_nowait()
+            if isinstance(worker, _Worker):
+                await self._discard(worker)
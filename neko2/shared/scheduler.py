@@ -0,0 +1,282 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Schedules blocking work onto threads in separate lanes.
+
+Rather than every blocking call sharing one first-come-first-served thread
+pool, work is submitted to a lane:
+
+- ``io``: calls that spend most of their time waiting on something else,
+    such as third party API clients. Plenty of threads, and a deep queue.
+- ``cpu``: calls that actually keep a core busy, such as rendering plots.
+    About one thread per core, so we don't just thrash the scheduler.
+- ``interactive``: quick calls a user is sat waiting on, such as fuzzy
+    searching or unit conversion. These get their own threads, so they never
+    wait behind a slow upstream in the ``io`` lane.
+
+Each lane runs at most a fixed number of jobs at once. Waiting jobs are
+queued per user, and users take turns, so one person spamming a slow command
+only delays themselves. If a lane's queue is full, or a user has too much
+queued already, new work is rejected straight away with a
+``SchedulerOverloadedError`` rather than piling up indefinitely.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio  # Futures.
+import collections  # Queues.
+import concurrent.futures  # Executors.
+import os  # Core counts.
+import threading  # Locking.
+import time  # Queue wait timing.
+import typing  # Type checking.
+
+from neko2.shared import errors, metrics, scribe
+
+__all__ = (
+    "IO",
+    "CPU",
+    "INTERACTIVE",
+    "SchedulerOverloadedError",
+    "Lane",
+    "Scheduler",
+)
+
+IO = "io"
+CPU = "cpu"
+INTERACTIVE = "interactive"
+
+metrics.registry.describe(
+    "scheduler_queue_depth", "Jobs waiting for a thread in each scheduler lane."
+)
+metrics.registry.describe(
+    "scheduler_running", "Jobs currently running in each scheduler lane."
+)
+metrics.registry.describe(
+    "scheduler_rejections_total", "Jobs rejected because a lane was overloaded."
+)
+
+
+class SchedulerOverloadedError(errors.CommandExecutionError):
+    """Raised when a job is submitted to a lane that is already too busy."""
+
+    def __init__(self, lane: str):
+        super().__init__(
+            "I am a little overwhelmed at the moment. Please try again in a "
+            "few seconds!"
+        )
+        self.lane = lane
+
+
+class _Job:
+    __slots__ = ("future", "call", "submitted_at")
+
+    def __init__(self, future, call, submitted_at):
+        self.future = future
+        self.call = call
+        self.submitted_at = submitted_at
+
+
+class Lane(scribe.Scribe):
+    """
+    A pool of threads that runs at most ``concurrency`` jobs at once, taking
+    waiting jobs from each user in turn.
+
+    :param name: the name of the lane, used for metrics.
+    :param concurrency: how many jobs can run at once.
+    :param max_queued: how many jobs can wait in total before new ones are
+        rejected.
+    :param max_queued_per_user: how many jobs a single user can have waiting
+        before any more of theirs are rejected.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        *,
+        max_queued: int = 256,
+        max_queued_per_user: int = 8,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            concurrency, thread_name_prefix=f"neko2-{name}"
+        )
+        self._lock = threading.Lock()
+        # Each user with something waiting, in the order they will next be
+        # served, mapped to their waiting jobs.
+        self._queues: typing.Dict[
+            typing.Any, typing.Deque[_Job]
+        ] = collections.OrderedDict()
+        self.queued = 0
+        self.running = 0
+
+    def submit(self, call: typing.Callable, user=None) -> concurrent.futures.Future:
+        """
+        Queues the given call to run on this lane.
+
+        :param call: the callable to run with no arguments.
+        :param user: who the work is for. Jobs with no user share one queue.
+        :raises SchedulerOverloadedError: if the lane is too busy.
+        """
+        future = concurrent.futures.Future()
+        job = _Job(future, call, time.perf_counter())
+
+        with self._lock:
+            queue = self._queues.get(user)
+            if self.queued >= self.max_queued or (
+                user is not None
+                and queue is not None
+                and len(queue) >= self.max_queued_per_user
+            ):
+                metrics.registry.inc("scheduler_rejections_total", lane=self.name)
+                raise SchedulerOverloadedError(self.name)
+
+            if queue is None:
+                queue = self._queues[user] = collections.deque()
+            queue.append(job)
+            self.queued += 1
+            self._dispatch()
+
+        return future
+
+    def _next_job(self) -> typing.Optional[_Job]:
+        """Takes the next job from the user whose turn it is. Needs the lock."""
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                # Back of the line for the next one.
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self.queued -= 1
+
+            # Skip anything that was cancelled while it was waiting.
+            if job.future.set_running_or_notify_cancel():
+                return job
+        return None
+
+    def _dispatch(self):
+        """Starts jobs while there are free slots. Needs the lock."""
+        while self.running < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                break
+            self.running += 1
+            self._executor.submit(self._run, job)
+        self._update_gauges()
+
+    def _run(self, job: _Job):
+        started_at = time.perf_counter()
+        metrics.registry.observe(
+            "executor_queue_wait_seconds",
+            started_at - job.submitted_at,
+            pool=self.name,
+        )
+        try:
+            result = job.call()
+        except BaseException as ex:
+            job.future.set_exception(ex)
+        else:
+            job.future.set_result(result)
+        finally:
+            metrics.registry.observe(
+                "executor_run_seconds", time.perf_counter() - started_at, pool=self.name
+            )
+            with self._lock:
+                self.running -= 1
+                self._dispatch()
+
+    def _update_gauges(self):
+        metrics.registry.set("scheduler_queue_depth", self.queued, lane=self.name)
+        metrics.registry.set("scheduler_running", self.running, lane=self.name)
+
+    def shutdown(self, wait=True):
+        """Cancels anything still waiting, and stops the threads."""
+        with self._lock:
+            for queue in self._queues.values():
+                for job in queue:
+                    job.future.cancel()
+            self._queues.clear()
+            self.queued = 0
+            self._update_gauges()
+        self._executor.shutdown(wait=wait)
+
+
+class Scheduler(scribe.Scribe):
+    """
+    Holds each lane, and hands work to the right one.
+
+    :param lanes: the lanes to use. Defaults to an ``io``, ``cpu`` and
+        ``interactive`` lane sized for this machine.
+    """
+
+    def __init__(self, lanes: typing.Iterable[Lane] = None):
+        if lanes is None:
+            lanes = self.default_lanes()
+        self.lanes = {lane.name: lane for lane in lanes}
+
+    @staticmethod
+    def default_lanes() -> typing.List[Lane]:
+        cores = len(os.sched_getaffinity(0)) or 1
+        return [
+            Lane(IO, 3 * cores, max_queued=256),
+            Lane(CPU, cores, max_queued=64),
+            Lane(INTERACTIVE, 2 * cores, max_queued=64, max_queued_per_user=4),
+        ]
+
+    async def run(
+        self,
+        call: typing.Callable,
+        *,
+        lane: str = IO,
+        user=None,
+        loop: asyncio.AbstractEventLoop = None,
+    ):
+        """
+        Runs the given call on a lane and waits for the result. Cancelling
+        this cancels the job if it has not started yet.
+
+        :param call: the callable to run with no arguments.
+        :param lane: the name of the lane to run on.
+        :param user: who the work is for. If unspecified, this is the author
+            of the command being invoked in the current task, if there is one.
+        :raises KeyError: if there is no such lane.
+        :raises SchedulerOverloadedError: if the lane is too busy.
+        """
+        if user is None:
+            user = scribe.get_context().get("author")
+
+        future = self.lanes[lane].submit(call, user)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def shutdown(self, wait=True):
+        for lane in self.lanes.values():
+            lane.shutdown(wait=wait)
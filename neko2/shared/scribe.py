@@ -1,7 +1,17 @@
 #!/usr/bin/env python3.6
 # -*- coding: utf-8
 """
-Loggable class.
+Loggable class, and the logging pipeline everything logs through.
+
+``configure`` replaces ``logging.basicConfig``. Records are put on a queue by
+whichever thread logs them, and a background thread does the formatting and
+the actual writing, so logging never blocks the event loop on a slow stream.
+Each logger is also rate limited, so a noisy logger cannot flood the queue
+under load. Anything at WARNING or above is never dropped.
+
+When a command is being invoked, records logged from that task carry the
+command, guild, channel and author. With ``json=True``, each record is
+written as a single line of JSON including these fields.
 
 ===
 
@@ -28,9 +38,218 @@ LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
 OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
 WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
+import asyncio  # Current task.
+import json as _json  # Structured records.
 import logging  # Logging (duh!)
+import logging.handlers  # Queue handler and listener.
+import queue  # Log record queue.
+import sys  # Standard error.
+import threading  # Locking.
+import time  # Rate limiting.
+import weakref  # Task-local context.
+
+__all__ = (
+    "JSON_FLAG",
+    "Scribe",
+    "configure",
+    "shutdown",
+    "set_context",
+    "get_context",
+    "JsonFormatter",
+    "RateLimitFilter",
+)
+
+# The command line flag that switches to JSON log lines.
+JSON_FLAG = "--log-json"
+
+# Logging context for each task. Python 3.6 has no contextvars, so this is
+# keyed by the task instead, and dropped when the task is.
+_task_context: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# The listener thread, if configure() has been called.
+_listener = None
+
+
+def _current_task():
+    try:
+        if hasattr(asyncio, "current_task"):
+            return asyncio.current_task()
+        return asyncio.Task.current_task()
+    except RuntimeError:
+        # No loop running on this thread.
+        return None
+
+
+def set_context(**fields):
+    """
+    Attaches the given fields to every record logged from the current task
+    from now on. Passing None for a field removes it.
+    """
+    task = _current_task()
+    if task is None:
+        return
+
+    context = _task_context.setdefault(task, {})
+    for key, value in fields.items():
+        if value is None:
+            context.pop(key, None)
+        else:
+            context[key] = value
+
+
+def get_context() -> dict:
+    """Gets the fields attached to records logged from the current task."""
+    task = _current_task()
+    return dict(_task_context.get(task, {})) if task is not None else {}
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the task context onto each record as it is logged."""
+
+    def filter(self, record):
+        record.context = get_context()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Allows each logger to log ``rate`` records per second on average, with
+    bursts of up to ``burst`` records. Anything over that is dropped, and the
+    next record that gets through says how many were dropped. Records at
+    WARNING or above are always let through.
+    """
+
+    def __init__(self, rate=50.0, burst=200):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        # Logger name to [tokens, last refill, records dropped].
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [self.burst, now, 0]
+
+            tokens, last, dropped = bucket
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+            if tokens < 1:
+                bucket[:] = [tokens, now, dropped + 1]
+                return False
+
+            bucket[:] = [tokens - 1, now, 0]
+
+        if dropped:
+            record.dropped = dropped
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Does the least possible work on the logging thread. The message is
+    merged with its arguments (as they may change after this returns), but
+    formatting is left to the listener thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            text += " [" + " ".join(f"{k}={v}" for k, v in context.items()) + "]"
+        dropped = getattr(record, "dropped", 0)
+        if dropped:
+            text += f" ({dropped} earlier records were dropped by the rate limit)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single line of JSON."""
+
+    def format(self, record):
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+
+        dropped = getattr(record, "dropped", 0)
+        if dropped:
+            data["dropped"] = dropped
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+
+        return _json.dumps(data, default=str)
+
+
+def configure(level="INFO", *, json=False, rate=50.0, burst=200, stream=None):
+    """
+    Sets up logging for the process, replacing any existing root handlers.
+
+    :param level: the root logger level.
+    :param json: true to write JSON lines rather than plain text.
+    :param rate: how many records per second each logger may log on average
+        before records below WARNING are dropped. None disables this.
+    :param burst: how many records each logger may log at once.
+    :param stream: where to write to. Defaults to standard error.
+    """
+    global _listener
+
+    shutdown()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(
+        JsonFormatter()
+        if json
+        else _TextFormatter("%(levelname)s:%(name)s:%(message)s")
+    )
+
+    log_queue = queue.Queue(-1)
+    handler = _QueueHandler(log_queue)
+    # Rate limit first, so that we do not bother with anything we drop.
+    if rate is not None:
+        handler.addFilter(RateLimitFilter(rate, burst))
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, output, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def shutdown():
+    """Writes out anything still queued and stops the listener thread."""
+    global _listener
 
-__all__ = ("Scribe",)
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 class Scribe:
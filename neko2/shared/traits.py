@@ -36,8 +36,9 @@ import typing
 import aiofiles
 import aiohttp
 import async_timeout
+import discord
 
-from neko2.shared import scribe  # Scribe
+from neko2.shared import assets, circuitbreaker, metrics, scheduler, scribe  # Scribe
 
 __all__ = ("CogTraits",)
 
@@ -65,10 +66,16 @@ def _magic_number(*, cpu_bound=False):
         return 3 * (len(os.sched_getaffinity(0)) or 1)
 
 
+def _trace_configs():
+    """Trace configs to give every HTTP session we make."""
+    return [metrics.http_trace_config(), circuitbreaker.trace_config()]
+
+
 class CogTraits(scribe.Scribe):
     """Contains any shared resource traits we may want to acquire."""
 
     __io_pool: concurrent.futures.Executor = None
+    __scheduler: scheduler.Scheduler = None
     __http_pool: aiohttp.ClientSession = None
     __loop: asyncio.AbstractEventLoop = None
 
@@ -76,17 +83,26 @@ class CogTraits(scribe.Scribe):
     async def _alloc(cls, loop):
         cls.__loop = loop
         cls.logger.info("Initialising IO pool.")
+        # File IO through aiofiles is only ever small reads and writes, so it
+        # gets its own pool rather than queueing behind scheduled work.
         cls.__io_pool = concurrent.futures.ThreadPoolExecutor(
             _magic_number(cpu_bound=False)
         )
+        cls.logger.info("Initialising scheduler.")
+        cls.__scheduler = scheduler.Scheduler()
         cls.logger.info("Initialising HTTP session.")
-        cls.__http_pool = aiohttp.ClientSession(loop=loop)
+        cls.__http_pool = aiohttp.ClientSession(
+            loop=loop, trace_configs=_trace_configs()
+        )
 
     @classmethod
     async def _dealloc(cls):
         if cls.__http_pool:
             await cls.__http_pool.close()
             cls.__http_pool = None
+        if cls.__scheduler:
+            with async_timeout.timeout(30):
+                cls.__scheduler.shutdown(wait=True)
         if cls.__io_pool:
             with async_timeout.timeout(30):
                 cls.__io_pool.shutdown(wait=True)
@@ -106,7 +122,18 @@ class CogTraits(scribe.Scribe):
         avoid leaving connections open.
         """
         loop = cls.__loop if not loop else loop
-        return aiohttp.ClientSession(loop=loop)
+        return aiohttp.ClientSession(
+            loop=loop, trace_configs=_trace_configs()
+        )
+
+    @staticmethod
+    def circuit(host: str) -> circuitbreaker.CircuitBreaker:
+        """
+        Gets the circuit breaker for the given host. Requests made through
+        the sessions above are already protected, so this is only needed for
+        third party clients that do their own IO, such as in an executor.
+        """
+        return circuitbreaker.get(host)
 
     @classmethod
     def file(cls, file_name, *args, **kwargs):
@@ -115,6 +142,25 @@ class CogTraits(scribe.Scribe):
 
         return functools.partial(aiofiles.open, file_name, *args, **kwargs)()
 
+    @classmethod
+    async def read_asset(cls, path) -> bytes:
+        """
+        Reads a file that will not change while we are running, and keeps
+        it in memory for next time.
+        """
+        return await assets.cache.read(path, loop=cls.__loop, executor=cls.__io_pool)
+
+    @classmethod
+    async def asset_file(cls, path, filename=None) -> discord.File:
+        """
+        Makes a ``discord.File`` to upload from a file that will not change
+        while we are running, keeping it in memory for next time if it is
+        small enough.
+        """
+        return await assets.cache.discord_file(
+            path, filename, loop=cls.__loop, executor=cls.__io_pool
+        )
+
     @classmethod
     async def run_in_io_executor(
         cls,
@@ -122,7 +168,20 @@ class CogTraits(scribe.Scribe):
         args: typing.List = None,
         kwargs: typing.Dict = None,
         loop=None,
+        *,
+        lane: str = scheduler.IO,
+        user=None,
     ):
+        """
+        Runs the given blocking call on a thread without blocking the loop.
+
+        :param lane: ``scheduler.IO`` for work that mostly waits on something
+            else, ``scheduler.CPU`` for work that keeps a core busy, or
+            ``scheduler.INTERACTIVE`` for quick work someone is waiting on.
+        :param user: who the work is for, so that users take turns. Defaults
+            to the author of the command being invoked.
+        :raises scheduler.SchedulerOverloadedError: if the lane is too busy.
+        """
         if not loop:
             loop = cls.__loop
 
@@ -131,6 +190,11 @@ class CogTraits(scribe.Scribe):
         if not kwargs:
             kwargs = {}
 
-        return await loop.run_in_executor(
-            cls.__io_pool, functools.partial(call, *args, **kwargs)
+        return await cls.__scheduler.run(
+            functools.partial(call, *args, **kwargs), lane=lane, user=user, loop=loop
         )
+
+    @classmethod
+    def lanes(cls) -> typing.Dict[str, scheduler.Lane]:
+        """Gets each lane of the scheduler, by name."""
+        return dict(cls.__scheduler.lanes) if cls.__scheduler else {}
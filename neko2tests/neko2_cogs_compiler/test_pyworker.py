@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests snippets run properly in warm Python workers.
+
+The worker is run from its path rather than imported, as it has to work
+without anything from neko2.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+from neko2.shared import sandbox
+
+WORKER = os.path.join(
+    os.path.dirname(__file__),
+    *"../../neko2/cogs/compiler/toolchains/coliru/pyworker.py".split("/"),
+)
+
+
+class TestPyWorker(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pool = sandbox.WarmPool(
+            sandbox.Sandbox(isolate=False),
+            [sys.executable, "-I", "-u", os.path.abspath(WORKER), "math"],
+            size=1,
+        )
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.pool.close())
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_job(self, mode, source):
+        data = f"{mode}\n{source}".encode()
+        return self.loop.run_until_complete(self.pool.run(data))
+
+    def test_script(self):
+        result = self.run_job("script", "import math\nprint(math.factorial(5))\n")
+        self.assertEqual(result.output, "120\n")
+        self.assertEqual(result.returncode, 0)
+
+    def test_script_traceback_only_shows_their_code(self):
+        result = self.run_job("script", "x = 1\n1 / 0\n")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('File "main.py", line 2', result.output)
+        self.assertIn("ZeroDivisionError", result.output)
+        self.assertNotIn("pyworker", result.output)
+
+    def test_repl_echoes_expressions(self):
+        result = self.run_job("repl", "x = 6\nx * 7\nNone\n")
+        self.assertEqual(result.output, "#00002 42\n")
+        self.assertEqual(result.returncode, 0)
+
+    def test_state_is_not_shared_between_jobs(self):
+        self.run_job("script", "import math\nmath.leaked = True\n")
+        result = self.run_job("script", "import math\nprint(hasattr(math, 'leaked'))\n")
+        self.assertEqual(result.output, "False\n")
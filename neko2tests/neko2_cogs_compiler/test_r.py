@@ -0,0 +1,202 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests polling rdrr.io for R jobs.
+
+The worker is run from its path rather than imported, as it has to work
+without anything from neko2.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import importlib.util
+import os
+import time
+import unittest
+
+R = os.path.join(
+    os.path.dirname(__file__), *"../../neko2/cogs/compiler/toolchains/r.py".split("/")
+)
+
+# The compiler package needs the booklet library to import, so load this
+# module on its own.
+_spec = importlib.util.spec_from_file_location("compiler_r", R)
+r = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(r)
+
+PENDING = {"state": "running", "result": "pending"}
+COMPLETE = {"state": "complete", "result": "success"}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    async def __aenter__(self):
+        if self.body is None:
+            # The request hangs.
+            await asyncio.sleep(3600)
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    def raise_for_status(self):
+        if isinstance(self.body, Exception):
+            raise self.body
+
+    async def json(self):
+        return self.body
+
+
+class FakeSession:
+    """
+    Answers each poll for a job with the next body in its script, repeating
+    the last one forever. A body of None hangs.
+    """
+
+    def __init__(self, **scripts):
+        self.scripts = scripts
+        self.polls = {identifier: [] for identifier in scripts}
+
+    def request(self, method, url):
+        identifier = url[len(f"{r.HOST}{r.RETRIEVE_EP}") :]
+        polls = self.polls[identifier]
+        polls.append(time.monotonic())
+        script = self.scripts[identifier]
+        return FakeResponse(script[min(len(polls), len(script)) - 1])
+
+
+class TestJobTracker(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.tracker = r.JobTracker(
+            min_interval=0.01, max_interval=0.08, request_timeout=0.05
+        )
+
+    def tearDown(self):
+        poller = self.tracker._poller
+        if poller is not None:
+            poller.cancel()
+            self.loop.run_until_complete(asyncio.wait([poller]))
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_test(self, coro):
+        return self.loop.run_until_complete(asyncio.wait_for(coro, 5))
+
+    def test_result(self):
+        session = FakeSession(a=[PENDING, PENDING, COMPLETE])
+
+        async def test():
+            return await self.tracker.submit(session, "a", timeout=5)
+
+        self.assertEqual(self.run_test(test()), COMPLETE)
+        self.assertEqual(len(session.polls["a"]), 3)
+        self.assertEqual(len(self.tracker), 0)
+
+    def test_backs_off_until_something_changes(self):
+        session = FakeSession(a=[PENDING], b=[COMPLETE])
+
+        async def test():
+            a = self.tracker.submit(session, "a", timeout=5)
+            while len(session.polls["a"]) < 6:
+                await asyncio.sleep(0.01)
+            self.assertEqual(self.tracker._interval, self.tracker.max_interval)
+
+            self.assertEqual(await self.tracker.submit(session, "b"), COMPLETE)
+            self.assertEqual(self.tracker._interval, self.tracker.min_interval)
+            a.cancel()
+
+        self.run_test(test())
+        polls = session.polls["a"]
+        gaps = [after - before for before, after in zip(polls, polls[1:5])]
+        for gap, interval in zip(gaps, [0.02, 0.04, 0.08, 0.08]):
+            self.assertGreaterEqual(gap, interval * 0.9)
+            self.assertLess(gap, interval + 0.05)
+
+    def test_error(self):
+        session = FakeSession(a=[PENDING, ValueError("bad gateway")])
+
+        async def test():
+            return await self.tracker.submit(session, "a", timeout=5)
+
+        with self.assertRaises(ValueError):
+            self.run_test(test())
+
+    def test_deadline(self):
+        session = FakeSession(a=[PENDING])
+
+        async def test():
+            started = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.tracker.submit(session, "a", timeout=0.2)
+            return time.monotonic() - started
+
+        self.assertLess(self.run_test(test()), 0.4)
+        self.assertEqual(len(self.tracker), 0)
+
+    def test_deadline_while_request_hangs(self):
+        session = FakeSession(a=[None])
+
+        async def test():
+            started = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.tracker.submit(session, "a", timeout=0.2)
+            return time.monotonic() - started
+
+        self.assertLess(self.run_test(test()), 0.4)
+
+    def test_hung_request_does_not_hold_up_other_jobs(self):
+        session = FakeSession(a=[None], b=[PENDING, COMPLETE])
+
+        async def test():
+            a = self.tracker.submit(session, "a", timeout=5)
+            started = time.monotonic()
+            self.assertEqual(await self.tracker.submit(session, "b"), COMPLETE)
+            a.cancel()
+            return time.monotonic() - started
+
+        self.assertLess(self.run_test(test()), 1)
+
+    def test_cancel(self):
+        session = FakeSession(a=[PENDING])
+
+        async def test():
+            job = self.tracker.submit(session, "a", timeout=5)
+            while not session.polls["a"]:
+                await asyncio.sleep(0.01)
+            job.cancel()
+            await asyncio.sleep(0)
+            self.assertEqual(len(self.tracker), 0)
+
+            polls = len(session.polls["a"])
+            await asyncio.sleep(0.2)
+            self.assertEqual(len(session.polls["a"]), polls)
+            self.assertTrue(self.tracker._poller.done())
+
+        self.run_test(test())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests rerunning compiler commands when they are edited.
+
+The worker is run from its path rather than imported, as it has to work
+without anything from neko2.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import importlib.util
+import os
+import types
+import unittest
+from unittest import mock
+
+from neko2.shared import commands
+
+TOOLS = os.path.join(
+    os.path.dirname(__file__), *"../../neko2/cogs/compiler/tools.py".split("/")
+)
+
+# The compiler package needs the booklet library to import, so load this
+# module on its own.
+_spec = importlib.util.spec_from_file_location("compiler_tools", TOOLS)
+tools = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(tools)
+
+
+class FakeBot:
+    def __init__(self, loop, reinvoke):
+        self.loop = loop
+        self.edits = asyncio.Queue()
+        self.dispatch = mock.MagicMock()
+        self.reinvoke = reinvoke
+
+    async def wait_for(self, event, *, check, timeout):
+        async def next_matching():
+            while True:
+                before, after = await self.edits.get()
+                if check(before, after):
+                    return before, after
+
+        return await asyncio.wait_for(next_matching(), timeout)
+
+    async def get_context(self, message):
+        return make_ctx(self, message)
+
+    def edit(self, content):
+        self.edits.put_nowait((None, types.SimpleNamespace(id=1, content=content)))
+
+
+def make_ctx(bot, message):
+    command = types.SimpleNamespace(qualified_names=["cc"], reinvoke=bot.reinvoke)
+    return types.SimpleNamespace(bot=bot, message=message, prefix="!", command=command)
+
+
+class TestEditRerunner(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.deleted = []
+
+        async def try_delete(message):
+            self.deleted.append(message)
+
+        patcher = mock.patch.object(tools.commands, "try_delete", try_delete)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_rerunner(self, reinvoke, scenario):
+        bot = FakeBot(self.loop, reinvoke)
+        message = types.SimpleNamespace(id=1, content="!cc a")
+        rerunner = tools.EditRerunner(make_ctx(bot, message), debounce=0.01)
+        tools._rerunners[message.id] = rerunner
+
+        async def test():
+            listening = asyncio.ensure_future(rerunner.listen())
+            try:
+                await asyncio.wait_for(scenario(bot), 5)
+            finally:
+                for task in (listening, rerunner._running):
+                    if task is not None:
+                        task.cancel()
+                        await asyncio.wait([task])
+
+        self.loop.run_until_complete(test())
+        return bot
+
+    def test_rerun_errors_go_to_the_error_handler(self):
+        error = ValueError("broken")
+
+        async def reinvoke(ctx):
+            raise error
+
+        async def scenario(bot):
+            bot.edit("!cc b")
+            while not bot.dispatch.called:
+                await asyncio.sleep(0.01)
+
+        bot = self.run_rerunner(reinvoke, scenario)
+        event, ctx, ex = bot.dispatch.call_args[0]
+        self.assertEqual(event, "command_error")
+        self.assertEqual(ctx.message.content, "!cc b")
+        self.assertIsInstance(ex, commands.CommandInvokeError)
+        self.assertIs(ex.original, error)
+
+    def test_cancelled_rerun_is_not_reported(self):
+        started = []
+
+        async def reinvoke(ctx):
+            started.append(ctx)
+            await asyncio.sleep(10)
+
+        async def scenario(bot):
+            bot.edit("!cc b")
+            while not started:
+                await asyncio.sleep(0.01)
+            bot.edit("!cc c")
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+
+        bot = self.run_rerunner(reinvoke, scenario)
+        bot.dispatch.assert_not_called()
+
+    def test_cancelled_rerun_responses_are_deleted(self):
+        sent = []
+
+        async def reinvoke(ctx):
+            root_resp = asyncio.Future()
+            root_resp.set_result(f"booklet for {ctx.message.content}")
+            booklet = types.SimpleNamespace(root_resp=root_resp)
+            sent.append(booklet)
+            tools.remember_responses(ctx, booklet)
+            # Still sending images when the next edit comes in.
+            await asyncio.sleep(10)
+
+        async def scenario(bot):
+            bot.edit("!cc b")
+            while not sent:
+                await asyncio.sleep(0.01)
+            bot.edit("!cc c")
+            while len(sent) < 2:
+                await asyncio.sleep(0.01)
+
+        self.run_rerunner(reinvoke, scenario)
+        self.assertEqual(self.deleted, ["booklet for !cc b"])
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, *, content):
+        self.content = content
+
+    async def delete(self):
+        self.channel.remove(self)
+
+
+class TestOutputPreview(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.channel = []
+
+        async def send(content):
+            # Give other tasks a chance to run, as sending takes a while.
+            await asyncio.sleep(0)
+            message = FakeMessage(self.channel, content)
+            self.channel.append(message)
+            return message
+
+        self.ctx = types.SimpleNamespace(send=send)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_shows_output(self):
+        preview = tools.OutputPreview(self.ctx, delay=0, interval=0)
+
+        async def test():
+            await preview.update("first")
+            await preview.update("first\nsecond")
+            self.assertEqual(len(self.channel), 1)
+            self.assertIn("first\nsecond", self.channel[0].content)
+            await preview.close()
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.channel, [])
+
+    def test_cancelled_command_leaves_nothing_behind(self):
+        streamed = []
+
+        async def job(on_output):
+            output = ""
+            for i in range(20):
+                output += f"line {i}\n"
+                streamed.append(i)
+                await on_output(output)
+                await asyncio.sleep(0.01)
+
+        async def command(shared):
+            preview = tools.OutputPreview(self.ctx, delay=0, interval=0)
+            try:
+                # Jobs are shared between commands, so are shielded.
+                await asyncio.shield(shared(preview.update))
+            finally:
+                await preview.close()
+
+        async def scenario():
+            job_task = None
+
+            def start(on_output):
+                nonlocal job_task
+                job_task = asyncio.ensure_future(job(on_output))
+                return job_task
+
+            running = asyncio.ensure_future(command(start))
+            while len(streamed) < 5:
+                await asyncio.sleep(0.01)
+            self.assertEqual(len(self.channel), 1)
+
+            # Someone edits the message, so the command is cancelled, but the
+            # job carries on for anyone else waiting on it.
+            running.cancel()
+            await asyncio.wait([running])
+            await job_task
+            self.assertEqual(len(streamed), 20)
+
+        self.loop.run_until_complete(asyncio.wait_for(scenario(), 5))
+        self.assertEqual(self.channel, [])
+
+    def test_closed_while_sending(self):
+        preview = tools.OutputPreview(self.ctx, delay=0, interval=0)
+
+        async def test():
+            sending = asyncio.ensure_future(preview.update("first"))
+            await asyncio.sleep(0)
+            await preview.close()
+            await sending
+
+        self.loop.run_until_complete(test())
+        self.assertEqual(self.channel, [])
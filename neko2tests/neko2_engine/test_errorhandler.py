@@ -0,0 +1,206 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests errors are fingerprinted and aggregated into digests properly.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from discord.ext.commands import errors as dpyext_errors
+
+from neko2.engine import errorhandler
+
+
+def _raise(error):
+    raise error
+
+
+def _catch(error):
+    try:
+        _raise(error)
+    except BaseException as ex:
+        return ex
+
+
+def _catch_elsewhere(error):
+    try:
+        raise error
+    except BaseException as ex:
+        return ex
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_same_place_same_fingerprint(self):
+        a = _catch(ValueError("a"))
+        b = _catch(ValueError("a different message"))
+        self.assertEqual(errorhandler.fingerprint(a), errorhandler.fingerprint(b))
+
+    def test_different_type_or_place(self):
+        a = _catch(ValueError())
+        self.assertNotEqual(
+            errorhandler.fingerprint(a), errorhandler.fingerprint(_catch(KeyError()))
+        )
+        self.assertNotEqual(
+            errorhandler.fingerprint(a),
+            errorhandler.fingerprint(_catch_elsewhere(ValueError())),
+        )
+
+
+class TestErrorAggregator(unittest.TestCase):
+    def test_one_report_per_window(self):
+        aggregator = errorhandler.ErrorAggregator(window=60)
+
+        fp, first = aggregator.record(_catch(OSError("down")), command="foo", now=0)
+        self.assertTrue(first)
+        for i in range(1, 5):
+            _, first = aggregator.record(_catch(OSError("down")), command="bar", now=i)
+            self.assertFalse(first)
+
+        digest = aggregator.close_window(fp, now=60)
+        self.assertEqual(digest.count, 5)
+        self.assertEqual(digest.commands, [("bar", 4), ("foo", 1)])
+        self.assertEqual(digest.error_type, "OSError")
+        self.assertEqual(digest.example, "down")
+
+        # The next one opens a new window.
+        _, first = aggregator.record(_catch(OSError("down")), now=61)
+        self.assertTrue(first)
+
+    def test_close_without_window(self):
+        aggregator = errorhandler.ErrorAggregator()
+        self.assertIsNone(aggregator.close_window("nope"))
+
+    def test_stats_by_command(self):
+        aggregator = errorhandler.ErrorAggregator()
+        for _ in range(3):
+            aggregator.record(_catch(ValueError()), command="foo")
+        aggregator.record(_catch(KeyError()), command="foo")
+        aggregator.record(_catch(KeyError()), command="bar")
+        aggregator.record(_catch(KeyError()), command="bar")
+
+        def types(command):
+            return [s.error_type for s in aggregator.stats(command)]
+
+        self.assertEqual(types("foo"), ["ValueError", "KeyError"])
+        self.assertEqual(types("bar"), ["KeyError"])
+        self.assertEqual([s.total for s in aggregator.stats()], [3, 3])
+        self.assertEqual(aggregator.stats("baz"), [])
+
+    def test_forgets_least_recently_seen(self):
+        aggregator = errorhandler.ErrorAggregator(max_fingerprints=2)
+        aggregator.record(_catch(ValueError()))
+        aggregator.record(_catch(KeyError()))
+        aggregator.record(_catch(ValueError()))
+        aggregator.record(_catch(OSError()))
+        self.assertEqual(
+            {s.error_type for s in aggregator.stats()}, {"ValueError", "OSError"}
+        )
+
+
+class TestErrorHandler(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bot = mock.Mock(debug=False, loop=self.loop, owner_id=1)
+        self.owner = mock.Mock(send=mock.AsyncMock())
+        self.bot.get_user.return_value = self.owner
+        self.handler = errorhandler.ErrorHandler(True, self.bot)
+        self.handler.aggregator.window = 0
+
+        patcher = mock.patch.object(errorhandler, "_dm_me_error", mock.AsyncMock())
+        self.dm = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(errorhandler, "_react_for_a_little_while")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        # Replies wait a while before deleting themselves.
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def handle(self, error):
+        ctx = mock.Mock(send=mock.AsyncMock())
+        ctx.command.qualified_name = "foo"
+        ctx.message.delete = mock.AsyncMock()
+        self.loop.run_until_complete(
+            self.handler.handle_error(bot=self.bot, ctx=ctx, error=error)
+        )
+        # Let any digest be sent.
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def test_expected_errors_are_not_reported(self):
+        for _ in range(3):
+            self.handle(_catch(dpyext_errors.BadArgument("nope")))
+            self.handle(_catch(dpyext_errors.CommandNotFound("nope")))
+        self.assertEqual(self.handler.aggregator.stats(), [])
+        self.dm.assert_not_called()
+        self.owner.send.assert_not_called()
+
+    def test_unexpected_errors_are_reported_once_then_digested(self):
+        error = _catch(OSError("down"))
+        self.handler.aggregator.window = 0.1
+        for _ in range(3):
+            self.handle(error)
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.assertEqual(self.dm.call_count, 1)
+        self.assertEqual(self.owner.send.call_count, 1)
+
+    def test_nothing_is_reported_in_debug(self):
+        self.bot.debug = True
+        for _ in range(3):
+            self.handle(_catch(OSError("down")))
+        self.dm.assert_not_called()
+        self.owner.send.assert_not_called()
+
+    def test_unexpected_errors_are_counted_without_dms(self):
+        for debug, should_dm in ((True, True), (False, False)):
+            with self.subTest(debug=debug, should_dm=should_dm):
+                self.bot.debug = debug
+                self.handler = errorhandler.ErrorHandler(should_dm, self.bot)
+                for _ in range(3):
+                    self.handle(_catch(OSError("down")))
+                self.handle(_catch(dpyext_errors.BadArgument("nope")))
+
+                stats = self.handler.aggregator.stats()
+                self.assertEqual([s.total for s in stats], [3])
+                self.assertEqual(stats[0].commands["foo"], 3)
+                self.assertIsNone(stats[0].window_started)
+                self.dm.assert_not_called()
+
+    def test_no_digest_if_debug_is_turned_on(self):
+        self.handler.aggregator.window = 0.1
+        for _ in range(3):
+            self.handle(_catch(OSError("down")))
+        self.bot.debug = True
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        self.owner.send.assert_not_called()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the supervisor restarts workers as expected, using fake workers in
+place of the bot, and tests the real worker against a stubbed gateway.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+
+import discord
+
+from neko2.engine import supervisor
+
+
+def _serve(spec, conn):
+    """Behaves like a healthy worker until terminated."""
+    # The bot engine turns SIGTERM into an exception, which we do not want here.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    conn.send((supervisor.READY, {"pid": os.getpid()}))
+    while True:
+        conn.send((supervisor.HEARTBEAT, {"pid": os.getpid()}))
+        time.sleep(spec.heartbeat_interval)
+
+
+def healthy_worker(spec, conn):
+    _serve(spec, conn)
+
+
+def crash_once_worker(spec, conn):
+    if spec.generation == 0:
+        raise SystemExit(1)
+    _serve(spec, conn)
+
+
+def stuck_once_worker(spec, conn):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if spec.generation == 0:
+        conn.send((supervisor.HEARTBEAT, {}))
+        # Simulates a blocked event loop.
+        time.sleep(60)
+    _serve(spec, conn)
+
+
+def slow_stop_worker(spec, conn):
+    """Takes a while to shut down gracefully, without saying it is stopping."""
+
+    def on_term(*_):
+        time.sleep(1)
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, on_term)
+    conn.send((supervisor.READY, {"pid": os.getpid()}))
+    while True:
+        conn.send((supervisor.HEARTBEAT, {"pid": os.getpid()}))
+        time.sleep(spec.heartbeat_interval)
+
+
+def stubbed_gateway_worker(spec, conn):
+    """
+    Runs the real worker, with no modules to load, and with the connection to
+    Discord replaced with one that becomes ready straight away. This writes
+    what the bot was told to connect as to ``connected.json`` in the config
+    directory.
+    """
+    from neko2.engine import autoloader
+
+    config_directory = spec.args[1]
+    autoloader.modules = []
+
+    async def login(self, token, **_):
+        pass
+
+    async def connect(self, **_):
+        with open(os.path.join(config_directory, "connected.json"), "w") as fp:
+            json.dump(
+                {
+                    "class": type(self).__name__,
+                    "shard_ids": list(self.shard_ids),
+                    "shard_count": self.shard_count,
+                },
+                fp,
+            )
+        self.dispatch("ready")
+        # Stay connected until we are stopped.
+        while True:
+            await asyncio.sleep(1)
+
+    discord.Client.login = login
+    discord.AutoShardedClient.connect = connect
+    supervisor.run_bot_worker(spec, conn)
+
+
+class TestSplitShards(unittest.TestCase):
+    def test_even_split(self):
+        self.assertEqual(
+            supervisor.split_shards(4, 2), [[0, 1], [2, 3]]
+        )
+
+    def test_uneven_split(self):
+        self.assertEqual(
+            supervisor.split_shards(5, 3), [[0, 1], [2, 3], [4]]
+        )
+
+    def test_too_few_shards(self):
+        with self.assertRaises(ValueError):
+            supervisor.split_shards(1, 2)
+
+    def test_flags(self):
+        sup = supervisor.Supervisor.from_argv(["neko2", "cfg", "--workers=2", "--shards=6"])
+        self.assertEqual([w.spec.shard_ids for w in sup.workers], [[0, 1, 2], [3, 4, 5]])
+        self.assertEqual({w.spec.shard_count for w in sup.workers}, {6})
+
+
+class TestSupervisor(unittest.TestCase):
+    def make(self, target, worker_count=2, **kwargs):
+        kwargs = {
+            "heartbeat_timeout": 1,
+            "startup_timeout": 10,
+            "stop_timeout": 5,
+            "backoff": 0.1,
+            **kwargs,
+        }
+        sup = supervisor.Supervisor(worker_count, target=target, **kwargs)
+        self.addCleanup(sup.wait_for_exit)
+        self.addCleanup(sup.stop)
+        return sup
+
+    @staticmethod
+    def poll_until(sup, predicate, timeout=20):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            sup.poll(0.05)
+            if predicate():
+                return True
+        return False
+
+    def test_workers_become_ready(self):
+        sup = self.make(healthy_worker)
+        self.assertTrue(self.poll_until(sup, lambda: all(w.ready for w in sup.workers)))
+        self.assertEqual(len({s["pid"] for s in sup.status()}), 2)
+
+    def test_crashed_worker_is_restarted(self):
+        sup = self.make(crash_once_worker, worker_count=1)
+        worker = sup.workers[0]
+        self.assertTrue(self.poll_until(sup, lambda: worker.ready))
+        self.assertEqual(worker.spec.generation, 1)
+        self.assertEqual(worker.failures, 1)
+
+    def test_stuck_worker_is_restarted(self):
+        sup = self.make(stuck_once_worker, worker_count=1)
+        worker = sup.workers[0]
+        self.assertTrue(self.poll_until(sup, lambda: worker.ready))
+        self.assertEqual(worker.spec.generation, 1)
+
+    def test_rolling_restart(self):
+        sup = self.make(healthy_worker)
+        self.assertTrue(self.poll_until(sup, lambda: all(w.ready for w in sup.workers)))
+        sup.restart_all()
+        self.assertTrue(
+            self.poll_until(
+                sup,
+                lambda: not sup._rolling_restart
+                and all(w.ready and w.spec.generation == 1 for w in sup.workers),
+            )
+        )
+        # Planned restarts are not crashes.
+        self.assertEqual([w.failures for w in sup.workers], [0, 0])
+
+    def test_rolling_restart_waits_for_slow_stop(self):
+        sup = self.make(slow_stop_worker, heartbeat_timeout=4)
+        self.assertTrue(self.poll_until(sup, lambda: all(w.ready for w in sup.workers)))
+        sup.restart_all()
+
+        most_down = 0
+
+        def done():
+            nonlocal most_down
+            down = sum(1 for w in sup.workers if not w.ready or w.kill_at is not None)
+            most_down = max(most_down, down)
+            return not sup._rolling_restart and all(
+                w.ready and w.spec.generation == 1 for w in sup.workers
+            )
+
+        self.assertTrue(self.poll_until(sup, done))
+        # Only one worker was ever out of action at once.
+        self.assertEqual(most_down, 1)
+
+    def test_stop(self):
+        sup = self.make(healthy_worker)
+        self.assertTrue(self.poll_until(sup, lambda: all(w.ready for w in sup.workers)))
+        sup.stop()
+        sup.wait_for_exit()
+        self.assertFalse(any(w.alive for w in sup.workers))
+
+
+@unittest.skipIf(
+    discord.version_info.major >= 2,
+    "The bot is written for the rewrite branch of discord.py.",
+)
+class TestBotWorker(unittest.TestCase):
+    def setUp(self):
+        self.config_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.config_directory)
+        with open(os.path.join(self.config_directory, "discord.json"), "w") as fp:
+            json.dump(
+                {
+                    "auth": {"token": "not-a-token"},
+                    "bot": {"command_prefix": "n."},
+                    "loop_lag_threshold": 0,
+                },
+                fp,
+            )
+
+    def receive(self, conn, timeout=60):
+        if not conn.poll(timeout):
+            self.fail("The worker stopped talking to us.")
+        kind, payload = conn.recv()
+        self.assertIn("pid", payload)
+        return kind
+
+    def test_reports_health_and_runs_its_shards(self):
+        args = ["neko2", self.config_directory]
+        spec = supervisor.WorkerSpec(1, [2, 3], 4, args, heartbeat_interval=0.1)
+        context = multiprocessing.get_context("spawn")
+        ours, theirs = context.Pipe()
+        process = context.Process(target=stubbed_gateway_worker, args=(spec, theirs))
+        process.start()
+        self.addCleanup(process.join)
+        self.addCleanup(process.kill)
+        theirs.close()
+
+        kinds = []
+        while supervisor.READY not in kinds or kinds.count(supervisor.HEARTBEAT) < 2:
+            kinds.append(self.receive(ours))
+
+        with open(os.path.join(self.config_directory, "connected.json")) as fp:
+            connected = json.load(fp)
+        self.assertEqual(connected["class"], "AutoShardedBot")
+        self.assertEqual(connected["shard_ids"], [2, 3])
+        self.assertEqual(connected["shard_count"], 4)
+
+        # It says it is stopping on the way out.
+        process.terminate()
+        try:
+            while True:
+                kinds.append(self.receive(ours))
+        except EOFError:
+            pass
+        process.join(30)
+        self.assertEqual(kinds[-1], supervisor.STOPPING)
+        self.assertEqual(process.exitcode, 0)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the loop watchdog catches blocking code and works out where it is.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import time
+import unittest
+
+from neko2.engine import watchdog
+
+# Pretend to be a cog module, so the watchdog attributes the block to it.
+_cog_globals = {"__name__": "neko2.cogs.pretend", "time": time}
+exec(
+    "class PretendCog:\n"
+    "    async def slow(self, ctx):\n"
+    "        time.sleep(0.6)\n",
+    _cog_globals,
+)
+
+
+class _Command:
+    qualified_name = "pretend slow"
+
+
+class _Context:
+    command = _Command()
+
+
+class TestLoopWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_with_watchdog(self, coro_factory):
+        wd = watchdog.LoopWatchdog(self.loop, threshold=0.2, interval=0.05)
+
+        async def body():
+            wd.start()
+            try:
+                await asyncio.sleep(0.1)
+                await coro_factory()
+                # Give the heartbeat a chance to notice we recovered.
+                await asyncio.sleep(0.2)
+            finally:
+                wd.stop()
+
+        self.loop.run_until_complete(body())
+        return wd
+
+    def test_block_is_attributed(self):
+        wd = self.run_with_watchdog(
+            lambda: _cog_globals["PretendCog"]().slow(_Context())
+        )
+        self.assertEqual(len(wd.reports), 1)
+        report = wd.reports[0]
+        self.assertEqual(report.cog, "PretendCog")
+        self.assertEqual(report.module, "neko2.cogs.pretend")
+        self.assertEqual(report.command, "pretend slow")
+        self.assertGreaterEqual(report.duration, 0.4)
+        self.assertIn(", in slow", report.stack)
+
+    def test_no_reports_when_not_blocked(self):
+        wd = self.run_with_watchdog(lambda: asyncio.sleep(0.3))
+        self.assertEqual(len(wd.reports), 0)
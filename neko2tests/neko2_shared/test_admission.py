@@ -0,0 +1,140 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests admission control charges users and guilds for the commands they run.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import types
+import unittest
+
+from neko2.shared import admission
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refills_up_to_capacity(self):
+        bucket = admission.TokenBucket(rate=2, capacity=4, now=0)
+        bucket.take(4)
+        self.assertAlmostEqual(bucket.wait_time(1, now=0), 0.5)
+        self.assertEqual(bucket.wait_time(1, now=0.5), 0)
+        self.assertEqual(bucket.wait_time(4, now=100), 0)
+        self.assertEqual(bucket.tokens, 4)
+
+    def test_cost_above_capacity_waits_for_full(self):
+        bucket = admission.TokenBucket(rate=1, capacity=3, now=0)
+        self.assertEqual(bucket.wait_time(10, now=0), 0)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.controller = admission.AdmissionController(
+            user_rate=1, user_burst=5, guild_rate=1, guild_burst=8
+        )
+
+    def test_user_limit(self):
+        self.controller.admit(1, 100, 5, now=0)
+        with self.assertRaises(admission.AdmissionRejected) as ctx:
+            self.controller.admit(1, 100, 5, now=0)
+        self.assertEqual(ctx.exception.scope, "user")
+        self.assertAlmostEqual(ctx.exception.retry_after, 5)
+
+        # Someone else in the same guild is fine.
+        self.controller.admit(2, 100, 1, now=0)
+
+    def test_guild_limit(self):
+        for user in range(8):
+            self.controller.admit(user, 100, 1, now=0)
+        with self.assertRaises(admission.AdmissionRejected) as ctx:
+            self.controller.admit(9, 100, 1, now=0)
+        self.assertEqual(ctx.exception.scope, "guild")
+        # A different guild, or a DM, is unaffected.
+        self.controller.admit(9, 200, 1, now=0)
+        self.controller.admit(9, None, 1, now=0)
+
+    def test_rejection_takes_nothing(self):
+        for user in range(7):
+            self.controller.admit(user, 100, 1, now=0)
+        with self.assertRaises(admission.AdmissionRejected):
+            self.controller.admit(10, 100, 3, now=0)
+        # The user was not charged for the rejected command.
+        self.controller.admit(10, 200, 5, now=0)
+
+    def test_forgets_least_recently_used(self):
+        controller = admission.AdmissionController(user_burst=1, max_buckets=2)
+        controller.admit(1, None, 1, now=0)
+        controller.admit(2, None, 1, now=0)
+        controller.admit(3, None, 1, now=0)
+        # User 1 was forgotten, so gets a fresh bucket.
+        controller.admit(1, None, 1, now=0)
+
+
+def make_ctx(command, author=1, owner=0):
+    return types.SimpleNamespace(
+        author=types.SimpleNamespace(id=author),
+        guild=None,
+        bot=types.SimpleNamespace(owner_id=owner),
+        command=command,
+        invoked_subcommand=None,
+    )
+
+
+class TestCheck(unittest.TestCase):
+    def setUp(self):
+        self.controller = admission.AdmissionController(user_rate=0.001, user_burst=5)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def check(self, ctx):
+        return self.loop.run_until_complete(self.controller.check(ctx))
+
+    def test_charges_once_per_invocation(self):
+        help_command = types.SimpleNamespace(cost=1)
+        ctx = make_ctx(help_command)
+        self.check(ctx)
+
+        # The help command checking whether an expensive command can run
+        # does not cost anything.
+        ctx.command = types.SimpleNamespace(cost=5)
+        for _ in range(10):
+            self.check(ctx)
+
+        self.assertAlmostEqual(self.controller._users[1].tokens, 4, places=1)
+
+    def test_subcommand_pays_the_difference(self):
+        group, sub = types.SimpleNamespace(cost=2), types.SimpleNamespace(cost=3)
+        ctx = make_ctx(group)
+        self.check(ctx)
+        ctx.command = ctx.invoked_subcommand = sub
+        self.check(ctx)
+        self.assertAlmostEqual(self.controller._users[1].tokens, 2, places=1)
+
+    def test_owner_is_exempt(self):
+        for _ in range(10):
+            self.check(make_ctx(types.SimpleNamespace(cost=5), author=0))
+        self.assertNotIn(0, self.controller._users)
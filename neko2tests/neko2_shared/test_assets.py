@@ -0,0 +1,119 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests assets are cached in memory, and that reads that miss are batched.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import concurrent.futures
+import os
+import tempfile
+import unittest
+
+from neko2.shared import assets
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(1)
+        self.jobs = 0
+
+    def submit(self, *args, **kwargs):
+        self.jobs += 1
+        return super().submit(*args, **kwargs)
+
+
+class TestAssetCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.loop = asyncio.new_event_loop()
+        self.executor = CountingExecutor()
+        self.cache = assets.AssetCache(max_bytes=100, max_file_bytes=50)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.loop.close()
+        self.dir.cleanup()
+
+    def make(self, name, data):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "wb") as fp:
+            fp.write(data)
+        return path
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def read(self, path):
+        return self.cache.read(path, loop=self.loop, executor=self.executor)
+
+    def test_misses_are_batched(self):
+        paths = [self.make(f"{i}.txt", str(i).encode()) for i in range(5)]
+
+        async def read_all():
+            return await asyncio.gather(*(self.read(p) for p in paths + paths))
+
+        results = self.run_async(read_all())
+        self.assertEqual(results, [str(i).encode() for i in range(5)] * 2)
+        self.assertEqual(self.executor.jobs, 1)
+
+        # Everything is cached now.
+        self.run_async(read_all())
+        self.assertEqual(self.executor.jobs, 1)
+
+    def test_large_files_are_not_cached(self):
+        path = self.make("big.bin", b"x" * 60)
+        self.assertEqual(self.run_async(self.read(path)), b"x" * 60)
+        self.assertIsNone(self.cache.get_cached(path))
+
+        file = self.run_async(
+            self.cache.discord_file(path, loop=self.loop, executor=self.executor)
+        )
+        self.assertEqual(file.filename, "big.bin")
+        file.close()
+
+    def test_eviction(self):
+        first = self.make("first", b"a" * 40)
+        self.cache.read_sync(first)
+        for name in ("second", "third"):
+            self.cache.read_sync(self.make(name, b"b" * 40))
+        self.assertIsNone(self.cache.get_cached(first))
+        self.assertLessEqual(self.cache.size, 100)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            self.run_async(self.read(os.path.join(self.dir.name, "nope")))
+
+    def test_discord_file_from_cache(self):
+        path = self.make("small.png", b"png")
+        file = self.run_async(
+            self.cache.discord_file(
+                path, "x.png", loop=self.loop, executor=self.executor
+            )
+        )
+        self.assertEqual(file.filename, "x.png")
+        self.assertEqual(file.fp.read(), b"png")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests circuit breakers open, half-open and close when they should.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import time
+import unittest
+
+from neko2.shared import circuitbreaker
+
+
+class Boom(Exception):
+    pass
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        try:
+            with breaker.guard():
+                raise Boom
+        except Boom:
+            pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = circuitbreaker.CircuitBreaker(
+            "example.com", failure_threshold=3, reset_timeout=10, max_reset_timeout=25
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        fail(self.breaker, 2)
+        self.assertEqual(self.breaker.state, circuitbreaker.CLOSED)
+        fail(self.breaker)
+        self.assertEqual(self.breaker.state, circuitbreaker.OPEN)
+
+        with self.assertRaises(circuitbreaker.CircuitOpenError):
+            with self.breaker.guard():
+                self.fail("The body should not run while open.")
+
+    def test_success_resets_failures(self):
+        fail(self.breaker, 2)
+        with self.breaker.guard():
+            pass
+        fail(self.breaker, 2)
+        self.assertEqual(self.breaker.state, circuitbreaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        fail(self.breaker, 3)
+        # Pretend the reset timeout has passed.
+        self.breaker.opened_until = 0
+        self.assertEqual(self.breaker.state, circuitbreaker.HALF_OPEN)
+
+        self.breaker.before_call()
+        with self.assertRaises(circuitbreaker.CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, circuitbreaker.CLOSED)
+
+    def test_failed_probe_backs_off(self):
+        fail(self.breaker, 3)
+
+        for expected in (20, 25, 25):
+            # Let a probe through, and have it fail.
+            self.breaker.opened_until = 0
+            fail(self.breaker)
+            self.assertEqual(self.breaker.state, circuitbreaker.OPEN)
+            retry_in = self.breaker.opened_until - time.monotonic()
+            self.assertAlmostEqual(retry_in, expected, delta=1)
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = circuitbreaker.CircuitBreaker("slow.com", failure_threshold=1)
+        breaker.record_success(breaker.slow_call + 1)
+        self.assertEqual(breaker.state, circuitbreaker.OPEN)
+
+    def test_is_failure_and_cancellation(self):
+        for _ in range(5):
+            try:
+                with self.breaker.guard(lambda ex: not isinstance(ex, KeyError)):
+                    raise KeyError
+            except KeyError:
+                pass
+            try:
+                with self.breaker.guard():
+                    raise asyncio.CancelledError
+            except asyncio.CancelledError:
+                pass
+        self.assertEqual(self.breaker.failures, 0)
+        self.assertEqual(self.breaker.state, circuitbreaker.CLOSED)
+
+    def test_registry_is_keyed_by_host(self):
+        self.assertIs(circuitbreaker.get("a.test"), circuitbreaker.get("a.test"))
+        self.assertIsNot(circuitbreaker.get("a.test"), circuitbreaker.get("b.test"))
+        self.assertIn(circuitbreaker.get("a.test"), circuitbreaker.breakers())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests code blocks are found the same way the old regex found them.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import re
+import time
+import unittest
+from unittest import mock
+
+from neko2.shared import codeblocks
+
+# What was used before.
+old_re = re.compile(r"```([a-zA-Z0-9]+)\s([\s\S(^\\`{3})]*?)\s*```")
+
+
+class TestScan(unittest.TestCase):
+    cases = [
+        "",
+        "no code here",
+        "```py\nprint(1)\n```",
+        "n.cc ```cpp\nint main() {}\n\n\n```  trailing",
+        "```\nno language\n``` then ```c int x;```",
+        "```py print(1)",
+        "```py\nunclosed",
+        "``py\nnot a fence``",
+        "```c++\nfoo\n```",
+        "```py\n```",
+        "```py\n\n```",
+        "````py\nfour\n````",
+        "```py\r\nwindows\r\n```",
+        "text ```a\tb``` ```py\nsecond\n```",
+    ]
+
+    def test_matches_old_regex(self):
+        for case in self.cases:
+            with self.subTest(case=case):
+                old = old_re.search(case)
+                new = codeblocks.scan(case)
+                if old is None:
+                    self.assertIsNone(new)
+                else:
+                    self.assertEqual(new, old.groups())
+
+    def test_huge_unclosed_message(self):
+        text = "```py\n" + "x " * 500_000
+        start = time.perf_counter()
+        self.assertIsNone(codeblocks.scan(text))
+        self.assertLess(time.perf_counter() - start, 1)
+
+
+class TestFind(unittest.TestCase):
+    def test_remembers_per_edit(self):
+        message = mock.Mock(id=1234, edited_at=None)
+        text = "```py\nprint(1)\n```"
+        with mock.patch.object(codeblocks, "scan", wraps=codeblocks.scan) as scan:
+            first = codeblocks.find(text, message)
+            self.assertEqual(codeblocks.find(text, message), first)
+            self.assertEqual(scan.call_count, 1)
+
+            message.edited_at = 1
+            codeblocks.find(text, message)
+            self.assertEqual(scan.call_count, 2)
+
+    def test_remembers_no_block(self):
+        message = mock.Mock(id=5678, edited_at=None)
+        with mock.patch.object(codeblocks, "scan", wraps=codeblocks.scan) as scan:
+            self.assertIsNone(codeblocks.find("nothing", message))
+            self.assertIsNone(codeblocks.find("nothing", message))
+            self.assertEqual(scan.call_count, 1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the TTL cache forgets entries when it should.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import time
+import unittest
+
+from neko2.shared import collections
+
+
+class TestTtlCache(unittest.TestCase):
+    def test_get_and_set(self):
+        cache = collections.TtlCache(60)
+        cache["a"] = 1
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIn("a", cache)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertNotIn("a", cache)
+
+    def test_expiry(self):
+        cache = collections.TtlCache(0.01)
+        cache["a"] = 1
+        time.sleep(0.02)
+        self.assertNotIn("a", cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_forgets_least_recently_used(self):
+        cache = collections.TtlCache(60, max_size=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        # Touch a so that b is the oldest.
+        cache.get("a")
+        cache["c"] = 3
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_falsy_values(self):
+        cache = collections.TtlCache(60)
+        cache["empty"] = ""
+        self.assertIn("empty", cache)
+        self.assertEqual(cache.get("empty", None), "")
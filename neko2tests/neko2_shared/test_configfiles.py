@@ -0,0 +1,143 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests config files are cached, read again when they change, and are
+deserialised safely.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import os
+import tempfile
+import time
+import unittest
+
+from neko2.shared import configfiles
+
+
+class TestConfigFileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "test.json")
+        self.write('{"numbers": [1, 2]}')
+
+    def write(self, content):
+        with open(self.path, "w") as fp:
+            fp.write(content)
+        # Make sure the modification time differs even on coarse file systems.
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_extension_is_guessed(self):
+        cf = configfiles.ConfigFile(self.path[: -len(".json")])
+        self.assertEqual(cf.path, self.path)
+        self.assertEqual(cf.sync_get(), {"numbers": [1, 2]})
+
+    def test_cached_until_changed(self):
+        cf = configfiles.ConfigFile(self.path)
+        self.assertFalse(cf.is_cached)
+        first = cf.sync_get()
+        self.assertTrue(cf.is_cached)
+
+        # Callers get their own copy to modify.
+        first["numbers"].append(3)
+        self.assertEqual(cf.sync_get(), {"numbers": [1, 2]})
+
+        self.write('{"numbers": []}')
+        self.assertEqual(cf.sync_get(), {"numbers": []})
+
+    def test_invalidate(self):
+        cf = configfiles.ConfigFile(self.path)
+        cf.sync_get()
+        cf.invalidate()
+        self.assertFalse(cf.is_cached)
+
+    def test_watcher_notices_changes(self):
+        cf = configfiles.ConfigFile(self.path)
+        cf.sync_get()
+        configfiles.watch(interval=0.05)
+        self.addCleanup(configfiles.stop_watching)
+
+        self.write('{"numbers": [4]}')
+        deadline = time.monotonic() + 5
+        while cf.is_cached and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertEqual(cf.sync_get(), {"numbers": [4]})
+
+
+class TestDeserialisation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as fp:
+            fp.write(content)
+        return configfiles.ConfigFile(path)
+
+    def test_python_literal(self):
+        cf = self.make("literal.py", "{'a': [1, 2.5, None], 'b': 'c'}")
+        self.assertEqual(cf.sync_get(), {"a": [1, 2.5, None], "b": "c"})
+
+    def test_python_code_is_not_executed(self):
+        cf = self.make("code.py", "__import__('os').getcwd()")
+        with self.assertRaises(ValueError):
+            cf.sync_get()
+
+    def test_yaml_is_loaded_safely(self):
+        cf = self.make("unsafe.yaml", "!!python/object/apply:os.getcwd []")
+        with self.assertRaises(Exception) as ctx:
+            cf.sync_get()
+        self.assertIn("constructor", type(ctx.exception).__name__.lower())
+
+    def test_compiled_cache_is_used(self):
+        cf = self.make("compiled.yaml", "foo: [1, 2, 3]\nbar: baz\n")
+        self.assertEqual(cf.sync_get(), {"foo": [1, 2, 3], "bar": "baz"})
+        self.assertTrue(os.path.isfile(configfiles._compiled_path(cf.path)))
+
+        # Pretend we are a new process that has not parsed the file yet.
+        cf.invalidate()
+
+        def fail(_):
+            raise AssertionError("The compiled cache should have been used")
+
+        cf.deserializer = fail
+        self.assertEqual(cf.sync_get(), {"foo": [1, 2, 3], "bar": "baz"})
+
+    def test_stale_compiled_cache_is_ignored(self):
+        cf = self.make("stale.json", '{"version": 1}')
+        cf.sync_get()
+        cf.invalidate()
+
+        with open(cf.path, "w") as fp:
+            fp.write('{"version": 22}')
+        stat = os.stat(cf.path)
+        os.utime(cf.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.assertEqual(cf.sync_get(), {"version": 22})
+
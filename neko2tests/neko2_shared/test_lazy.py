@@ -0,0 +1,73 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests lazily imported modules only get imported when used.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import sys
+import unittest
+
+from neko2.shared import lazy
+
+
+class TestLazyImport(unittest.TestCase):
+    def setUp(self):
+        # Something small from the standard library that nothing else here
+        # is likely to have imported already.
+        self.name = "colorsys"
+        sys.modules.pop(self.name, None)
+        lazy._registry.pop(self.name, None)
+
+    def test_not_imported_until_used(self):
+        """Tests making the stand-in does not import the module."""
+        module = lazy.lazy_import(self.name)
+        self.assertNotIn(self.name, sys.modules)
+        self.assertFalse(lazy.is_loaded(self.name))
+
+        self.assertEqual((0.0, 0.0, 1.0), module.rgb_to_hsv(1, 1, 1))
+        self.assertIn(self.name, sys.modules)
+        self.assertTrue(lazy.is_loaded(self.name))
+
+    def test_same_stand_in(self):
+        """Tests asking for the same module twice gives the same object."""
+        self.assertIs(lazy.lazy_import(self.name), lazy.lazy_import(self.name))
+
+    def test_warm_all(self):
+        """Tests warming imports anything not yet imported."""
+        lazy.lazy_import(self.name)
+        failures = lazy.warm_all()
+        self.assertIn(self.name, sys.modules)
+        self.assertNotIn(self.name, [name for name, _ in failures])
+
+    def test_warm_all_reports_failures(self):
+        """Tests modules that cannot be imported are reported, not raised."""
+        name = "neko2tests.this_module_does_not_exist"
+        lazy.lazy_import(name)
+        try:
+            self.assertIn(name, [name for name, _ in lazy.warm_all()])
+        finally:
+            lazy._registry.pop(name, None)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the metrics registry works out percentiles and renders them properly.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import unittest
+
+from neko2.shared import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = metrics.Histogram()
+        for i in range(1, 101):
+            histogram.observe(i)
+        self.assertEqual(histogram.percentiles(50, 95, 99), [50, 95, 99])
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.sum, 5050)
+
+    def test_empty(self):
+        self.assertIsNone(metrics.Histogram().percentile(50))
+
+    def test_window(self):
+        histogram = metrics.Histogram(window=10)
+        for i in range(100):
+            histogram.observe(i)
+        # Only the most recent samples count towards percentiles...
+        self.assertEqual(histogram.percentile(0), 90)
+        # ...but every sample counts towards the buckets.
+        self.assertEqual(histogram.cumulative_buckets()[-1], ("+Inf", 100))
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        registry = metrics.Registry()
+        registry.describe("jobs_total", "Jobs done.")
+        registry.inc("jobs_total", kind="a")
+        registry.inc("jobs_total", 2, kind="a")
+        registry.observe("job_seconds", 0.002, kind='say "hi"')
+
+        text = registry.render()
+        self.assertIn("# HELP jobs_total Jobs done.\n", text)
+        self.assertIn('jobs_total{kind="a"} 3\n', text)
+        self.assertIn('job_seconds_bucket{kind="say \\"hi\\"",le="0.001"} 0\n', text)
+        self.assertIn('job_seconds_bucket{kind="say \\"hi\\"",le="0.005"} 1\n', text)
+        self.assertIn('job_seconds_count{kind="say \\"hi\\""} 1\n', text)
+
+    def test_timer(self):
+        registry = metrics.Registry()
+        with registry.timer("block_seconds"):
+            pass
+        self.assertEqual(registry.histogram("block_seconds").count, 1)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests pragmas are found and blanked out of source code.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import unittest
+
+from neko2.shared import pragmas
+from neko2.shared.pragmas import Pragma
+
+
+class TestParse(unittest.TestCase):
+    def test_no_pragmas(self):
+        source = "int main(void) {}\n"
+        self.assertEqual(pragmas.parse(source), (Pragma.NONE, source))
+
+    def test_finds_every_pragma(self):
+        flags, source = pragmas.parse(
+            "#pragma neko math\nint main(void) {}\n  #pragma neko 32  \n"
+            "#pragma   neko asm"
+        )
+        self.assertEqual(flags, Pragma.MATH | Pragma.M32 | Pragma.ASM)
+        # Line numbers are kept.
+        self.assertEqual(source, "\nint main(void) {}\n\n")
+
+    def test_leaves_unsupported_pragmas(self):
+        flags, source = pragmas.parse(
+            "#pragma neko fs\n#pragma neko gcc\n#pragma neko nope\n", Pragma.GCC
+        )
+        self.assertEqual(flags, Pragma.GCC)
+        self.assertEqual(source, "#pragma neko fs\n\n#pragma neko nope\n")
+
+    def test_must_be_on_own_line(self):
+        source = 'puts("#pragma neko math");\n// #pragma neko 32\n'
+        self.assertEqual(pragmas.parse(source), (Pragma.NONE, source))
+
+    def test_windows_line_endings(self):
+        flags, source = pragmas.parse("#pragma neko pthread\r\nint x;\r\n")
+        self.assertEqual(flags, Pragma.PTHREAD)
+        self.assertEqual(source, "\nint x;\r\n")
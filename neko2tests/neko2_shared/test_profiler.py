@@ -0,0 +1,117 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the startup profiler records imports and sections, and parses its flag.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from neko2.shared import profiler
+
+
+class TestFlag(unittest.TestCase):
+    def setUp(self):
+        self.profiler = profiler.StartupProfiler()
+
+    def tearDown(self):
+        self.profiler.disable()
+
+    def test_no_flag(self):
+        self.assertFalse(self.profiler.enable_from_argv(["neko2", "config"]))
+        self.assertFalse(self.profiler.enabled)
+
+    def test_flag(self):
+        self.assertTrue(self.profiler.enable_from_argv(["neko2", profiler.FLAG]))
+        self.assertEqual(self.profiler.report_path, profiler.DEFAULT_REPORT_PATH)
+
+    def test_flag_with_path(self):
+        self.profiler.enable_from_argv(["neko2", profiler.FLAG + "=/tmp/x.json"])
+        self.assertEqual(self.profiler.report_path, "/tmp/x.json")
+
+    def test_flag_with_empty_path(self):
+        self.profiler.enable_from_argv(["neko2", profiler.FLAG + "="])
+        self.assertEqual(self.profiler.report_path, profiler.DEFAULT_REPORT_PATH)
+
+    def test_similar_flag_is_ignored(self):
+        self.assertFalse(self.profiler.enable_from_argv([profiler.FLAG + "s"]))
+
+
+class TestStartupProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = profiler.StartupProfiler()
+        self.profiler.enable()
+
+    def tearDown(self):
+        self.profiler.disable()
+
+    def test_disable(self):
+        """Tests disabling stops profiling and removes the import hook."""
+        self.profiler.disable()
+        self.assertFalse(self.profiler.enabled)
+        self.assertFalse(
+            any(isinstance(f, profiler._TimedImportFinder) for f in sys.meta_path)
+        )
+        self.assertIsNone(self.profiler.write_report("/nonexistent/report.json"))
+
+    def test_times_imports(self):
+        """Tests modules imported while enabled are recorded."""
+        # Something small from the standard library that nothing else here
+        # is likely to have imported already.
+        sys.modules.pop("colorsys", None)
+        import colorsys
+
+        report = self.profiler.report()
+        modules = [entry["module"] for entry in report["top_imports"]]
+        self.assertIn("colorsys", modules)
+        self.assertGreaterEqual(report["imported_module_count"], 1)
+
+    def test_nested_sections(self):
+        with self.profiler.section("outer"):
+            with self.profiler.section("inner", detail=1):
+                pass
+            self.profiler.record("recorded", 0.5)
+
+        outer = self.profiler.report()["sections"]["children"][0]
+        self.assertEqual(outer["name"], "outer")
+        self.assertEqual(
+            [child["name"] for child in outer["children"]], ["inner", "recorded"]
+        )
+        self.assertEqual(outer["children"][0]["detail"], 1)
+        self.assertGreaterEqual(outer["children"][1]["duration_ms"], 500)
+
+    def test_write_report(self):
+        self.profiler.mark("ready")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            self.assertEqual(self.profiler.write_report(path), path)
+            with open(path) as fp:
+                report = json.load(fp)
+        self.assertIn("ready", report["marks_ms"])
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the sandbox runs jobs, and stops them when they overstep their limits.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from neko2.shared import sandbox
+
+
+class TestSandbox(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_job(self, box, script, files=None):
+        return self.loop.run_until_complete(box.run(script, files))
+
+    def test_runs_script_with_files(self):
+        box = sandbox.Sandbox(isolate=False)
+        result = self.run_job(
+            box, "cat main.txt; echo err >&2; exit 3", {"main.txt": "hello\n"}
+        )
+        self.assertEqual(result.output, "hello\nerr\n")
+        self.assertEqual(result.returncode, 3)
+        self.assertFalse(result.timed_out)
+        self.assertFalse(result.truncated)
+
+    def test_timeout(self):
+        box = sandbox.Sandbox(timeout=0.5, isolate=False)
+        result = self.run_job(box, "echo started; sleep 30")
+        self.assertTrue(result.timed_out)
+        self.assertIsNone(result.returncode)
+        self.assertEqual(result.output, "started\n")
+        self.assertLess(result.duration, 5)
+
+    def test_output_cap(self):
+        box = sandbox.Sandbox(max_output=1000, isolate=False)
+        result = self.run_job(box, "yes")
+        self.assertTrue(result.truncated)
+        self.assertEqual(len(result.output), 1000)
+
+    def test_streams_output(self):
+        box = sandbox.Sandbox(isolate=False)
+        chunks = []
+
+        async def on_output(chunk):
+            chunks.append(chunk)
+            # Stop after the first line.
+            return False
+
+        result = self.loop.run_until_complete(
+            box.run("echo first; sleep 0.2; echo second", on_output=on_output)
+        )
+        self.assertEqual(chunks, [b"first\n"])
+        self.assertEqual(result.output, "first\n")
+        self.assertTrue(result.truncated)
+
+    def test_memory_limit(self):
+        box = sandbox.Sandbox(memory_bytes=64 * 1024 * 1024, isolate=False)
+        result = self.run_job(box, f"{sys.executable} -c 'bytearray(200000000)'")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("MemoryError", result.output)
+
+    def test_file_names_cannot_escape(self):
+        box = sandbox.Sandbox(isolate=False)
+        with self.assertRaises(ValueError):
+            self.run_job(box, "true", {"../escape": ""})
+
+    def test_concurrency_limit(self):
+        box = sandbox.Sandbox(max_concurrency=1, isolate=False)
+
+        async def both():
+            return await asyncio.gather(box.run("sleep 0.3"), box.run("sleep 0.3"))
+
+        first, second = self.loop.run_until_complete(both())
+        # The second job had to wait for the first, so the total is about
+        # double, but each job only counts its own running time.
+        self.assertLess(first.duration, 0.6)
+        self.assertLess(second.duration, 0.6)
+
+
+def _isolated(**kwargs):
+    """Gets a sandbox that isolates jobs, or None if we cannot here."""
+    box = sandbox.Sandbox(user="nobody", **kwargs)
+    try:
+        box.check_isolation()
+    except sandbox.IsolationError:
+        return None
+    return box
+
+
+class TestIsolation(unittest.TestCase):
+    def setUp(self):
+        if _isolated() is None:
+            self.skipTest("Cannot isolate jobs here.")
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_job(self, box, script, files=None):
+        return self.loop.run_until_complete(box.run(script, files))
+
+    def test_runs_as_the_sandbox_user(self):
+        result = self.run_job(_isolated(), "id -u; cat main.txt", {"main.txt": "hi"})
+        self.assertEqual(result.output, "65534\nhi")
+        self.assertEqual(result.returncode, 0)
+
+    def test_only_sees_own_processes(self):
+        result = self.run_job(_isolated(), "ls /proc")
+        pids = [name for name in result.output.split() if name.isdigit()]
+        self.assertLess(len(pids), 5)
+
+    def test_hidden_paths(self):
+        directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(__file__)))
+        self.addCleanup(shutil.rmtree, directory)
+        os.chmod(directory, 0o755)
+        with open(os.path.join(directory, "secret"), "w") as fp:
+            fp.write("token")
+        os.chmod(os.path.join(directory, "secret"), 0o644)
+
+        box = _isolated(hidden_paths=[directory])
+        result = self.run_job(box, f"cat {directory}/secret")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertNotIn("token", result.output)
+
+    def test_filesystem_is_read_only_except_tmp(self):
+        script = "pwd; echo a > here; echo b > /dev/null; touch /etc/x /var/tmp/x"
+        result = self.run_job(_isolated(), script)
+        self.assertTrue(result.output.startswith("/tmp\n"))
+        self.assertEqual(result.output.count("Read-only file system"), 2)
+
+    def test_no_network(self):
+        result = self.run_job(_isolated(), "echo > /dev/tcp/1.1.1.1/53")
+        self.assertNotEqual(result.returncode, 0)
+
+    def test_process_limit(self):
+        box = _isolated(max_processes=5)
+        # Bash retries for a while when it cannot fork, but sh gives up.
+        script = "sh -c 'for i in 1 2 3 4 5 6 7 8 9 10; do sleep 1 & done; wait'"
+        result = self.run_job(box, script)
+        self.assertIn("Cannot fork", result.output)
+
+    def test_background_processes_die_with_the_job(self):
+        started = time.monotonic()
+        result = self.run_job(_isolated(), "(setsid sleep 30 &); echo done")
+        self.assertEqual(result.output, "done\n")
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_timeout_kills_everything(self):
+        box = _isolated(timeout=0.5)
+        result = self.run_job(box, "(setsid sleep 30 &); sleep 30")
+        self.assertTrue(result.timed_out)
+        self.assertLess(result.duration, 5)
+
+    def test_refuses_root(self):
+        with self.assertRaises(sandbox.IsolationError):
+            sandbox.Sandbox(user=0).check_isolation()
+
+    def test_refuses_unknown_user(self):
+        with self.assertRaises(sandbox.IsolationError):
+            sandbox.Sandbox(user="no-such-user-here").check_isolation()
+
+    def test_warm_pool(self):
+        pool = sandbox.WarmPool(
+            _isolated(), ["/bin/sh", "run.sh"], files={"run.sh": "id -u; cat"}
+        )
+        try:
+            result = self.loop.run_until_complete(pool.run(b"hello"))
+        finally:
+            self.loop.run_until_complete(pool.close())
+        self.assertEqual(result.output, "65534\nhello")
+
+
+class TestWarmPool(unittest.TestCase):
+    # Prints its PID, then whatever it is given, backwards.
+    argv = [
+        sys.executable,
+        "-c",
+        "import os, sys; print(os.getpid()); print(sys.stdin.read()[::-1])",
+    ]
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.pool = sandbox.WarmPool(
+            sandbox.Sandbox(isolate=False), self.argv, size=2
+        )
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.pool.close())
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_job(self, data):
+        return self.loop.run_until_complete(self.pool.run(data))
+
+    def test_runs_job(self):
+        result = self.run_job(b"olleh")
+        pid, output = result.output.split("\n", 1)
+        self.assertEqual(output, "hello\n")
+        self.assertEqual(result.returncode, 0)
+
+    def test_workers_are_not_reused(self):
+        first = self.run_job(b"a").output.split("\n")[0]
+        second = self.run_job(b"b").output.split("\n")[0]
+        self.assertNotEqual(first, second)
+
+    def test_keeps_workers_waiting(self):
+        self.run_job(b"")
+        # Let the replacement workers start.
+        self.loop.run_until_complete(asyncio.sleep(0.5))
+        self.assertEqual(self.pool._ready.qsize(), 2)
+
+    def test_timeout(self):
+        self.pool.argv = [sys.executable, "-c", "import time; time.sleep(30)"]
+        self.pool.sandbox.timeout = 0.5
+        result = self.run_job(b"")
+        self.assertTrue(result.timed_out)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests scheduler lanes limit concurrency, take turns between users, and
+reject work when overloaded.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import threading
+import unittest
+
+from neko2.shared import metrics, scheduler
+
+
+class TestLane(unittest.TestCase):
+    def setUp(self):
+        self.lane = scheduler.Lane("test", 1, max_queued=5, max_queued_per_user=3)
+        # Holds the only thread busy until we are ready.
+        self.gate = threading.Event()
+        self.blocker = self.lane.submit(self.gate.wait)
+
+    def tearDown(self):
+        self.gate.set()
+        self.lane.shutdown()
+
+    def test_users_take_turns(self):
+        order = []
+        futures = [
+            self.lane.submit(lambda u=u, i=i: order.append((u, i)), user=u)
+            for u, i in [("a", 1), ("a", 2), ("a", 3), ("b", 1), ("c", 1)]
+        ]
+        self.gate.set()
+        for future in futures:
+            future.result(timeout=5)
+
+        self.assertEqual(order, [("a", 1), ("b", 1), ("c", 1), ("a", 2), ("a", 3)])
+
+    def test_concurrency_limit(self):
+        self.assertEqual(self.lane.running, 1)
+        self.lane.submit(lambda: None)
+        self.assertEqual(self.lane.queued, 1)
+        self.assertEqual(
+            metrics.registry.gauge("scheduler_queue_depth", lane="test").value, 1
+        )
+
+    def test_rejects_when_user_has_too_much_queued(self):
+        for _ in range(3):
+            self.lane.submit(lambda: None, user="greedy")
+        with self.assertRaises(scheduler.SchedulerOverloadedError):
+            self.lane.submit(lambda: None, user="greedy")
+        # Other users are unaffected.
+        self.lane.submit(lambda: None, user="patient")
+
+    def test_rejects_when_lane_is_full(self):
+        for i in range(5):
+            self.lane.submit(lambda: None, user=i)
+        with self.assertRaises(scheduler.SchedulerOverloadedError):
+            self.lane.submit(lambda: None, user="late")
+
+    def test_cancelled_jobs_are_skipped(self):
+        ran = []
+        future = self.lane.submit(lambda: ran.append(True))
+        self.assertTrue(future.cancel())
+        self.gate.set()
+        self.lane.submit(lambda: None).result(timeout=5)
+        self.assertEqual(ran, [])
+
+    def test_exceptions_propagate(self):
+        self.gate.set()
+        with self.assertRaises(ZeroDivisionError):
+            self.lane.submit(lambda: 1 / 0).result(timeout=5)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_run(self):
+        sched = scheduler.Scheduler([scheduler.Lane(scheduler.IO, 2)])
+        loop = asyncio.new_event_loop()
+        try:
+            result = loop.run_until_complete(
+                sched.run(lambda: 42, lane=scheduler.IO, loop=loop)
+            )
+            self.assertEqual(result, 42)
+        finally:
+            sched.shutdown()
+            loop.close()
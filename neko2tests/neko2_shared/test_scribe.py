@@ -0,0 +1,94 @@
+#!/usr/bin/env python3.6
+# -*- coding: utf-8 -*-
+"""
+Tests the logging pipeline rate limits and tags records properly.
+
+===
+
+MIT License
+
+Copyright (c) 2018 Neko404NotFound
+
+Permission is hereby granted, free of charge, to any person obtaining
+a copy of this software and associated documentation files (the
+"Software"), to deal in the Software without restriction, including
+without limitation the rights to use, copy, modify, merge, publish,
+distribute, sublicense, and/or sell copies of the Software, and to
+permit persons to whom the Software is furnished to do so, subject to
+the following conditions:
+
+The above copyright notice and this permission notice shall be
+included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+import asyncio
+import io
+import json
+import logging
+import unittest
+
+from neko2.shared import scribe
+
+
+class TestLoggingPipeline(unittest.TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        old_handlers, old_level = list(root.handlers), root.level
+
+        def restore():
+            scribe.shutdown()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in old_handlers:
+                root.addHandler(handler)
+            root.setLevel(old_level)
+
+        self.addCleanup(restore)
+        self.stream = io.StringIO()
+
+    def lines(self):
+        scribe.shutdown()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_context_is_attached_per_task(self):
+        scribe.configure(json=True, rate=None, stream=self.stream)
+        logger = logging.getLogger("test.context")
+
+        async def command():
+            scribe.set_context(command="foo", guild=1)
+            logger.info("in %s", "command")
+
+        async def other():
+            logger.info("elsewhere")
+
+        async def both():
+            await asyncio.gather(command(), other())
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(both())
+
+        first, second = self.lines()
+        self.assertEqual(first["message"], "in command")
+        self.assertEqual((first["command"], first["guild"]), ("foo", 1))
+        self.assertEqual(second["message"], "elsewhere")
+        self.assertNotIn("command", second)
+
+    def test_rate_limit(self):
+        scribe.configure(json=True, rate=0.001, burst=3, stream=self.stream)
+        logger = logging.getLogger("test.rate")
+        for i in range(10):
+            logger.info("spam %s", i)
+        logger.error("important")
+
+        lines = self.lines()
+        self.assertEqual(
+            [line["message"] for line in lines], ["spam 0", "spam 1", "spam 2", "important"]
+        )